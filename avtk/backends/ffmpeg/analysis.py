@@ -0,0 +1,217 @@
+"""
+Bitrate and GOP structure analysis
+==================================
+
+The :mod:`avtk.backends.ffmpeg.analysis` module analyzes packet-level information about a stream
+(see :mod:`avtk.backends.ffmpeg.packets`) to find out how the bitrate changes over time and how
+keyframes are distributed in the stream.
+
+Only packet headers are read (the stream is not decoded), and the packets are processed
+in batches as they are read, so the analysis is fast and uses a constant amount of memory
+even for multi-hour files.
+
+This module requires NumPy (``pip install avtk[numpy]``).
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.analysis import analyze_bitrate, analyze_gop
+
+    >>> br = analyze_bitrate('test-media/video/sintel.mkv', window=1)
+    >>> br.peak > br.mean
+    True
+    >>> p95 = br.percentile(95)
+
+    >>> gop = analyze_gop('test-media/video/sintel.mkv')
+    >>> max_gop_seconds = gop.max_interval
+"""
+
+import numpy as np
+
+from .convert import Duration
+from .packets import iter_packets, get_time_base, NO_VALUE
+
+
+def _packet_times(batch):
+    # Prefer presentation timestamps, falling back to decoding timestamps if unknown
+    return np.where(batch['pts'] != NO_VALUE, batch['pts'], batch['dts'])
+
+
+class BitrateProfile:
+    """
+    Bitrate of a stream over time.
+
+    :Attributes:
+        * window (*float*) - length of the measurement window, in seconds
+        * start_time (*float*) - timestamp of the first packet in the stream, in seconds
+        * duration (*float*) - time from the first packet to the end of the last one, in seconds
+        * bit_rates (*numpy.ndarray*) - bitrate (in bits per second) in each consecutive window
+        * mean (*float*) - average bitrate of the stream
+        * peak (*float*) - highest bitrate in any window
+        * peak_time (*float*) - start of the window with the highest bitrate, in seconds from stream start
+
+    The last window usually covers only a part of the stream, so its bitrate may be lower than the actual
+    bitrate of the stream at that point.
+    """
+
+    def __init__(self, window, start_time, bits, duration=None):
+        self.window = window
+        self.start_time = start_time
+        self.bit_rates = bits / window
+        # Without packet durations, assume the stream covers all the windows
+        self.duration = duration or len(bits) * window
+
+        if len(bits):
+            self.mean = float(bits.sum() / self.duration)
+            self.peak = float(self.bit_rates.max())
+            self.peak_time = float(self.bit_rates.argmax() * window)
+        else:
+            self.mean = self.peak = self.peak_time = None
+
+    def percentile(self, q):
+        """
+        Bitrate percentile over all windows
+
+        :param q: percentile to compute, between 0 and 100
+        :type q: int or float
+        :returns: bitrate (in bits per second) which is not exceeded in *q* percent of windows
+        :rtype: float
+        """
+
+        return float(np.percentile(self.bit_rates, q)) if len(self.bit_rates) else None
+
+    def __repr__(self):
+        return '<BitrateProfile(window=%ss, mean=%s, peak=%s)>' % (
+            self.window,
+            "%dkbps" % int(self.mean / 1000) if self.mean else 'n/a',
+            "%dkbps" % int(self.peak / 1000) if self.peak else 'n/a',
+        )
+
+
+class GopInfo:
+    """
+    Group of pictures (GOP) structure of a stream.
+
+    :Attributes:
+        * lengths (*numpy.ndarray*) - number of packets in each GOP, in order
+        * keyframe_times (*numpy.ndarray*) - presentation times of the keyframes, in seconds
+        * keyframe_intervals (*numpy.ndarray*) - time between consecutive keyframes, in seconds
+        * distribution (*dict*) - number of GOPs (value) of each length (key)
+        * max_length (*int* or *None*) - length of the longest GOP
+        * max_interval (*float* or *None*) - longest time between two keyframes, in seconds
+
+    The last GOP in the stream is usually shorter than the others, and is included in
+    *lengths* and *distribution*.
+    """
+
+    def __init__(self, key_indices, packet_count, keyframe_times):
+        self.lengths = np.diff(np.append(key_indices, packet_count))
+        self.keyframe_times = keyframe_times
+        self.keyframe_intervals = np.diff(keyframe_times)
+
+        values, counts = np.unique(self.lengths, return_counts=True)
+        self.distribution = dict(zip(values.tolist(), counts.tolist()))
+
+        self.max_length = int(self.lengths.max()) if len(self.lengths) else None
+        self.max_interval = float(self.keyframe_intervals.max()) if len(self.keyframe_intervals) else None
+
+    @property
+    def is_fixed(self):
+        """Whether all GOPs (except the last one) have the same length"""
+        return len(np.unique(self.lengths[:-1])) <= 1
+
+    def __repr__(self):
+        return '<GopInfo(gops=%d, max_length=%s, max_interval=%s)>' % (
+            len(self.lengths),
+            self.max_length if self.max_length is not None else 'n/a',
+            ('%.3fs' % self.max_interval) if self.max_interval is not None else 'n/a',
+        )
+
+
+def _bitrate_from_batches(batches, time_base, window):
+    tb = float(time_base)
+    start = end = None
+    bits = np.zeros(0)
+
+    for batch in batches:
+        times = _packet_times(batch)
+        valid = times != NO_VALUE
+        times = times[valid] * tb
+        if not len(times):
+            continue
+
+        if start is None:
+            start = float(times.min())
+
+        durations = batch['duration'][valid]
+        last = float((times + np.where(durations != NO_VALUE, durations, 0) * tb).max())
+        end = last if end is None else max(end, last)
+
+        slots = np.maximum(((times - start) // window).astype(np.int64), 0)
+        counts = np.bincount(slots, weights=batch['size'][valid] * 8.0)
+
+        if len(counts) > len(bits):
+            bits = np.pad(bits, (0, len(counts) - len(bits)))
+        bits[:len(counts)] += counts
+
+    return BitrateProfile(window, start, bits, duration=end - start if start is not None else None)
+
+
+def _gop_from_batches(batches, time_base):
+    tb = float(time_base)
+    count = 0
+    key_indices = []
+    key_times = []
+
+    for batch in batches:
+        keys = np.flatnonzero(batch['key'])
+        key_indices.append(keys + count)
+        key_times.append(_packet_times(batch)[keys])
+        count += len(batch)
+
+    key_indices = np.concatenate(key_indices) if key_indices else np.zeros(0, dtype=np.int64)
+    key_times = np.concatenate(key_times) if key_times else np.zeros(0, dtype=np.int64)
+    key_times = np.sort(key_times[key_times != NO_VALUE]) * tb
+
+    return GopInfo(key_indices, count, key_times)
+
+
+def analyze_bitrate(source, window=1, stream='v:0'):
+    """
+    Computes bitrate of a stream over time.
+
+    Packet sizes are summed up over consecutive windows of the specified length, starting from
+    the first packet in the stream. Unlike the average bit rate reported in
+    :class:`~avtk.backends.ffmpeg.probe.Stream`, this shows bitrate peaks in the stream.
+
+    :param str source: Local file path or stream URL to analyze
+    :param window: window length - optional, default is 1 second
+    :type window: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param stream: stream index or ffmpeg stream specifier - optional, default is the first video stream
+    :type stream: int or str
+    :returns: bitrate of the stream over time
+    :rtype: :class:`BitrateProfile`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    """
+
+    window = Duration(window).duration.total_seconds()
+    if window <= 0:
+        raise ValueError("bitrate window must be positive")
+
+    time_base = get_time_base(source, stream=stream)
+    return _bitrate_from_batches(iter_packets(source, stream=stream), time_base, window)
+
+
+def analyze_gop(source, stream='v:0'):
+    """
+    Analyzes the group of pictures (GOP) structure of a stream.
+
+    :param str source: Local file path or stream URL to analyze
+    :param stream: stream index or ffmpeg stream specifier - optional, default is the first video stream
+    :type stream: int or str
+    :returns: GOP lengths and keyframe intervals
+    :rtype: :class:`GopInfo`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    """
+
+    time_base = get_time_base(source, stream=stream)
+    return _gop_from_batches(iter_packets(source, stream=stream), time_base)
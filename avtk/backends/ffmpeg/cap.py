@@ -24,6 +24,8 @@ Example usage::
 """
 import re
 
+from avtk.metrics import CAPABILITY_CACHE
+
 from .run import ffmpeg, ffprobe
 
 
@@ -225,6 +227,7 @@ def get_available_codecs():
 
     global _available_codecs
 
+    CAPABILITY_CACHE.labels('miss' if _available_codecs is None else 'hit').inc()
     if _available_codecs is None:
         _available_codecs = _ffmpeg_list('codecs', Codec)
 
@@ -244,6 +247,7 @@ def get_available_formats():
 
     global _available_formats
 
+    CAPABILITY_CACHE.labels('miss' if _available_formats is None else 'hit').inc()
     if _available_formats is None:
         _available_formats = _ffmpeg_list('formats', Format)
 
@@ -263,6 +267,7 @@ def get_available_encoders():
 
     global _available_encoders
 
+    CAPABILITY_CACHE.labels('miss' if _available_encoders is None else 'hit').inc()
     if _available_encoders is None:
         _available_encoders = _ffmpeg_list('encoders', Encoder)
 
@@ -280,6 +285,7 @@ def get_ffmpeg_version():
 
     global _ffmpeg_version
 
+    CAPABILITY_CACHE.labels('miss' if _ffmpeg_version is None else 'hit').inc()
     if _ffmpeg_version is None:
         output = ffmpeg(['-version'])
         _ffmpeg_version = output.split(' ', 3)[2]
@@ -298,8 +304,9 @@ def get_ffprobe_version():
 
     global _ffprobe_version
 
+    CAPABILITY_CACHE.labels('miss' if _ffprobe_version is None else 'hit').inc()
     if _ffprobe_version is None:
         output = ffprobe(['-version'], parse_json=False)
-        return output.split(' ', 3)[2]
+        _ffprobe_version = output.split(' ', 3)[2]
 
     return _ffprobe_version
@@ -44,14 +44,54 @@ that are passed directly to ffmpeg in appropriate places. This allows you to use
 without explicit support in AVTK.
 """
 
+from collections import OrderedDict
 from datetime import timedelta
 from decimal import Decimal
 from urllib.parse import urlparse
+import copy
+import json
+import math
 import os.path
+import re
+import threading
 
 from .cap import get_available_formats, get_available_encoders, Codec
 from .exceptions import NoMediaError
-from .run import ffmpeg
+from .remote import get_local_source
+from .run import ffmpeg, ffmpeg_log
+
+MAX_LOUDNESS_MEASUREMENTS = 256
+
+# ffmpeg -map argument: optional "-" (negative map), input index, stream specifier, optional "?"
+MAP_RE = re.compile(r'^(?P<negative>-)?(?P<input>\d+)(?::(?P<stream>[^?]*))?\??$')
+
+_loudness_measurements = OrderedDict()  # key -> measurement, least recently used first
+_loudness_lock = threading.Lock()
+
+
+def _fingerprint(source):
+    """
+    Identifies the source file contents, for caching results of expensive analysis.
+
+    Local files are identified by their absolute path, size and modification time,
+    other sources by their URL.
+    """
+
+    url = urlparse(source)
+    if url.scheme in ['', 'file']:
+        st = os.stat(url.path)
+        return (os.path.abspath(url.path), st.st_size, st.st_mtime_ns)
+    return source
+
+
+def _is_audio_stream(input, index):
+    """
+    Checks whether the stream with the specified index in the input is an audio stream.
+    """
+
+    from .probe import MediaInfo
+
+    return any(s.index == index for s in MediaInfo(input.source, fields=['audio.channels']).audio_streams)
 
 
 class Duration:
@@ -82,6 +122,34 @@ class Duration:
         return str(self.duration.total_seconds())
 
 
+def parse_bit_rate(val):
+    """
+    Parses a bitrate given as a number or as a string in 'NUMk' or 'NUMm' format
+
+    :param val: bitrate - optional
+    :type val: int, float, str or *None*
+    :returns: bitrate in bits per second, or *None* if *val* is *None*
+    :rtype: int
+    :raises ValueError: if the bitrate can't be parsed
+
+    Example::
+
+        >>> parse_bit_rate('2.5M')
+        2500000
+    """
+
+    if val is None:
+        return None
+    if isinstance(val, (int, float)):
+        return int(val)
+
+    val = str(val).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(val[-1:])
+    if multiplier:
+        return int(float(val[:-1]) * multiplier)
+    return int(val)
+
+
 class Stream:
     """
     Output stream definition - base class
@@ -111,6 +179,29 @@ class Stream:
                 self.stream_type
             ))
 
+    def bind(self, input, stream=None):
+        """
+        Returns stream definition adapted to the specified input.
+
+        Used by :class:`FFmpeg` for stream definitions whose arguments depend on the input
+        contents. By default, returns the stream definition unchanged.
+
+        :param input: input to be converted
+        :type input: :class:`Input`
+        :param str stream: ffmpeg stream specifier of the converted stream within the input (eg. ``a:0``)
+            - optional, default is the stream ffmpeg picks by default
+        """
+        return self
+
+    def depends_on_input(self):
+        """
+        Returns whether :meth:`bind` adapts the stream definition to the input, so its arguments can't
+        be built in advance (see :class:`JobTemplate`).
+
+        :rtype: bool
+        """
+        return False
+
     def __str__(self):
         return ' '.join(self.get_args())
 
@@ -161,6 +252,17 @@ class Video(Stream):
         self.frames = frames
         self.extra = extra
 
+    def get_filter(self):
+        """
+        Returns the filter specification applied to the video, or *None* if the video isn't filtered
+
+        :rtype: str
+        """
+
+        if not self.scale:
+            return None
+        return 'scale=%s' % ('%d:%d' % self.scale if isinstance(self.scale, tuple) else self.scale)
+
     def get_args(self):
         if self.encoder is None:
             return ['-vn']
@@ -168,10 +270,7 @@ class Video(Stream):
         args = ['-c:v', self.encoder]
 
         if self.scale:
-            args.extend([
-                '-vf',
-                'scale=%s' % ('%d:%d' % self.scale if isinstance(self.scale, tuple) else self.scale)
-            ])
+            args.extend(['-vf', self.get_filter()])
 
         if self.bit_rate:
             args.extend(['-b:v', str(self.bit_rate)])
@@ -252,6 +351,8 @@ class VP9(Video):
     Video stream using VP9 codec and libvpx-vp9 encoder
 
     :param str crf: constant rate factor (determines target quality) - optional, default is 31
+    :param int speed: encoding speed (quality / encoding speed tradeoff), from 0 (slowest) to 5 (fastest) -
+        optional, default is to let the encoder decide
     :param tuple scale: resize output to specified size (width, height) - optional
     :param int frames: number of frames to output - optional
     :param list(str) extra: additional ffmpeg command line arguments for the stream - optional
@@ -265,12 +366,14 @@ class VP9(Video):
         VP9()
     """
 
-    def __init__(self, crf=None, **kwargs):
+    def __init__(self, crf=None, speed=None, **kwargs):
         if crf is None:
             crf = 31
 
         # Uses constanct quality mode: https://trac.ffmpeg.org/wiki/Encode/VP9#constantq
         extra = ['-crf', str(crf), '-b:v', '0', '-quality', 'good']
+        if speed is not None:
+            extra.extend(['-cpu-used', str(speed)])
         super().__init__('libvpx-vp9', extra=extra, **kwargs)
 
 
@@ -295,6 +398,137 @@ class AV1(Video):
         super().__init__('libaom-av1', extra=extra, **kwargs)
 
 
+class LoudnessNormalize:
+    """
+    Audio loudness normalization using the ``loudnorm`` filter (EBU R128)
+
+    :param target_i: integrated loudness target, in LUFS - optional, default is -24
+    :type target_i: int or float
+    :param target_tp: maximum true peak, in dBTP - optional, default is -2
+    :type target_tp: int or float
+    :param target_lra: loudness range target, in LU - optional, default is 7
+    :type target_lra: int or float
+    :param int sample_rate: output sample rate - optional, default is 48000
+
+    Normalization is done in two passes: the first pass measures the input loudness, and the second
+    applies linear normalization using the measured values while encoding. Measurements are cached
+    per input file (based on its path, size and modification time), so subsequent conversions of the
+    same input to other formats skip the measurement pass. Up to :data:`MAX_LOUDNESS_MEASUREMENTS`
+    measurements are kept, least recently used ones are dropped first.
+
+    If the input loudness can't be measured (for example, the input is silent), dynamic single-pass
+    normalization is used instead.
+
+    The ``loudnorm`` filter internally upsamples the audio to 192kHz, so the output is resampled to
+    *sample_rate* afterwards.
+
+    See http://k.ylo.ph/2016/04/04/loudnorm.html for details about the ``loudnorm`` filter.
+
+    Example::
+
+        # Normalize podcast audio to -16 LUFS
+        AAC(bit_rate='96k', normalize=LoudnessNormalize(target_i=-16, target_tp=-1.5, target_lra=11))
+    """
+
+    def __init__(self, target_i=-24, target_tp=-2, target_lra=7, sample_rate=48000):
+        self.target_i = target_i
+        self.target_tp = target_tp
+        self.target_lra = target_lra
+        self.sample_rate = sample_rate
+        self.measurement = None
+
+    def _get_target(self):
+        return 'I=%s:TP=%s:LRA=%s' % (self.target_i, self.target_tp, self.target_lra)
+
+    def measure(self, input, stream=None):
+        """
+        Measures the input loudness (first pass)
+
+        :param input: input to measure
+        :type input: :class:`Input` or *str*
+        :param str stream: ffmpeg stream specifier of the audio stream to measure (eg. ``a:1``) - optional,
+            default is the audio stream ffmpeg picks by default
+        :returns: measured values, as reported by the ``loudnorm`` filter
+        :rtype: dict
+        :raises ValueError: if the measurement can't be parsed from ``ffmpeg`` output
+        """
+
+        if not isinstance(input, Input):
+            input = Input(input)
+
+        key = (
+            _fingerprint(input.source),
+            str(input.seek), str(input.duration),
+            stream,
+            self._get_target()
+        )
+
+        with _loudness_lock:
+            measurement = _loudness_measurements.get(key)
+            if measurement is not None:
+                _loudness_measurements.move_to_end(key)
+                return measurement
+
+        log = ffmpeg_log(input.get_args() + [
+            *(['-map', '0:' + stream] if stream else ['-vn', '-sn', '-dn']),
+            '-af', 'loudnorm=%s:print_format=json' % self._get_target(),
+            '-f', 'null', '-'
+        ])
+
+        start = log.rfind('{')
+        end = log.rfind('}')
+        if start < 0 or end < start:
+            raise ValueError("can't parse loudness measurement from ffmpeg output")
+
+        measurement = json.loads(log[start:end + 1])
+
+        with _loudness_lock:
+            _loudness_measurements[key] = measurement
+            while len(_loudness_measurements) > MAX_LOUDNESS_MEASUREMENTS:
+                _loudness_measurements.popitem(last=False)
+
+        return measurement
+
+    def bind(self, input, stream=None):
+        """
+        Returns a copy of the normalization settings with input loudness measured
+
+        :param input: input to measure
+        :type input: :class:`Input` or *str*
+        :param str stream: audio stream to measure (see :meth:`measure`) - optional
+        :rtype: :class:`LoudnessNormalize`
+        """
+
+        bound = copy.copy(self)
+        bound.measurement = self.measure(input, stream)
+        return bound
+
+    def get_filter(self):
+        """
+        Returns the filter specification for the normalization (second) pass
+
+        :rtype: str
+        """
+
+        m = self.measurement
+        measured = ['input_i', 'input_tp', 'input_lra', 'input_thresh']
+
+        if m and all(math.isfinite(float(m[k])) for k in measured):
+            spec = 'loudnorm=%s:measured_I=%s:measured_TP=%s:measured_LRA=%s:measured_thresh=%s' \
+                ':offset=%s:linear=true' % (
+                    self._get_target(),
+                    m['input_i'], m['input_tp'], m['input_lra'], m['input_thresh'],
+                    m['target_offset']
+                )
+        else:
+            spec = 'loudnorm=%s' % self._get_target()
+
+        if self.sample_rate:
+            spec += ',aresample=%d' % self.sample_rate
+
+        return spec
+
+
 class Audio(Stream):
     """
     Output audio stream definition
@@ -303,6 +537,8 @@ class Audio(Stream):
     :param int channels: number of channels to downmix to - optional
     :param bit_rate: target audio bitrate - optional
     :type bit_rate: int or str
+    :param normalize: normalize audio loudness - optional
+    :type normalize: :class:`LoudnessNormalize`
     :param list(str) extra: additional ffmpeg command line arguments for the stream - optional
 
     Use :func:`avtk.backends.ffmpeg.cap.get_available_encoders` to get information on supported encoders. You
@@ -323,16 +559,31 @@ class Audio(Stream):
 
         # Disable (ignore) audio stream
         NoAudio
+
+    If *normalize* is set, input audio loudness is measured before the conversion is run (see
+    :class:`LoudnessNormalize` and :meth:`FFmpeg.bind`).
     """
 
     stream_type = Codec.TYPE_AUDIO
 
-    def __init__(self, encoder, channels=None, bit_rate=None, extra=None):
+    def __init__(self, encoder, channels=None, bit_rate=None, normalize=None, extra=None):
         super().__init__(encoder)
         self.channels = channels
         self.bit_rate = bit_rate
+        self.normalize = normalize
         self.extra = extra
 
+    def depends_on_input(self):
+        return bool(self.normalize) and self.normalize.measurement is None
+
+    def bind(self, input, stream=None):
+        if not self.depends_on_input():
+            return self
+
+        bound = copy.copy(self)
+        bound.normalize = self.normalize.bind(input, stream)
+        return bound
+
     def get_args(self):
         if self.encoder is None:
             return ['-an']
@@ -344,6 +595,9 @@ class Audio(Stream):
         if self.bit_rate:
             args.extend(['-b:a', str(self.bit_rate)])
 
+        if self.normalize:
+            args.extend(['-af', self.normalize.get_filter()])
+
         if self.extra:
             args.extend(self.extra)
 
@@ -357,6 +611,8 @@ class AAC(Audio):
     :param int channels: number of channels to downmix to - optional
     :param bit_rate: target audio bitrate - optional
     :type bit_rate: int or str
+    :param normalize: normalize audio loudness - optional
+    :type normalize: :class:`LoudnessNormalize`
     :param list(str) extra: additional ffmpeg command line arguments for the stream - optional
     """
 
@@ -371,6 +627,8 @@ class Opus(Audio):
     :param int channels: number of channels to downmix to - optional
     :param bit_rate: target audio bitrate - optional
     :type bit_rate: int or str
+    :param normalize: normalize audio loudness - optional
+    :type normalize: :class:`LoudnessNormalize`
     :param list(str) extra: additional ffmpeg command line arguments for the stream - optional
     """
 
@@ -404,6 +662,21 @@ NoSubtitles = Subtitle(None)  #: Disable subtitles
 CopySubtitles = Subtitle('copy')  #: Copy subtitles
 
 
+def _get_input_args(seek, duration, extra):
+    args = []
+
+    if seek:
+        args.extend(['-ss', str(seek)])
+
+    if duration:
+        args.extend(['-t', str(duration)])
+
+    if extra:
+        args.extend(extra)
+
+    return args
+
+
 class Input:
     """
     Define input source
@@ -417,7 +690,9 @@ class Input:
     :raises NoMediaError: if source doesn't exist
 
     Source can either be a local file, capture device or network stream
-    supported by the underlying ``ffmpeg`` tool.
+    supported by the underlying ``ffmpeg`` tool. If remote source caching is enabled
+    (see :mod:`avtk.backends.ffmpeg.remote`), HTTP(S) sources are replaced by their
+    local copies.
 
     Examples::
 
@@ -429,6 +704,7 @@ class Input:
     """
 
     def __init__(self, source, seek=None, duration=None, extra=None):
+        source = get_local_source(source)
         self.source = source
         self.seek = Duration(seek) if seek else None
         self.duration = Duration(duration) if duration else None
@@ -440,20 +716,7 @@ class Input:
                 raise NoMediaError('Source file not found: ' + url.path)
 
     def get_args(self):
-        args = []
-
-        if self.seek:
-            args.extend(['-ss', str(self.seek)])
-
-        if self.duration:
-            args.extend(['-t', str(self.duration)])
-
-        if self.extra:
-            args.extend(self.extra)
-
-        args.extend(['-i', self.source])
-
-        return args
+        return _get_input_args(self.seek, self.duration, self.extra) + ['-i', self.source]
 
     def __str__(self):
         return ' '.join(self.get_args())
@@ -552,10 +815,96 @@ class Output:
         else:
             self.format = Format(fmt)
 
-    def get_args(self):
+    def _get_audio_stream(self, inputs):
+        """
+        Finds the audio stream the output audio is taken from, as (input, stream specifier within the
+        input, or *None* for the stream ffmpeg picks by default), or *None* if the output has no audio.
+
+        :raises ValueError: if the audio stream can't be determined from the ``-map`` options
+        """
+
+        args = self.extra or []
+        maps = [args[i + 1] for i in range(len(args) - 1) if args[i] == '-map']
+
+        for spec in maps:
+            match = MAP_RE.match(spec)
+            if match is None or int(match.group('input')) >= len(inputs):
+                raise ValueError("can't determine the audio stream mapped by -map %s" % spec)
+            if match.group('negative'):
+                continue
+
+            input = inputs[int(match.group('input'))]
+            stream = match.group('stream') or ''
+            kind = stream.split(':', 1)[0]
+
+            if kind in ['', 'a']:
+                # Whole input or all its audio streams use the first audio stream's measurement
+                return input, stream if ':' in stream else 'a:0'
+            if kind in ['v', 'V', 's', 'd', 't']:
+                continue
+            if stream.isdigit():
+                if _is_audio_stream(input, int(stream)):
+                    return input, stream
+                continue
+
+            raise ValueError("can't determine the audio stream mapped by -map %s" % spec)
+
+        if maps:
+            return None
+        if len(inputs) == 1:
+            return inputs[0], None
+
+        # Without explicit maps, ffmpeg uses the audio stream with the most channels
+        from .probe import MediaInfo
+
+        best, best_channels = None, -1
+        for i in inputs:
+            for s in MediaInfo(i.source, fields=['audio.channels']).audio_streams:
+                if (s.channels or 0) > best_channels:
+                    best, best_channels = (i, str(s.index)), s.channels or 0
+        return best
+
+    def bind(self, inputs):
+        """
+        Returns a copy of the output with stream definitions adapted to the inputs
+
+        :param inputs: inputs the output is converted from
+        :type inputs: :class:`Input` or list(:class:`Input`)
+        :rtype: :class:`Output`
+
+        Audio stream definitions are adapted to the audio stream the output audio is taken from (the
+        first one mapped with ``-map`` in *extra*, or the one ffmpeg picks by default). See
+        :meth:`Stream.bind`.
+
+        :raises ValueError: if the mapped audio stream can't be determined
+        """
+
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        if not any(s.depends_on_input() for s in self.streams):
+            return self
+
+        audio = self._get_audio_stream(inputs)
+        bound = copy.copy(self)
+        bound.streams = [(s.bind(*audio) if audio is not None else s) for s in self.streams]
+        return bound
+
+    def get_args(self, input=None):
+        """
+        Builds ffmpeg command line arguments for the output
+
+        :param input: input the streams are converted from - optional
+        :type input: :class:`Input`
+        :rtype: list of strings
+
+        If *input* is specified, stream definitions are adapted to it before building the
+        arguments (see :meth:`bind`).
+        """
+
         args = []
 
-        for s in self.streams:
+        streams = self.bind(input).streams if input is not None else self.streams
+        for s in streams:
             args.extend(s.get_args())
 
         if self.format:
@@ -611,10 +960,12 @@ class FFmpeg:
             outputs = [outputs]
         self.outputs = [(o if isinstance(o, Output) else Output(o)) for o in outputs]
 
-    def get_args(self):
+    def get_args(self, threads=None):
         """
         Builds ffmpeg command line arguments
 
+        :param int threads: number of threads each decoder, encoder and filter graph may use - optional,
+            default is to let ffmpeg decide (usually one thread per CPU core)
         :returns: ffmpeg command line arguments for the specified process
         :rtype: list of strings
 
@@ -629,27 +980,239 @@ class FFmpeg:
                 '-c:v', 'libx264', '-an', 'video.mp4',
                 '-c:a', 'aac', '-vn', 'audio.m4a'
             ]
+
+        Stream definitions which depend on input contents (for example, audio streams with loudness
+        normalization) are not adapted to the inputs, use :meth:`bind` first to get the arguments
+        :meth:`run` uses.
         """
 
-        args = []
+        thread_args = ['-threads', str(threads)] if threads else []
+
+        args = ['-filter_threads', str(threads)] if threads else []
         for i in self.inputs:
-            args.extend(i.get_args())
+            args.extend(thread_args + i.get_args())
         for o in self.outputs:
-            args.extend(o.get_args())
+            args.extend(thread_args + o.get_args())
         return args
 
-    def run(self, text=True):
+    def bind(self):
+        """
+        Returns a copy of the conversion with stream definitions adapted to the inputs
+
+        :rtype: :class:`FFmpeg`
+
+        Stream definitions which depend on input contents (for example, audio streams with loudness
+        normalization) are adapted to the inputs they are converted from (see :meth:`Output.bind`).
+        This may require analyzing the inputs, so it can take a while. :meth:`run` does this
+        automatically.
+        """
+
+        bound = copy.copy(self)
+        bound.outputs = [o.bind(self.inputs) for o in self.outputs]
+        return bound
+
+    def run(self, text=True, threads=None, cpus=None, nice=None, listener=None, loglevel=None, with_usage=False):
         """
         Runs the conversion process
 
-        Uses :meth:`get_args` to build the command line and runs it using :func:`avtk.backends.ffmpeg.run.ffmpeg`.
+        Adapts the stream definitions to the inputs (see :meth:`bind`), uses :meth:`get_args` to build
+        the command line and runs it using :func:`avtk.backends.ffmpeg.run.ffmpeg`.
 
         :param bool text: whether to return the output as text - optional, default true
-        :returns: output (stdout) from ``ffmpeg`` invocation
+        :param int threads: number of threads to use (see :meth:`get_args`) - optional, default is the number
+            of *cpus* if set, otherwise let ffmpeg decide
+        :param cpus: pin the process to these CPUs - optional, Linux only
+        :type cpus: set(int) or list(int)
+        :param int nice: niceness increment for the process, to run it in the background - optional
+        :param listener: function called with each :class:`~avtk.backends.ffmpeg.run.LogEvent` as it
+            is logged - optional
+        :param str loglevel: ``ffmpeg`` logging level - optional, default is *warning* if *listener* is set,
+            *error* otherwise
+        :param bool with_usage: whether to also return the resources used by the process - optional
+        :returns: output (stdout) from ``ffmpeg`` invocation, or a tuple of the output and
+            :class:`~avtk.backends.ffmpeg.run.ResourceUsage` if *with_usage* is set
         :rtype: *str* if *text=True* (default), *bytes* if *text=False*
+        :raises FFmpegError: if the conversion fails
+
+        When running several conversions at once, use :class:`~avtk.backends.ffmpeg.jobs.JobPool` to
+        split available CPUs between them.
         """
 
-        return ffmpeg(self.get_args(), text=text)
+        if threads is None and cpus:
+            threads = len(cpus)
+
+        return ffmpeg(
+            self.bind().get_args(threads=threads), text=text, cpus=cpus, nice=nice, listener=listener,
+            loglevel=loglevel, with_usage=with_usage
+        )
 
     def __str__(self):
         return ' '.join(self.get_args())
+
+
+class JobTemplate:
+    """
+    Conversion settings prepared once, for converting many files the same way
+
+    :param streams: output stream definitions - optional
+    :type streams: list(:class:`Stream`) or *None*
+    :param fmt: output format - optional
+    :type fmt: :class:`Format`, *str* or *None*
+    :param list(str) extra: additional ffmpeg command line arguments for the output - optional
+    :param seek: seek in each source before processing - optional
+    :type seek: see :class:`Duration`
+    :param duration: how much of each source to process - optional
+    :type duration: see :class:`Duration`
+    :param list(str) input_extra: additional ffmpeg command line arguments for the inputs - optional
+    :raises ValueError: if the format or any of the encoders are not supported
+
+    Building an :class:`FFmpeg` conversion checks the encoders, format and source, and builds the
+    command line from scratch. When converting a large number of files with the same settings, the
+    template does the checks and builds the arguments only once, and each job just adds its own
+    source and target.
+
+    Stream definitions which depend on the input (for example, audio streams with loudness
+    normalization) are still adapted to each source when its job is run.
+
+    Example::
+
+        template = JobTemplate(streams=[H264(crf=23), AAC(bit_rate='128k')], fmt=MP4(faststart=True))
+
+        with JobPool() as pool:
+            pool.map(template.job(src, src + '.mp4') for src in sources)
+
+    Unlike :class:`Input`, creating a job doesn't check whether the source file exists or download
+    a remote source; both happen when the job is run. A missing source is then reported as
+    :class:`~avtk.backends.ffmpeg.exceptions.FFmpegError`, or as
+    :class:`~avtk.backends.ffmpeg.exceptions.NoMediaError` if the template has streams that
+    depend on the input (these have to analyze the source before FFmpeg is started).
+    """
+
+    def __init__(self, streams=None, fmt=None, extra=None, seek=None, duration=None, input_extra=None):
+        # Validates the format the same way as a regular output
+        output = Output(None, streams=streams, fmt=fmt, extra=extra)
+        self.streams = output.streams
+        self.format = output.format
+        self.extra = extra
+        self.seek = Duration(seek) if seek else None
+        self.duration = Duration(duration) if duration else None
+        self.input_extra = input_extra
+
+        self._input_args = _get_input_args(self.seek, self.duration, self.input_extra)
+
+        # Output arguments, with consecutive fixed arguments joined into lists, and streams that
+        # depend on the input kept to be bound to each source
+        self._output_parts = []
+        fixed = []
+        for s in self.streams:
+            if s.depends_on_input():
+                self._output_parts.extend([fixed, s])
+                fixed = []
+            else:
+                fixed.extend(s.get_args())
+        if self.format:
+            fixed.extend(self.format.get_args())
+        if self.extra:
+            fixed.extend(self.extra)
+        self._output_parts.append(fixed)
+
+    def get_input(self, source):
+        """
+        Returns the input definition for a source, with the template input settings
+
+        :param str source: input file path or stream URL
+        :rtype: :class:`Input`
+        :raises NoMediaError: if source doesn't exist
+        """
+
+        return Input(source, seek=self.seek, duration=self.duration, extra=self.input_extra)
+
+    def get_output(self, target):
+        """
+        Returns the output definition for a target, with the template output settings
+
+        :param str target: output file path
+        :rtype: :class:`Output`
+        """
+
+        return Output(target, streams=self.streams, fmt=self.format, extra=self.extra)
+
+    def get_args(self, source, target, threads=None, bind=False):
+        """
+        Builds ffmpeg command line arguments for converting a source
+
+        :param str source: input file path or stream URL
+        :param str target: output file path
+        :param int threads: number of threads to use (see :meth:`FFmpeg.get_args`) - optional
+        :param bool bind: whether to adapt the stream definitions to the source (see
+            :meth:`FFmpeg.bind`) - optional, default false
+        :rtype: list of strings
+        """
+
+        thread_args = ['-threads', str(threads)] if threads else []
+
+        args = ['-filter_threads', str(threads)] if threads else []
+        args.extend(thread_args)
+        args.extend(self._input_args)
+        args.extend(['-i', source])
+        args.extend(thread_args)
+
+        audio = None
+        resolved = False
+        for part in self._output_parts:
+            if isinstance(part, list):
+                args.extend(part)
+            elif bind:
+                if not resolved:
+                    audio = self.get_output(target)._get_audio_stream([self.get_input(source)])
+                    resolved = True
+                args.extend(part.bind(*audio).get_args() if audio else part.get_args())
+            else:
+                args.extend(part.get_args())
+
+        args.append(target)
+        return args
+
+    def job(self, source, target):
+        """
+        Creates a conversion job for a source
+
+        :param str source: input file path or stream URL
+        :param str target: output file path
+        :rtype: :class:`TemplateJob`
+        """
+
+        return TemplateJob(self, source, target)
+
+
+class TemplateJob(FFmpeg):
+    """
+    Conversion created from a :class:`JobTemplate` - don't create it directly, use :meth:`JobTemplate.job`.
+
+    The job can be run the same way as :class:`FFmpeg` (directly or in a
+    :class:`~avtk.backends.ffmpeg.jobs.JobPool`). Its :attr:`inputs` and :attr:`outputs` definitions
+    are only built if accessed.
+    """
+
+    def __init__(self, template, source, target):
+        self.template = template
+        self.source = source
+        self.target = target
+        self._bound = False
+
+    @property
+    def inputs(self):
+        return [self.template.get_input(self.source)]
+
+    @property
+    def outputs(self):
+        return [self.template.get_output(self.target)]
+
+    def bind(self):
+        bound = copy.copy(self)
+        bound.source = get_local_source(self.source)
+        bound._bound = True
+        return bound
+
+    def get_args(self, threads=None):
+        return self.template.get_args(self.source, self.target, threads=threads, bind=self._bound)
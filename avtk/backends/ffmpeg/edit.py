@@ -0,0 +1,421 @@
+"""
+Cutting and joining media files
+===============================
+
+The :mod:`avtk.backends.ffmpeg.edit` module contains helpers for cutting and joining media files,
+re-encoding as little as possible to keep the processing fast.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.edit import smart_cut, concat
+
+    >>> smart_cut('test-media/video/sintel.mkv', 1.5, 4, '/tmp/clip.mkv')
+    >>> concat(['/tmp/clip.mkv', 'test-media/video/sintel.mkv'], '/tmp/joined.mkv')
+"""
+
+from tempfile import TemporaryDirectory
+import os.path
+
+from .convert import (
+    FFmpeg, Input, Output, Duration,
+    Video, Audio, CopyVideo, NoVideo, NoAudio, CopyAudio, NoSubtitles
+)
+from .probe import MediaInfo
+
+# Encoders to use for re-encoding parts of streams, by codec name
+ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'vp8': 'libvpx',
+    'vp9': 'libvpx-vp9',
+    'av1': 'libaom-av1',
+    'mpeg4': 'mpeg4',
+    'mpeg2video': 'mpeg2video',
+}
+
+# Encoder profile names, by codec name and profile name reported by ffprobe. Profiles not listed here
+# are left to the encoder to choose.
+ENCODER_PROFILES = {
+    'h264': {
+        'Constrained Baseline': 'baseline',
+        'Baseline': 'baseline',
+        'Main': 'main',
+        'High': 'high',
+        'High 10': 'high10',
+        'High 4:2:2': 'high422',
+        'High 4:4:4 Predictive': 'high444',
+    },
+    'hevc': {
+        'Main': 'main',
+        'Main 10': 'main10',
+        'Main Still Picture': 'mainstillpicture',
+    },
+}
+
+# Encoders to use for re-encoding audio streams, by codec name
+AUDIO_ENCODERS = {
+    'aac': 'aac',
+    'opus': 'libopus',
+    'vorbis': 'libvorbis',
+    'mp3': 'libmp3lame',
+    'flac': 'flac',
+    'ac3': 'ac3',
+    'pcm_s16le': 'pcm_s16le',
+}
+
+# Container formats which store the video time base set by the muxer
+TIMESCALE_EXTENSIONS = ['.mp4', '.m4v', '.mov']
+
+# Stream properties which must match for the streams to be joined without re-encoding
+CONCAT_FIELDS = [
+    'video.codec', 'video.width', 'video.height', 'video.pix_fmt', 'video.time_base',
+    'audio.codec', 'audio.sample_rate', 'audio.channels', 'audio.time_base',
+]
+
+CONCAT_MODES = ['auto', 'copy', 'encode']
+
+# Intermediate container formats for stream parts. MPEG-TS repeats codec parameters in-band,
+# so parts encoded by different encoders can be joined without re-encoding.
+PART_FORMATS = {
+    'h264': 'mpegts',
+    'hevc': 'mpegts',
+    'mpeg2video': 'mpegts',
+}
+
+
+def _seconds(val):
+    return Duration(val).duration.total_seconds()
+
+
+def _get_keyframes(source, start, end):
+    """
+    Returns (pts, dts) timestamps (in seconds) of video keyframe packets with presentation
+    timestamps between start and end. Only packet headers are read, the video is not decoded.
+    """
+
+    # Packet inspection requires NumPy, which is an optional dependency
+    from .packets import iter_packets, get_time_base, NO_VALUE
+
+    time_base = float(get_time_base(source))
+    keyframes = []
+
+    for batch in iter_packets(source, interval=(start, end)):
+        batch = batch[batch['key'] & (batch['pts'] != NO_VALUE)]
+        pts = batch['pts'] * time_base
+        dts = batch['dts'] * time_base
+        for p, d, has_dts in zip(pts, dts, batch['dts'] != NO_VALUE):
+            if start <= p <= end:
+                keyframes.append((float(p), float(d) if has_dts else float(p)))
+
+    return sorted(keyframes)
+
+
+def _get_matching_encoder(info):
+    """
+    Builds a video stream definition producing output compatible with the source video stream,
+    so re-encoded parts can be joined with copied ones.
+    """
+
+    stream = info.video_streams[0]
+    encoder = ENCODERS.get(stream.codec.name)
+    if encoder is None:
+        raise ValueError("re-encoding %s video is not supported" % stream.codec.name)
+
+    extra = []
+    if stream.pix_fmt:
+        extra.extend(['-pix_fmt', stream.pix_fmt])
+    profile = ENCODER_PROFILES.get(stream.codec.name, {}).get(stream.codec.profile)
+    if profile:
+        extra.extend(['-profile:v', profile])
+
+    return Video(encoder, bit_rate=stream.bit_rate or info.format.bit_rate, extra=extra)
+
+
+def _write_concat_list(path, parts):
+    """
+    Writes a list of files for the concat demuxer. Each part is either a file path,
+    or a (path, inpoint, outpoint) tuple.
+    """
+
+    with open(path, 'w') as fp:
+        for part in parts:
+            part, inpoint, outpoint = part if isinstance(part, tuple) else (part, None, None)
+            fp.write("file '%s'\n" % os.path.abspath(part).replace("'", "'\\''"))
+            if inpoint is not None:
+                fp.write('inpoint %f\n' % inpoint)
+            if outpoint is not None:
+                fp.write('outpoint %f\n' % outpoint)
+
+
+def smart_cut(source, start, end, output, fmt=None):
+    """
+    Cuts out a part of a video file, frame-accurately and with minimal re-encoding.
+
+    Cutting a video without re-encoding (using :data:`~avtk.backends.ffmpeg.convert.CopyVideo`) is fast,
+    but can only cut at keyframes. Re-encoding the entire clip is frame-accurate, but slow. Smart cut
+    re-encodes only the partial groups of pictures at the start and the end of the clip, copies
+    everything in between, and joins the parts together.
+
+    The re-encoded parts use the same codec, profile and pixel format as the source. Audio is copied
+    from the source, and subtitles are dropped. Finding the keyframes requires NumPy
+    (``pip install avtk[numpy]``).
+
+    :param str source: input file path
+    :param start: start of the clip
+    :type start: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param end: end of the clip
+    :type end: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param str output: output file path
+    :param fmt: output format - optional, default is to guess from output file name
+    :type fmt: :class:`~avtk.backends.ffmpeg.convert.Format`, *str* or *None*
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the clip is empty, or the source video codec can't be re-encoded
+
+    Example::
+
+        from avtk.backends.ffmpeg.edit import smart_cut
+
+        # Cut from 1:00:03.5 to 1:02:00.25 of a long video
+        smart_cut('movie.mkv', 3603.5, 3720.25, '/tmp/clip.mkv')
+    """
+
+    start = _seconds(start)
+    end = _seconds(end)
+    if end <= start:
+        raise ValueError("clip end must be after its start")
+
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    encoder = _get_matching_encoder(info)
+    part_fmt = PART_FORMATS.get(info.video_streams[0].codec.name, 'matroska')
+
+    # Seek positions are relative to the source start time, but packet timestamps aren't
+    offset = info.format.start_time.total_seconds() if info.format.start_time else 0
+    keyframes = _get_keyframes(source, start + offset, end + offset)
+
+    with TemporaryDirectory() as tmpdir:
+        parts = []
+
+        def add_part(inputs, stream):
+            path = os.path.join(tmpdir, 'part%d' % len(parts))
+            FFmpeg(
+                inputs,
+                Output(
+                    path,
+                    streams=[stream, NoAudio, NoSubtitles],
+                    fmt=part_fmt,
+                    extra=['-map', '0:v:0', '-avoid_negative_ts', 'make_zero']
+                )
+            ).run()
+            parts.append(path)
+
+        def encode_part(part_start, part_end):
+            if part_end > part_start:
+                add_part(Input(source, seek=part_start, duration=part_end - part_start), encoder)
+
+        if len(keyframes) < 2:
+            # No complete GOP inside the clip, nothing to copy
+            encode_part(start, end)
+        else:
+            (copy_start, _), (copy_end, copy_end_dts) = keyframes[0], keyframes[-1]
+
+            encode_part(start, copy_start - offset)
+
+            # Copy complete GOPs from the first to the last keyframe inside the clip. The concat
+            # demuxer starts exactly at the in point keyframe, and stops before the packet with
+            # the out point decoding timestamp (that is, just before the last keyframe).
+            list_path = os.path.join(tmpdir, 'copy.txt')
+            _write_concat_list(list_path, [(source, copy_start, copy_end_dts)])
+            add_part(Input(list_path, extra=['-f', 'concat', '-safe', '0']), CopyVideo)
+
+            encode_part(copy_end - offset, end)
+
+        list_path = os.path.join(tmpdir, 'parts.txt')
+        _write_concat_list(list_path, parts)
+
+        return FFmpeg(
+            [
+                Input(list_path, extra=['-f', 'concat', '-safe', '0']),
+                Input(source, seek=start, duration=end - start),
+            ],
+            Output(
+                output,
+                streams=[CopyVideo, CopyAudio, NoSubtitles],
+                fmt=fmt,
+                extra=['-map', '0:v:0', '-map', '1:a?']
+            )
+        ).run()
+
+
+def _get_signature(info):
+    """
+    Returns stream properties which must match for the media files to be joined without re-encoding.
+    """
+
+    video = tuple(
+        (s.codec.name, s.codec.profile, s.width, s.height, s.pix_fmt, s.time_base)
+        for s in info.video_streams[:1]
+    )
+    audio = tuple(
+        (s.codec.name, s.sample_rate, s.channels, s.time_base)
+        for s in info.audio_streams[:1]
+    )
+    return video, audio
+
+
+def _get_matching_streams(info, ext):
+    """
+    Builds stream definitions re-encoding any input to the same format as the reference media.
+    """
+
+    streams = []
+    extra = []
+
+    if info.has_video:
+        stream = info.video_streams[0]
+        video = _get_matching_encoder(info)
+        video.scale = (stream.width, stream.height)
+        if stream.frame_rate:
+            video.extra.extend(['-r', str(stream.frame_rate)])
+        streams.append(video)
+
+        if stream.time_base and ext in TIMESCALE_EXTENSIONS:
+            extra.extend(['-video_track_timescale', str(stream.time_base.denominator)])
+    else:
+        streams.append(NoVideo)
+
+    if info.has_audio:
+        stream = info.audio_streams[0]
+        encoder = AUDIO_ENCODERS.get(stream.codec.name)
+        if encoder is None:
+            raise ValueError("re-encoding %s audio is not supported" % stream.codec.name)
+
+        streams.append(Audio(
+            encoder,
+            channels=stream.channels,
+            bit_rate=stream.bit_rate,
+            extra=['-ar', str(stream.sample_rate)] if stream.sample_rate else None
+        ))
+    else:
+        streams.append(NoAudio)
+
+    streams.append(NoSubtitles)
+    return streams, extra
+
+
+def concat(sources, output, mode='auto', fmt=None):
+    """
+    Joins media files one after another.
+
+    If all the sources have the same codecs, resolution, time bases and (for audio) sample rates
+    and channels, they're joined without re-encoding, so even joining hundreds of files runs
+    at disk speed. Otherwise, the sources which don't match the first one are re-encoded to
+    its format, and then everything is joined without re-encoding. For H.264, HEVC and MPEG-2
+    video, all the parts are first put into MPEG-TS (see :data:`PART_FORMATS`), so parts with
+    different codec parameters can be joined.
+
+    Only the first video and audio streams of each file are joined. Subtitles are dropped, and so
+    are video or audio streams of the other sources if the first one doesn't have them. A source
+    missing a stream type the first one has can't be joined.
+
+    :param list(str) sources: input file paths
+    :param str output: output file path
+    :param str mode: ``auto`` to re-encode only the mismatching sources, ``copy`` to raise an error
+        if there are any, or ``encode`` to re-encode all of them - optional, default is ``auto``
+    :param fmt: output format - optional, default is to guess from output file name
+    :type fmt: :class:`~avtk.backends.ffmpeg.convert.Format`, *str* or *None*
+    :raises NoMediaError: if a source doesn't exist or is of unknown format
+    :raises ValueError: if there are no sources, mode is invalid, a source is missing the video
+        or audio stream, or the sources can't be joined in the requested mode
+
+    Example::
+
+        from avtk.backends.ffmpeg.edit import concat
+
+        # Join recorded segments, failing if any would need re-encoding
+        concat(['rec-000.ts', 'rec-001.ts', 'rec-002.ts'], '/tmp/recording.ts', mode='copy')
+    """
+
+    if mode not in CONCAT_MODES:
+        raise ValueError("invalid concat mode %s, expected one of: %s" % (mode, ', '.join(CONCAT_MODES)))
+    if not sources:
+        raise ValueError("no sources to join")
+
+    reference = MediaInfo(sources[0])
+    if not reference.has_video and not reference.has_audio:
+        raise ValueError("%s has no audio or video streams" % sources[0])
+
+    signature = _get_signature(reference)
+    mismatched = set(range(len(sources))) if mode == 'encode' else set()
+
+    for i, source in enumerate(sources[1:], 1):
+        info = MediaInfo(source, fields=CONCAT_FIELDS)
+
+        # Re-encoding only drops the streams the reference doesn't have, so every part must have
+        # all of its streams, otherwise the parts would have different stream layouts
+        missing = [kind for kind, present, required in [
+            ('video', info.has_video, reference.has_video),
+            ('audio', info.has_audio, reference.has_audio),
+        ] if required and not present]
+        if missing:
+            raise ValueError("can't join %s to %s, it has no %s stream" % (
+                source, sources[0], ' or '.join(missing)
+            ))
+
+        if _get_signature(info) != signature:
+            mismatched.add(i)
+
+    if mismatched and mode == 'copy':
+        raise ValueError("can't join without re-encoding, format of %s doesn't match %s" % (
+            ', '.join(sources[i] for i in sorted(mismatched)),
+            sources[0]
+        ))
+
+    with TemporaryDirectory() as tmpdir:
+        parts = list(sources)
+        output_extra = []
+
+        if mismatched:
+            ext = os.path.splitext(sources[0])[1].lower() or '.mkv'
+            codec = reference.video_streams[0].codec.name if reference.has_video else None
+            part_fmt = PART_FORMATS.get(codec)
+
+            if part_fmt:
+                # Each encoded part has its own codec parameters (eg. H.264 SPS/PPS), which containers
+                # like MP4 and Matroska store only once per file, so all the parts (including the copied
+                # ones) are put into a container repeating them in-band, as in smart_cut()
+                streams, output_extra = _get_matching_streams(reference, os.path.splitext(output)[1].lower())
+                extra = []
+                part_indexes = range(len(sources))
+                ext = '.ts'
+            else:
+                streams, extra = _get_matching_streams(reference, ext)
+                part_indexes = sorted(mismatched)
+
+            for i in part_indexes:
+                parts[i] = os.path.join(tmpdir, 'part%d%s' % (i, ext))
+                encode = i in mismatched
+                FFmpeg(
+                    sources[i],
+                    Output(
+                        parts[i],
+                        streams=streams if encode else [CopyVideo, CopyAudio, NoSubtitles],
+                        fmt=part_fmt,
+                        extra=['-map', '0:v:0?', '-map', '0:a:0?'] + (extra if encode else [])
+                    )
+                ).run()
+
+        list_path = os.path.join(tmpdir, 'parts.txt')
+        _write_concat_list(list_path, parts)
+
+        return FFmpeg(
+            Input(list_path, extra=['-f', 'concat', '-safe', '0']),
+            Output(
+                output,
+                streams=[CopyVideo, CopyAudio, NoSubtitles],
+                fmt=fmt,
+                extra=['-map', '0:v:0?', '-map', '0:a:0?'] + output_extra
+            )
+        ).run()
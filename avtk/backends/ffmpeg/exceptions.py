@@ -1,2 +1,41 @@
 class NoMediaError(Exception):
-    pass
+    """
+    Raised when the source doesn't exist or ``ffprobe`` can't read it.
+
+    :Attributes:
+        * events (*list* of :class:`~avtk.backends.ffmpeg.run.LogEvent`) - most recent ``ffprobe`` log
+          events before the failure, empty if ``ffprobe`` wasn't run
+        * returncode (*int*) - ``ffprobe`` exit status, or *None* if it wasn't run
+    """
+
+    def __init__(self, *args, events=(), returncode=None):
+        super().__init__(*args)
+        self.events = list(events)
+        self.returncode = returncode
+
+
+class FFmpegError(RuntimeError):
+    """
+    Raised when ``ffmpeg`` or ``ffprobe`` fails.
+
+    :Attributes:
+        * events (*list* of :class:`~avtk.backends.ffmpeg.run.LogEvent`) - most recent log events
+          (up to :data:`~avtk.backends.ffmpeg.run.MAX_LOG_EVENTS`) before the failure
+        * returncode (*int*) - process exit status
+        * usage (:class:`~avtk.backends.ffmpeg.run.ResourceUsage`) - resources used by the failed
+          process, or *None* if unknown
+    """
+
+    def __init__(self, events, returncode=None, usage=None):
+        self.events = list(events)
+        self.returncode = returncode
+        self.usage = usage
+        super().__init__('\n'.join(str(event) for event in self.events))
+
+    @property
+    def errors(self):
+        """
+        Log events with level *error* or more severe.
+        """
+
+        return [event for event in self.events if event.is_error]
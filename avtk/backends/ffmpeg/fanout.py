@@ -0,0 +1,355 @@
+"""
+Shared-memory frame fan-out
+===========================
+
+The :mod:`avtk.backends.ffmpeg.fanout` module decodes a video once and shares the decoded
+frames with several consumer processes (eg. different analysis models), so the decoding cost
+is paid only once no matter how many consumers there are.
+
+A single ``ffmpeg`` process decodes the video to raw frames, which are read directly into a ring
+buffer of frame slots in shared memory (see :mod:`multiprocessing.shared_memory`). Each consumer
+process attaches to the shared memory by name and gets the frames as NumPy arrays pointing directly
+into the shared memory, without any copying. Frames are numbered by sequence numbers, and each
+consumer records how far it got; a slot is reused only after all the consumers are done with the
+frame in it, so the slowest consumer sets the pace (backpressure) and no consumer misses a frame.
+
+This module requires NumPy (``pip install avtk[numpy]``) and Python 3.8 or later.
+
+Example usage::
+
+    >>> from multiprocessing import Process
+    >>> from avtk.backends.ffmpeg.fanout import FrameFanout, FrameReader
+
+    >>> def detect(name, consumer):
+    ...     with FrameReader(name, consumer) as reader:
+    ...         for seq, frame in reader:
+    ...             run_detection(frame)  # frame is a (height, width, 3) uint8 array
+
+    >>> with FrameFanout('test-media/video/sintel.mkv', consumers=2, size=(640, 360)) as fanout:
+    ...     workers = [Process(target=detect, args=(fanout.name, i)) for i in range(2)]
+    ...     for w in workers:
+    ...         w.start()
+    ...     fanout.run()
+    ...     for w in workers:
+    ...         w.join()
+
+Frames handed out to a consumer are valid only until it asks for the next frame, after which
+the producer may overwrite them. Consumers that need to keep a frame longer must copy it.
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+from time import monotonic, sleep
+import os
+
+import numpy as np
+
+from .probe import MediaInfo
+from .run import ffmpeg_pipe
+
+PIXEL_FORMATS = {
+    'rgb24': 3,
+    'bgr24': 3,
+    'rgba': 4,
+    'gray': 1,
+}  #: Supported pixel formats and their number of bytes per pixel
+
+DEFAULT_SLOTS = 8  #: Default number of frame slots in the ring buffer
+MIN_POLL_INTERVAL = 0.0005  # First sleep while waiting for the other side, in seconds
+MAX_POLL_INTERVAL = 0.01  # Longest sleep while waiting for the other side, in seconds
+
+# Shared memory layout: header, consumer positions, slot sequence numbers (all int64), and frame data
+HEADER_FIELDS = ['written', 'state', 'width', 'height', 'channels', 'slots', 'consumers', 'reserved']
+HEADER_SIZE = len(HEADER_FIELDS)
+DATA_ALIGNMENT = 64
+
+# Producer states
+RUNNING = 0
+FINISHED = 1
+FAILED = 2
+
+DETACHED = np.iinfo(np.int64).max  # Position of consumers that detached; they never hold back the producer
+
+
+def _get_layout(slots, consumers):
+    positions = HEADER_SIZE
+    sequences = positions + consumers
+    data_offset = (sequences + slots) * 8
+    data_offset += -data_offset % DATA_ALIGNMENT
+    return positions, sequences, data_offset
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # Before Python 3.13, attaching registers the memory with the resource tracker, which then destroys
+    # it when the consumer process exits, so the registration is dropped right away. If the tracker is
+    # shared with the producer, this drops the producer's registration as well, which the producer
+    # restores before unlinking the memory (see FrameFanout.close)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix':
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _wait(condition, timeout=None):
+    """
+    Sleeps until *condition* returns true, polling less often the longer it takes.
+    """
+
+    started = monotonic()
+    delay = MIN_POLL_INTERVAL
+    while not condition():
+        if timeout is not None and monotonic() - started > timeout:
+            return False
+        sleep(delay)
+        delay = min(delay * 2, MAX_POLL_INTERVAL)
+    return True
+
+
+class _SharedRing:
+    """
+    Views into the shared ring buffer memory.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        self.width, self.height, self.channels, self.slots, self.consumers = [
+            int(self.header[HEADER_FIELDS.index(field)])
+            for field in ['width', 'height', 'channels', 'slots', 'consumers']
+        ]
+
+        positions, sequences, data_offset = _get_layout(self.slots, self.consumers)
+        self.positions = np.ndarray((self.consumers,), dtype=np.int64, buffer=shm.buf, offset=positions * 8)
+        self.sequences = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=sequences * 8)
+
+        shape = (self.slots, self.height, self.width, self.channels)
+        self.frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=data_offset)
+        if self.channels == 1:
+            self.frames = self.frames[..., 0]
+
+    @property
+    def written(self):
+        return int(self.header[0])
+
+    @property
+    def state(self):
+        return int(self.header[1])
+
+    def release(self):
+        # NumPy views must be gone before the memory can be closed
+        self.header = self.positions = self.sequences = self.frames = None
+        self.shm.close()
+
+
+class FrameFanout:
+    """
+    Decodes a video into a shared memory ring buffer, for several consumer processes.
+
+    :param str source: input file path or stream URL
+    :param int consumers: number of consumer processes which will read the frames
+    :param tuple size: scale the frames to (width, height) - optional, default is the video size
+    :param str pix_fmt: frame pixel format, one of :data:`PIXEL_FORMATS` - optional, default is *rgb24*
+    :param fps: convert to this frame rate - optional, default is the video frame rate
+    :type fps: int, float or str
+    :param int slots: number of frames in the ring buffer - optional, default is :data:`DEFAULT_SLOTS`
+    :param float stall_timeout: give up if the consumers don't make progress for this many seconds - optional,
+        default is to wait indefinitely
+    :raises ValueError: if the pixel format is not supported, or the source has no video
+
+    The shared memory is created immediately, so the consumers can attach to it (using :attr:`name`)
+    before decoding is started using :meth:`run`. Use as a context manager, or call :meth:`close` when
+    done, to free the shared memory.
+    """
+
+    def __init__(
+        self, source, consumers, size=None, pix_fmt='rgb24', fps=None, slots=DEFAULT_SLOTS, stall_timeout=None
+    ):
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError("unsupported pixel format %s, expected one of: %s" % (pix_fmt, ', '.join(PIXEL_FORMATS)))
+        if consumers < 1 or slots < 1:
+            raise ValueError("at least one consumer and slot are required")
+
+        if size is None:
+            info = MediaInfo(source)
+            if not info.has_video:
+                raise ValueError("source has no video stream")
+            size = (info.video_streams[0].width, info.video_streams[0].height)
+
+        self.source = source
+        self.size = tuple(size)
+        self.pix_fmt = pix_fmt
+        self.fps = fps
+        self.stall_timeout = stall_timeout
+
+        width, height = self.size
+        channels = PIXEL_FORMATS[pix_fmt]
+        self.frame_size = width * height * channels
+
+        _, _, data_offset = _get_layout(slots, consumers)
+        self._shm = shared_memory.SharedMemory(create=True, size=data_offset + slots * self.frame_size)
+
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        header[:] = [0, RUNNING, width, height, channels, slots, consumers, 0]
+        del header
+
+        self._ring = _SharedRing(self._shm)
+        self._ring.positions[:] = 0
+        self._ring.sequences[:] = -1
+
+    @property
+    def name(self):
+        """Shared memory name, which the consumers need to attach"""
+        return self._shm.name
+
+    def _get_args(self):
+        filters = ['scale=%d:%d' % self.size]
+        if self.fps:
+            filters.insert(0, 'fps=%s' % self.fps)
+
+        return [
+            '-i', self.source,
+            '-map', '0:v:0',
+            '-vf', ','.join(filters),
+            '-pix_fmt', self.pix_fmt,
+            '-f', 'rawvideo', '-'
+        ]
+
+    def _wait_for_slot(self, seq):
+        # The slot is free once all consumers are done with the frame that was written
+        # into it one lap ago
+        ring = self._ring
+        if not _wait(lambda: int(ring.positions.min()) > seq - ring.slots, self.stall_timeout):
+            raise TimeoutError("consumers stopped reading frames")
+
+    def run(self):
+        """
+        Decodes the video, blocking until all the frames are written to the ring buffer.
+
+        :returns: number of frames decoded
+        :rtype: int
+        :raises FFmpegError: if decoding fails
+        :raises TimeoutError: if the consumers stall for longer than *stall_timeout*
+        """
+
+        ring = self._ring
+        seq = 0
+        try:
+            with ffmpeg_pipe(self._get_args()) as stdout:
+                while True:
+                    self._wait_for_slot(seq)
+                    slot = seq % ring.slots
+
+                    # Read directly into the shared memory, without intermediate copies
+                    view = memoryview(ring.frames[slot].reshape(-1))
+                    filled = 0
+                    while filled < self.frame_size:
+                        n = stdout.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    view.release()
+
+                    if filled < self.frame_size:
+                        break
+
+                    ring.sequences[slot] = seq
+                    seq += 1
+                    ring.header[0] = seq
+        except BaseException:
+            ring.header[1] = FAILED
+            raise
+
+        ring.header[1] = FINISHED
+        return seq
+
+    def close(self):
+        """
+        Frees the shared memory, after :meth:`run` has finished. Consumers which are still attached keep
+        their mapping until they detach.
+        """
+
+        if self._ring is not None:
+            self._ring.release()
+            self._ring = None
+            if os.name == 'posix':
+                # Consumers sharing the resource tracker may have dropped the registration (see _attach),
+                # and unlinking unregisters the memory again
+                resource_tracker.register(self._shm._name, 'shared_memory')
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FrameReader:
+    """
+    Reads frames from a :class:`FrameFanout` ring buffer, in a consumer process.
+
+    :param str name: shared memory name (see :attr:`FrameFanout.name`)
+    :param int consumer: consumer index, from 0 to the number of consumers minus one; each consumer
+        process must use a different index
+
+    Iterating over the reader yields (sequence number, frame) tuples, where frame is a NumPy array
+    of shape (height, width, channels), or (height, width) for the *gray* pixel format, pointing into
+    the shared memory. Use as a context manager, or call :meth:`close` when done, so the producer doesn't
+    wait for this consumer anymore.
+
+    :raises RuntimeError: (while iterating) if the producer failed
+    """
+
+    def __init__(self, name, consumer):
+        self._ring = _SharedRing(_attach(name))
+        if not 0 <= consumer < self._ring.consumers:
+            self._ring.release()
+            raise ValueError("consumer index must be between 0 and %d" % (self._ring.consumers - 1))
+
+        self.consumer = consumer
+        self.width = self._ring.width
+        self.height = self._ring.height
+
+    def __iter__(self):
+        ring = self._ring
+        seq = int(ring.positions[self.consumer])
+
+        while True:
+            if ring.written <= seq:
+                _wait(lambda: ring.written > seq or ring.state != RUNNING)
+                if ring.written <= seq:
+                    if ring.state == FAILED:
+                        raise RuntimeError("frame producer failed")
+                    return
+
+            if ring.sequences[seq % ring.slots] != seq:
+                raise RuntimeError("frame %d was overwritten before it was read" % seq)
+            yield seq, ring.frames[seq % ring.slots]
+
+            # The caller asked for the next frame, so it's done with this one
+            seq += 1
+            ring.positions[self.consumer] = seq
+
+    def close(self):
+        """
+        Detaches from the ring buffer. Frames obtained from the reader must not be used afterwards.
+        """
+
+        if self._ring is not None:
+            self._ring.positions[self.consumer] = DETACHED
+            try:
+                self._ring.release()
+            except BufferError:
+                # Caller still holds references to some frames; the memory is unmapped once they're gone
+                pass
+            self._ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
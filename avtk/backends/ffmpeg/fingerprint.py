@@ -0,0 +1,294 @@
+"""
+Near-duplicate video detection
+==============================
+
+The :mod:`avtk.backends.ffmpeg.fingerprint` module computes perceptual fingerprints of videos,
+which stay (almost) the same when a video is re-encoded, resized or recompressed, and an index
+for quickly finding videos with similar fingerprints.
+
+A fingerprint is built from a fixed number of frames sampled evenly over the video, decoded by a
+single ``ffmpeg`` invocation at a tiny size and in grayscale. Two 64-bit perceptual hashes are
+computed for each frame: a DCT-based hash (pHash), capturing the overall structure of the frame,
+and a difference hash (dHash), capturing the gradients. Similarity of two fingerprints is measured
+as the Hamming distance (number of differing bits) between them.
+
+This module requires NumPy (``pip install avtk[numpy]``).
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.fingerprint import fingerprint, FingerprintIndex
+
+    >>> index = FingerprintIndex()
+    >>> index.add('sintel', fingerprint('test-media/video/sintel.mkv'))
+    >>> index.query(fingerprint('/tmp/sintel-reencoded.mp4'), radius=64)
+    [('sintel', 12)]
+    >>> index.save('/tmp/fingerprints.npz')
+
+Frames are sampled relative to the video duration, so fingerprints of videos which were trimmed
+or padded differ more than those of plain re-encodes.
+"""
+
+import numpy as np
+
+from .probe import MediaInfo, _check_source
+from .run import ffmpeg
+
+DEFAULT_FRAMES = 8  #: Default number of frames sampled for a fingerprint
+
+FRAME_SIZE = 32  # Frames are decoded at 32x32 pixels
+HASH_SIZE = 8  # Hashes are computed from 8x8 features, giving 64 bits
+
+QUERY_BLOCK_SIZE = 65536  # Number of index entries compared at once, to bound temporary memory use
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, np.newaxis]
+    i = np.arange(n)[np.newaxis, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(FRAME_SIZE)
+_BYTE_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _pack_bits(bits):
+    """
+    Packs boolean arrays of shape (n, 64) into n 64-bit integers.
+    """
+
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view('>u8').astype(np.uint64).ravel()
+
+
+def _phash(frames):
+    # Low frequencies of the 2D DCT, compared to their median (excluding the DC term)
+    coeffs = (_DCT @ frames @ _DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(frames), -1)
+    medians = np.median(coeffs[:, 1:], axis=1)[:, np.newaxis]
+    return _pack_bits(coeffs > medians)
+
+
+def _dhash(frames):
+    # Shrink to 9x8 (average of row blocks, interpolated columns), and compare horizontal neighbours
+    rows = frames.reshape(len(frames), HASH_SIZE, -1, FRAME_SIZE).mean(axis=2)
+    positions = np.linspace(0, FRAME_SIZE - 1, HASH_SIZE + 1)
+    left = np.floor(positions).astype(int)
+    right = np.minimum(left + 1, FRAME_SIZE - 1)
+    weight = positions - left
+    small = rows[:, :, left] * (1 - weight) + rows[:, :, right] * weight
+    return _pack_bits(small[:, :, 1:] > small[:, :, :-1])
+
+
+def _popcount(values):
+    """
+    Counts set bits in each row of a 2D uint64 array.
+    """
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).sum(axis=1, dtype=np.int64)
+    return _BYTE_BITS[values.view(np.uint8)].reshape(len(values), -1).sum(axis=1, dtype=np.int64)
+
+
+class Fingerprint:
+    """
+    Perceptual fingerprint of a video.
+
+    :Attributes:
+        * phash (*numpy.ndarray* of *uint64*) - DCT-based hash of each sampled frame
+        * dhash (*numpy.ndarray* of *uint64*) - difference hash of each sampled frame
+        * words (*numpy.ndarray* of *uint64*) - both hashes of all frames, as stored in the index
+    """
+
+    def __init__(self, phash, dhash):
+        self.phash = np.asarray(phash, dtype=np.uint64)
+        self.dhash = np.asarray(dhash, dtype=np.uint64)
+        self.words = np.concatenate([self.phash, self.dhash])
+
+    @classmethod
+    def from_frames(cls, frames):
+        """
+        Computes the fingerprint from grayscale frames.
+
+        :param frames: sampled frames, 32x32 pixels each
+        :type frames: *numpy.ndarray* of shape (frames, 32, 32)
+        :rtype: :class:`Fingerprint`
+        """
+
+        frames = np.asarray(frames, dtype=np.float64)
+        return cls(_phash(frames), _dhash(frames))
+
+    @property
+    def bits(self):
+        """Fingerprint size in bits"""
+        return len(self.words) * 64
+
+    def distance(self, other):
+        """
+        Hamming distance (number of differing bits) to another fingerprint.
+
+        :param other: fingerprint to compare to, computed using the same number of frames
+        :type other: :class:`Fingerprint`
+        :rtype: int
+        """
+
+        if len(self.words) != len(other.words):
+            raise ValueError("fingerprints have different sizes")
+        return int(_popcount((self.words ^ other.words)[np.newaxis, :])[0])
+
+    def __repr__(self):
+        return '<Fingerprint(frames=%d)>' % len(self.phash)
+
+
+def fingerprint(source, frames=DEFAULT_FRAMES):
+    """
+    Computes a perceptual fingerprint of a video.
+
+    :param str source: input file path or stream URL
+    :param int frames: number of frames to sample - optional, default is :data:`DEFAULT_FRAMES`
+    :rtype: :class:`Fingerprint`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the source has no video, or no frames could be decoded
+
+    Frames are sampled at the middle of *frames* equal intervals spanning the video. Only
+    fingerprints computed with the same number of frames can be compared.
+    """
+
+    _check_source(source)
+
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    duration = info.format.duration.total_seconds() if info.format.duration else 0
+    if duration <= 0:
+        raise ValueError("can't determine video duration")
+
+    interval = duration / frames
+    data = ffmpeg([
+        '-ss', str(interval / 2), '-i', source,
+        '-map', '0:v:0',
+        '-vf', 'fps=fps=1/%f,scale=%d:%d:flags=area,format=gray' % (interval, FRAME_SIZE, FRAME_SIZE),
+        '-frames:v', str(frames),
+        '-f', 'rawvideo', '-'
+    ], text=False)
+
+    count = len(data) // (FRAME_SIZE * FRAME_SIZE)
+    if count == 0:
+        raise ValueError("no frames decoded from source")
+
+    decoded = np.frombuffer(data, dtype=np.uint8, count=count * FRAME_SIZE * FRAME_SIZE)
+    decoded = decoded.reshape(count, FRAME_SIZE, FRAME_SIZE)
+    if count < frames:
+        # Very short videos may not have enough frames; repeat the last one so all fingerprints have the same size
+        decoded = np.concatenate([decoded, np.repeat(decoded[-1:], frames - count, axis=0)])
+
+    return Fingerprint.from_frames(decoded)
+
+
+class FingerprintIndex:
+    """
+    Index of video fingerprints, for finding near-duplicates.
+
+    Fingerprints are stored in a packed array of 64-bit integers, and queries compare the query
+    fingerprint to all the indexed ones using vectorised bit operations, which takes milliseconds
+    even for millions of indexed fingerprints.
+
+    All indexed fingerprints must be computed using the same number of frames.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._words = None
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def keys(self):
+        """Keys of all indexed fingerprints, in order they were added"""
+        return list(self._keys)
+
+    def add(self, key, fingerprint):
+        """
+        Adds a fingerprint to the index.
+
+        :param key: identifier of the video (eg. its path or database ID)
+        :param fingerprint: video fingerprint
+        :type fingerprint: :class:`Fingerprint`
+        :raises ValueError: if the fingerprint size doesn't match the indexed fingerprints
+        """
+
+        words = fingerprint.words
+        if self._words is None:
+            self._words = np.empty((16, len(words)), dtype=np.uint64)
+        elif len(words) != self._words.shape[1]:
+            raise ValueError("fingerprint size doesn't match the index")
+
+        if self._count == len(self._words):
+            grown = np.empty((len(self._words) * 2, self._words.shape[1]), dtype=np.uint64)
+            grown[:self._count] = self._words[:self._count]
+            self._words = grown
+
+        self._words[self._count] = words
+        self._keys.append(key)
+        self._count += 1
+
+    def query(self, fingerprint, radius):
+        """
+        Finds indexed fingerprints similar to the given one.
+
+        :param fingerprint: fingerprint to look for
+        :type fingerprint: :class:`Fingerprint`
+        :param int radius: maximum Hamming distance (number of differing bits) to the indexed fingerprints
+        :returns: (key, distance) tuples for the matching fingerprints, closest first
+        :rtype: list(tuple)
+        :raises ValueError: if the fingerprint size doesn't match the indexed fingerprints
+
+        Re-encodes of the same video usually differ in a few percent of the bits, while unrelated
+        videos differ in about half of them, so a radius of around 10% of :attr:`Fingerprint.bits`
+        works well in practice.
+        """
+
+        if not self._count:
+            return []
+
+        words = fingerprint.words
+        if len(words) != self._words.shape[1]:
+            raise ValueError("fingerprint size doesn't match the index")
+
+        matches = []
+        for start in range(0, self._count, QUERY_BLOCK_SIZE):
+            block = self._words[start:min(start + QUERY_BLOCK_SIZE, self._count)]
+            distances = _popcount(block ^ words)
+            for i in np.flatnonzero(distances <= radius):
+                matches.append((self._keys[start + i], int(distances[i])))
+
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def save(self, path):
+        """
+        Saves the index to a file (in NumPy ``.npz`` format).
+
+        :param str path: output file path
+        """
+
+        words = self._words[:self._count] if self._words is not None else np.empty((0, 0), dtype=np.uint64)
+        with open(path, 'wb') as fp:
+            np.savez(fp, words=words, keys=np.array([str(key) for key in self._keys]))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index saved by :meth:`save`. The keys are loaded as strings.
+
+        :param str path: index file path
+        :rtype: :class:`FingerprintIndex`
+        """
+
+        index = cls()
+        with np.load(path) as data:
+            if len(data['keys']):
+                index._words = np.array(data['words'], dtype=np.uint64)
+                index._keys = data['keys'].tolist()
+                index._count = len(index._keys)
+        return index
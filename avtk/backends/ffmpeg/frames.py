@@ -0,0 +1,126 @@
+"""
+Frame sampling
+==============
+
+The :mod:`avtk.backends.ffmpeg.frames` module extracts a number of frames evenly spaced across
+a video, scaled to a fixed size, as a single NumPy array - eg. for building machine learning
+datasets or running image models over a video.
+
+Instead of launching a separate process per frame, each ``ffmpeg`` process opens the source once
+per sampled frame, seeks to the frame position, and scales the decoded frames in its filter graph,
+so only small raw frames are sent back. Batches of frames are extracted by a few processes running
+in parallel (see :class:`~avtk.backends.ffmpeg.jobs.JobPool`).
+
+This module requires NumPy (``pip install avtk[numpy]``).
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.frames import sample_frames
+
+    >>> frames = sample_frames('test-media/video/sintel.mkv', 16, size=(224, 224))
+    >>> frames.shape
+    (16, 224, 224, 3)
+"""
+
+import numpy as np
+
+from .convert import FFmpeg, Input, Output, Video, NoAudio, NoSubtitles
+from .jobs import JobPool, get_available_cpus
+from .probe import MediaInfo
+
+ACCURACY_MODES = ['keyframe', 'exact']  #: Supported seek accuracy modes
+
+DEFAULT_BATCH_SIZE = 16  #: Default maximum number of frames extracted by a single process
+
+
+def _get_positions(duration, n):
+    # Middle of each of n equal intervals, avoiding the very start and end of the video
+    return [duration * (i + 0.5) / n for i in range(n)]
+
+
+def _make_job(source, positions, size, accuracy):
+    if accuracy == 'keyframe':
+        # Decode only keyframes and don't decode forward to the exact position
+        seek_args = ['-noaccurate_seek', '-skip_frame', 'nokey']
+    else:
+        seek_args = None
+
+    width, height = size
+    graph = ';'.join(
+        '[%d:v:0]trim=end_frame=1,setpts=PTS-STARTPTS,scale=%d:%d,setsar=1,format=rgb24[v%d]' % (i, width, height, i)
+        for i in range(len(positions))
+    )
+    graph += ';%sconcat=n=%d:v=1:a=0[out]' % (''.join('[v%d]' % i for i in range(len(positions))), len(positions))
+
+    return FFmpeg(
+        [Input(source, seek=pos, extra=seek_args) for pos in positions],
+        Output(
+            '-',
+            streams=[Video('rawvideo', extra=['-pix_fmt', 'rgb24']), NoAudio, NoSubtitles],
+            fmt='rawvideo',
+            extra=[
+                '-filter_complex', graph,
+                '-map', '[out]',
+                '-fps_mode', 'passthrough',
+                '-frames:v', str(len(positions)),
+            ]
+        )
+    )
+
+
+def sample_frames(source, n, size=(224, 224), accuracy='keyframe', batch_size=DEFAULT_BATCH_SIZE, max_workers=None):
+    """
+    Extracts frames evenly spaced across a video.
+
+    :param str source: input file path or stream URL
+    :param int n: number of frames to extract
+    :param tuple size: size (width, height) to scale the frames to - optional, default is 224x224
+    :param str accuracy: ``keyframe`` to use the keyframe at or before each position (fast), or ``exact``
+        to decode up to the exact frame at each position (slower) - optional, default is ``keyframe``
+    :param int batch_size: maximum number of frames extracted by a single ``ffmpeg`` process - optional
+    :param int max_workers: maximum number of ``ffmpeg`` processes running at the same time - optional,
+        default is the number of CPU cores
+    :returns: RGB frames in order
+    :rtype: *numpy.ndarray* of *uint8* with shape (n, height, width, 3)
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the arguments are invalid, the source has no video, or some frames can't be decoded
+
+    The frames are taken at the middle of *n* equal intervals spanning the video, and scaled to
+    exactly *size*, without preserving the aspect ratio. In ``keyframe`` mode, the frames come
+    from the keyframes at or before these positions, so with long keyframe intervals some frames
+    may be repeated.
+    """
+
+    if accuracy not in ACCURACY_MODES:
+        raise ValueError("unsupported accuracy %s, expected one of: %s" % (accuracy, ', '.join(ACCURACY_MODES)))
+    if n < 1:
+        raise ValueError("number of frames must be positive")
+
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    duration = info.format.duration.total_seconds() if info.format and info.format.duration else 0
+    if duration <= 0:
+        raise ValueError("can't determine video duration")
+
+    positions = _get_positions(duration, n)
+    batches = [positions[i:i + batch_size] for i in range(0, n, batch_size)]
+    jobs = [_make_job(source, batch, size, accuracy) for batch in batches]
+
+    with JobPool(max_workers=min(max_workers or len(get_available_cpus()), len(jobs))) as pool:
+        outputs = pool.map(jobs, text=False)
+
+    width, height = size
+    frames = np.empty((n, height, width, 3), dtype=np.uint8)
+    decoded = sum(len(output) for output in outputs) // (width * height * 3)
+    if decoded != n:
+        raise ValueError("could only decode %d of %d frames" % (decoded, n))
+
+    start = 0
+    for output in outputs:
+        count = len(output) // (width * height * 3)
+        frames[start:start + count] = np.frombuffer(output, dtype=np.uint8).reshape(count, height, width, 3)
+        start += count
+
+    return frames
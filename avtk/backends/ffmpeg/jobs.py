@@ -0,0 +1,176 @@
+"""
+Running conversions concurrently
+================================
+
+The :mod:`avtk.backends.ffmpeg.jobs` module runs several :class:`~avtk.backends.ffmpeg.convert.FFmpeg`
+conversions side by side, splitting the available CPU cores between them.
+
+By default, each ffmpeg encoder, decoder and filter graph starts one thread per CPU core, so
+running many conversions at once leads to a lot more threads than cores, all contending for the
+same CPUs and caches. :class:`JobPool` instead assigns each worker its own share of the cores,
+limits the number of threads each job uses accordingly, and can optionally pin jobs to their
+cores and run them at lower priority.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.convert import FFmpeg, Output, H264, AAC
+    >>> from avtk.backends.ffmpeg.jobs import JobPool
+
+    >>> with JobPool(max_workers=4, pin=True, nice=10) as pool:
+    ...     futures = [
+    ...         pool.submit(FFmpeg(src, Output(src + '.mp4', streams=[H264(), AAC()])))
+    ...         for src in ['a.mkv', 'b.mkv', 'c.mkv', 'd.mkv']
+    ...     ]
+    ...     for f in futures:
+    ...         f.result()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+import os
+import time
+
+from avtk.metrics import QUEUE_WAIT
+
+
+def get_available_cpus():
+    """
+    Returns CPUs the current process may run on.
+
+    :rtype: list(int)
+    """
+
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpu_sets(cpus, workers):
+    """
+    Splits CPUs between workers.
+
+    If there are at least as many CPUs as workers, each worker gets a disjoint set of
+    consecutive CPUs, with the set sizes differing by at most one. Otherwise, each worker
+    gets a single CPU, and the CPUs are shared between workers round-robin.
+
+    :param list(int) cpus: CPUs to split
+    :param int workers: number of workers
+    :returns: list of CPU sets, one for each worker
+    :rtype: list(set(int))
+    """
+
+    if not cpus:
+        raise ValueError("no CPUs to split between workers")
+    if workers < 1:
+        raise ValueError("number of workers must be positive")
+
+    cpus = list(cpus)
+    if workers >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(workers)]
+
+    size, extra = divmod(len(cpus), workers)
+    sets = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(set(cpus[start:end]))
+        start = end
+    return sets
+
+
+class JobPool:
+    """
+    Runs conversions concurrently, splitting CPU cores between them.
+
+    :param int max_workers: maximum number of conversions running at the same time - optional,
+        default is the number of cores
+    :param cores: CPUs to use for the conversions - optional, default is all CPUs available to the process
+    :type cores: list(int)
+    :param bool pin: whether to restrict each conversion to its assigned CPUs - optional, default *False*
+    :param int nice: niceness increment for the conversion processes - optional
+
+    Each worker is assigned a share of the cores (see :func:`plan_cpu_sets`), and each conversion it
+    runs uses that many threads. With *pin* set, the conversion processes are also pinned to their
+    assigned cores (Linux only, ignored elsewhere), which keeps them from competing for the same cores
+    and caches. Use *nice* to run background conversions at a lower priority.
+
+    The pool can be used as a context manager, which waits for all the submitted conversions to
+    finish on exit.
+    """
+
+    def __init__(self, max_workers=None, cores=None, pin=False, nice=None):
+        self.cores = list(cores) if cores is not None else get_available_cpus()
+        self.max_workers = max_workers or len(self.cores)
+        self.pin = pin
+        self.nice = nice
+
+        self.cpu_sets = plan_cpu_sets(self.cores, self.max_workers)
+        self._slots = Queue()
+        for cpus in self.cpu_sets:
+            self._slots.put(cpus)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _run(self, job, text, with_usage, submitted):
+        cpus = self._slots.get()
+        QUEUE_WAIT.observe(time.monotonic() - submitted)
+        # Only passed when requested, so jobs without usage support still work
+        kwargs = {'with_usage': True} if with_usage else {}
+        try:
+            return job.run(
+                text=text,
+                threads=len(cpus),
+                cpus=cpus if self.pin else None,
+                nice=self.nice,
+                **kwargs
+            )
+        finally:
+            self._slots.put(cpus)
+
+    def submit(self, job, text=True, with_usage=False):
+        """
+        Schedules a conversion to run in the pool.
+
+        :param job: conversion to run
+        :type job: :class:`~avtk.backends.ffmpeg.convert.FFmpeg`
+        :param bool text: whether to return the output as text - optional, default true
+        :param bool with_usage: whether to also return the resources used by the conversion - optional
+        :returns: future resolving to the conversion output, or a tuple of the output and resource
+            usage if *with_usage* is set (see :meth:`~avtk.backends.ffmpeg.convert.FFmpeg.run`)
+        :rtype: :class:`concurrent.futures.Future`
+        """
+
+        return self._executor.submit(self._run, job, text, with_usage, time.monotonic())
+
+    def map(self, jobs, text=True, with_usage=False):
+        """
+        Runs conversions in the pool and returns their outputs, in order.
+
+        :param jobs: conversions to run
+        :type jobs: iterable of :class:`~avtk.backends.ffmpeg.convert.FFmpeg`
+        :param bool text: whether to return the outputs as text - optional, default true
+        :param bool with_usage: whether to return (output, resource usage) tuples - optional
+        :rtype: list
+        """
+
+        futures = [self.submit(job, text=text, with_usage=with_usage) for job in jobs]
+        return [f.result() for f in futures]
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting new conversions.
+
+        :param bool wait: whether to wait for the running and scheduled conversions to finish -
+            optional, default *True*
+        """
+
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+
+    def __repr__(self):
+        return '<JobPool(workers=%d, cores=%d, pin=%s)>' % (self.max_workers, len(self.cores), self.pin)
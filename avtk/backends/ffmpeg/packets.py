@@ -0,0 +1,255 @@
+"""
+Packet and frame level inspection
+=================================
+
+The :mod:`avtk.backends.ffmpeg.packets` module reads per-packet and per-frame information about
+a stream in a media file. The ``ffprobe`` output is parsed incrementally as it is produced, and
+returned in batches of NumPy structured arrays, so even multi-hour files can be processed in a
+small and constant amount of memory.
+
+This module requires NumPy (``pip install avtk[numpy]``).
+
+Timestamps and durations are expressed in the stream *time_base* units (see :func:`get_time_base`).
+Values unknown to ``ffprobe`` are set to :data:`NO_VALUE`.
+
+Packet arrays (:data:`PACKET_DTYPE`) have the following fields:
+
+* ``pts`` - presentation timestamp
+* ``dts`` - decoding timestamp
+* ``duration`` - packet duration
+* ``size`` - packet size in bytes
+* ``pos`` - byte position in the source, if known
+* ``key`` - whether the packet contains a keyframe
+
+Frame arrays (:data:`FRAME_DTYPE`) have the following fields:
+
+* ``pts`` - presentation timestamp
+* ``duration`` - frame duration
+* ``size`` - size of the packet the frame was decoded from, in bytes
+* ``key`` - whether the frame is a keyframe
+* ``pict_type`` - picture type (``b'I'``, ``b'P'``, ``b'B'``, or ``b'?'`` if unknown)
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.packets import iter_packets, get_time_base
+
+    >>> time_base = get_time_base('test-media/video/sintel.mkv')
+    >>> keyframes = []
+    >>> for batch in iter_packets('test-media/video/sintel.mkv'):
+    ...     keyframes.extend(batch['pts'][batch['key']] * float(time_base))
+
+Reading frame information requires decoding the stream, so it is considerably slower than
+reading packet information.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+
+from .convert import Duration
+from .exceptions import NoMediaError
+from .probe import _check_source
+from .run import ffprobe, ffprobe_iter
+
+NO_VALUE = np.iinfo(np.int64).min  #: Marker for values unknown to ffprobe
+
+PACKET_DTYPE = np.dtype([
+    ('pts', np.int64),
+    ('dts', np.int64),
+    ('duration', np.int64),
+    ('size', np.int64),
+    ('pos', np.int64),
+    ('key', np.bool_),
+])  #: Packet information array type
+
+FRAME_DTYPE = np.dtype([
+    ('pts', np.int64),
+    ('duration', np.int64),
+    ('size', np.int64),
+    ('key', np.bool_),
+    ('pict_type', 'S1'),
+])  #: Frame information array type
+
+DEFAULT_BATCH_SIZE = 65536  #: Default number of packets or frames in a batch
+
+# ffprobe entries holding the value for each field, in order of preference, as the
+# entry names differ between ffprobe versions.
+PACKET_ENTRIES = {
+    'pts': ['pts'],
+    'dts': ['dts'],
+    'duration': ['duration'],
+    'size': ['size'],
+    'pos': ['pos'],
+    'key': ['flags'],
+}
+
+FRAME_ENTRIES = {
+    'pts': ['pts', 'pkt_pts', 'best_effort_timestamp'],
+    'duration': ['duration', 'pkt_duration'],
+    'size': ['pkt_size'],
+    'key': ['key_frame'],
+    'pict_type': ['pict_type'],
+}
+
+
+def _get_interval_args(interval):
+    if interval is None:
+        return []
+
+    start, end = interval
+    return ['-read_intervals', '%s%%%s' % (
+        str(Duration(start)) if start is not None else '',
+        str(Duration(end)) if end is not None else '',
+    )]
+
+
+def _parse_batch(rows, columns, dtype, entries):
+    values = np.array(rows, dtype=str)
+    batch = np.empty(len(rows), dtype=dtype)
+
+    for field in dtype.names:
+        index = next((columns[e] for e in entries[field] if e in columns), None)
+        kind = dtype[field].kind
+
+        if index is None:
+            batch[field] = NO_VALUE if kind == 'i' else (False if kind == 'b' else b'?')
+            continue
+
+        col = values[:, index]
+        if kind == 'i':
+            missing = (col == 'N/A') | (col == '')
+            parsed = np.where(missing, '0', col).astype(np.int64)
+            batch[field] = np.where(missing, NO_VALUE, parsed)
+        elif field == 'key' and entries[field][0] == 'flags':
+            batch[field] = np.char.startswith(col, 'K')
+        elif kind == 'b':
+            batch[field] = col == '1'
+        else:
+            batch[field] = np.char.encode(col, 'ascii')
+
+    return batch
+
+
+def _iter_entries(source, section, stream, interval, batch_size, dtype, entries):
+    requested = []
+    for names in entries.values():
+        requested.extend(names)
+
+    args = [
+        '-select_streams', str(stream),
+        '-show_entries', section + '=' + ','.join(requested),
+    ] + _get_interval_args(interval) + [source]
+
+    columns = None
+    rows = []
+
+    for line in ffprobe_iter(args, output_format='compact=p=0'):
+        line = line.rstrip('\n')
+        if not line:
+            continue
+
+        parts = line.split('|')
+        if columns is None:
+            columns = {kv.partition('=')[0]: i for i, kv in enumerate(parts)}
+
+        rows.append([kv.partition('=')[2] for kv in parts])
+        if len(rows) >= batch_size:
+            yield _parse_batch(rows, columns, dtype, entries)
+            rows = []
+
+    if rows:
+        yield _parse_batch(rows, columns, dtype, entries)
+
+
+def get_time_base(source, stream='v:0'):
+    """
+    Returns the time base of a stream in the media file.
+
+    :param str source: Local file path or stream URL to inspect
+    :param stream: stream index or ffmpeg stream specifier - optional, default is the first video stream
+    :type stream: int or str
+    :returns: unit of time (in seconds) for packet and frame timestamps of the stream
+    :rtype: *Fraction*
+    :raises NoMediaError: if source doesn't exist, is of unknown format or has no such stream
+    """
+
+    _check_source(source)
+
+    streams = ffprobe([
+        '-select_streams', str(stream),
+        '-show_entries', 'stream=time_base',
+        source
+    ]).get('streams', [])
+
+    if not streams:
+        raise NoMediaError("no stream matching '%s' in %s" % (stream, source))
+
+    return Fraction(streams[0]['time_base'])
+
+
+def iter_packets(source, stream='v:0', interval=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads information about packets in a stream, in batches.
+
+    :param str source: Local file path or stream URL to inspect
+    :param stream: stream index or ffmpeg stream specifier - optional, default is the first video stream
+    :type stream: int or str
+    :param tuple interval: read only the (start, end) part of the source - optional, either may be *None*
+    :param int batch_size: maximum number of packets in a batch - optional
+    :returns: iterator over batches of packet information
+    :rtype: iterator over *numpy.ndarray* of :data:`PACKET_DTYPE`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+
+    If *interval* is set, reading starts at the keyframe just before the start of the interval.
+    Interval start and end can be specified using any type supported by
+    :class:`~avtk.backends.ffmpeg.convert.Duration`.
+    """
+
+    _check_source(source)
+    return _iter_entries(source, 'packet', stream, interval, batch_size, PACKET_DTYPE, PACKET_ENTRIES)
+
+
+def iter_frames(source, stream='v:0', interval=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads information about frames in a stream, in batches.
+
+    :param str source: Local file path or stream URL to inspect
+    :param stream: stream index or ffmpeg stream specifier - optional, default is the first video stream
+    :type stream: int or str
+    :param tuple interval: read only the (start, end) part of the source - optional, either may be *None*
+    :param int batch_size: maximum number of frames in a batch - optional
+    :returns: iterator over batches of frame information
+    :rtype: iterator over *numpy.ndarray* of :data:`FRAME_DTYPE`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+
+    See :func:`iter_packets` for description of the *interval* parameter.
+    """
+
+    _check_source(source)
+    return _iter_entries(source, 'frame', stream, interval, batch_size, FRAME_DTYPE, FRAME_ENTRIES)
+
+
+def read_packets(source, stream='v:0', interval=None):
+    """
+    Reads information about all packets in a stream into a single array.
+
+    Takes the same parameters as :func:`iter_packets`.
+
+    :rtype: *numpy.ndarray* of :data:`PACKET_DTYPE`
+    """
+
+    batches = list(iter_packets(source, stream=stream, interval=interval))
+    return np.concatenate(batches) if batches else np.empty(0, dtype=PACKET_DTYPE)
+
+
+def read_frames(source, stream='v:0', interval=None):
+    """
+    Reads information about all frames in a stream into a single array.
+
+    Takes the same parameters as :func:`iter_frames`.
+
+    :rtype: *numpy.ndarray* of :data:`FRAME_DTYPE`
+    """
+
+    batches = list(iter_frames(source, stream=stream, interval=interval))
+    return np.concatenate(batches) if batches else np.empty(0, dtype=FRAME_DTYPE)
@@ -13,14 +13,97 @@ import os.path
 from urllib.parse import urlparse
 
 from .cap import Codec as CodecCapability
+from .convert import Duration
 from .run import ffprobe
 from .exceptions import NoMediaError
+from .remote import get_local_source
+
+# ffprobe entries needed to populate a (partial) MediaInfo attribute, keyed by the attribute name.
+# Attributes not listed here map directly to the ffprobe entry of the same name.
+FORMAT_FIELDS = {
+    'name': ['format_name'],
+    'names': ['format_name'],
+    'description': ['format_long_name'],
+    'tags': [],
+}
+
+STREAM_FIELDS = {
+    'codec': ['codec_name', 'codec_long_name', 'profile'],
+    'frame_rate': ['avg_frame_rate'],
+    'language': [],
+    'tags': [],
+}
+
+STREAM_TYPES = {
+    'stream': None,
+    'video': 'v',
+    'audio': 'a',
+    'subtitle': 's',
+    'data': 'd',
+}
 
 
 def _parse_duration(val):
     return timedelta(microseconds=int(Decimal(val) * 1000000))
 
 
+def _check_source(source):
+    url = urlparse(source)
+    if url.scheme in ['', 'file']:
+        if not os.path.isfile(url.path):
+            raise NoMediaError('Source file not found: ' + url.path)
+
+
+def _build_entries(fields):
+    """
+    Translates a list of requested MediaInfo fields (eg. ``['format.duration', 'video.width']``)
+    into ffprobe arguments selecting only the needed entries.
+    """
+
+    format_entries = []
+    format_tags = None
+    stream_entries = ['index', 'codec_type']
+    stream_tags = None
+    stream_types = set()
+
+    for field in fields:
+        section, _, attr = field.partition('.')
+        if not attr:
+            raise ValueError("invalid field %s, expected 'section.attribute'" % field)
+
+        if section == 'format':
+            format_entries.extend(FORMAT_FIELDS.get(attr, [attr]))
+            if attr == 'tags':
+                format_tags = []
+        elif section in STREAM_TYPES:
+            stream_types.add(section)
+            stream_entries.extend(STREAM_FIELDS.get(attr, [attr]))
+            if attr == 'tags':
+                stream_tags = []
+            elif attr == 'language' and stream_tags is None:
+                stream_tags = ['language']
+        else:
+            raise ValueError("unknown field section %s in %s" % (section, field))
+
+    sections = []
+    if format_entries:
+        sections.append('format=' + ','.join(dict.fromkeys(format_entries)))
+    if format_tags is not None:
+        sections.append('format_tags')
+    if stream_types:
+        sections.append('stream=' + ','.join(dict.fromkeys(stream_entries)))
+    if stream_tags is not None:
+        sections.append('stream_tags' + ('=' + ','.join(stream_tags) if stream_tags else ''))
+
+    args = ['-show_entries', ':'.join(sections)]
+
+    # Only ask ffprobe for the streams we're interested in, if they're all of the same type
+    if len(stream_types) == 1 and STREAM_TYPES[next(iter(stream_types))]:
+        args.extend(['-select_streams', STREAM_TYPES[next(iter(stream_types))]])
+
+    return args, stream_types
+
+
 class MediaInfo:
     """
     Represents all available information about the inspected media file or stream.
@@ -33,24 +116,62 @@ class MediaInfo:
     The :func:`avtk.backends.ffmpeg.shortcuts.inspect` function is a simple wrapper around the
     MediaInfo constructor.
 
+    :param str source: Local file path or stream URL to inspect
+    :param list(str) fields: inspect only the specified fields - optional, default is to inspect everything
+    :param int probesize: maximum number of bytes to read when probing the source - optional
+    :param analyzeduration: maximum duration of the source to analyze - optional
+    :type analyzeduration: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+
+    Fields are specified as ``section.attribute`` strings, where section is ``format`` for container
+    information, ``video``, ``audio``, ``subtitle`` or ``data`` for streams of the specific type, or ``stream``
+    for all streams. Attribute is the name of the :class:`Format` or :class:`Stream` (subclass) attribute.
+    When fields are specified, only the requested information is gathered from ``ffprobe``, and other
+    attributes are set to *None*. If no format fields are requested, *format* is *None*. If no stream
+    fields are requested, *streams* is an empty list.
+
+    Limiting *probesize* and *analyzeduration* speeds up inspection of remote sources and sources with
+    long analysis windows, at the cost of possibly less accurate information for some formats.
+
     Example::
 
-        >>> info = MediaInfo(test-media/video/sintel.mkv')
+        >>> info = MediaInfo('test-media/video/sintel.mkv')
+
+        >>> info = MediaInfo('test-media/video/sintel.mkv', fields=['format.duration', 'video.width'])
+        >>> info.format.duration
+        datetime.timedelta(seconds=5, microseconds=24000)
+        >>> info.video_streams[0].width
+        1920
     """
 
-    def __init__(self, source):
-        self.raw = self._probe(source)
-        self.format = Format(self.raw['format'])
-        self.streams = [Stream._parse(stream) for stream in self.raw['streams']]
+    def __init__(self, source, fields=None, probesize=None, analyzeduration=None):
+        stream_types = None
+        if fields is None:
+            args = ['-show_format', '-show_streams']
+        else:
+            args, stream_types = _build_entries(fields)
+
+        if probesize:
+            args.extend(['-probesize', str(int(probesize))])
+        if analyzeduration:
+            duration = Duration(analyzeduration).duration
+            args.extend(['-analyzeduration', str(duration // timedelta(microseconds=1))])
+
+        self.raw = self._probe(source, args)
+        self.format = Format(self.raw['format']) if 'format' in self.raw else None
+        self.streams = [Stream._parse(stream) for stream in self.raw.get('streams', [])]
+
+        if stream_types and 'stream' not in stream_types:
+            self.streams = [s for s in self.streams if s.codec.type in stream_types]
 
     @staticmethod
-    def _probe(source):
-        url = urlparse(source)
-        if url.scheme in ['', 'file']:
-            if not os.path.isfile(url.path):
-                raise NoMediaError('Source file not found: ' + url.path)
+    def _probe(source, args=None):
+        source = get_local_source(source)
+        _check_source(source)
+
+        if args is None:
+            args = ['-show_format', '-show_streams']
 
-        return ffprobe(['-show_format', '-show_streams', source])
+        return ffprobe(args + [source])
 
     @property
     def audio_streams(self):
@@ -102,9 +223,9 @@ class Codec:
     TYPE_DATA = 'data'  #: Raw (unknown) data
 
     def __init__(self, raw):
-        self.type = raw['codec_type']
-        self.name = raw['codec_name']
-        self.description = raw['codec_long_name']
+        self.type = raw.get('codec_type')
+        self.name = raw.get('codec_name')
+        self.description = raw.get('codec_long_name')
         self.profile = raw.get('profile')
 
     def __str__(self):
@@ -141,9 +262,9 @@ class Stream:
 
     def __init__(self, raw):
         self.codec = Codec(raw)
-        self.index = raw['index']
+        self.index = raw.get('index')
 
-        self.time_base = Fraction(raw['time_base'])
+        self.time_base = Fraction(raw['time_base']) if 'time_base' in raw else None
         self.nb_frames = int(raw['nb_frames']) if 'nb_frames' in raw else None
         self.start_time = _parse_duration(raw['start_time']) if 'start_time' in raw else None
         self.duration = _parse_duration(raw['duration']) if 'duration' in raw else None
@@ -187,19 +308,19 @@ class VideoStream(Stream):
     def __init__(self, raw):
         super().__init__(raw)
 
-        self.width = raw['width']
-        self.height = raw['height']
-        self.display_aspect_ratio = raw['display_aspect_ratio']
-        self.pix_fmt = raw['pix_fmt']
-        self.has_b_frames = raw['has_b_frames']
+        self.width = raw.get('width')
+        self.height = raw.get('height')
+        self.display_aspect_ratio = raw.get('display_aspect_ratio')
+        self.pix_fmt = raw.get('pix_fmt')
+        self.has_b_frames = raw.get('has_b_frames')
 
         try:
-            self.frame_rate = Fraction(raw['avg_frame_rate'])
+            self.frame_rate = Fraction(raw['avg_frame_rate']) if 'avg_frame_rate' in raw else None
         except ZeroDivisionError:
             self.frame_rate = None
 
     def __repr__(self):
-        return '<Video(codec=%s, size=%dx%d, fps=%s)>' % (
+        return '<Video(codec=%s, size=%sx%s, fps=%s)>' % (
             repr(self.codec),
             self.width,
             self.height,
@@ -224,10 +345,10 @@ class AudioStream(Stream):
     def __init__(self, raw):
         super().__init__(raw)
 
-        self.channels = raw['channels']
+        self.channels = raw.get('channels')
         self.channel_layout = raw.get('channel_layout')
-        self.sample_fmt = raw['sample_fmt']
-        self.sample_rate = int(raw['sample_rate'])
+        self.sample_fmt = raw.get('sample_fmt')
+        self.sample_rate = int(raw['sample_rate']) if 'sample_rate' in raw else None
 
     def __repr__(self):
         return '<Audio(codec=%s, sample_rate=%s, bit_rate=%s)' % (
@@ -292,9 +413,9 @@ class Format:
     """
 
     def __init__(self, raw):
-        self.name = raw['format_name']
-        self.names = self.name.split(',')
-        self.description = raw['format_long_name']
+        self.name = raw.get('format_name')
+        self.names = self.name.split(',') if self.name else []
+        self.description = raw.get('format_long_name')
 
         self.start_time = _parse_duration(raw['start_time']) if 'start_time' in raw else None
         self.duration = _parse_duration(raw['duration']) if 'duration' in raw else None
@@ -0,0 +1,340 @@
+"""
+Remote source cache
+===================
+
+The :mod:`avtk.backends.ffmpeg.remote` module implements an opt-in, read-through local cache for
+remote (HTTP and HTTPS) sources. Processing the same remote file several times (eg. inspecting it,
+extracting a thumbnail and then converting it) normally downloads it each time. With the cache
+enabled, the file is downloaded once, and later operations use the local copy.
+
+Files are downloaded using parallel HTTP range requests when the server supports them. The cache
+is limited in size, and the least recently used files are removed when the limit is exceeded.
+
+The cache is disabled by default. When enabled, :class:`~avtk.backends.ffmpeg.convert.Input` and
+:class:`~avtk.backends.ffmpeg.probe.MediaInfo` transparently replace remote sources with the
+local copies.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.remote import enable_cache
+    >>> from avtk.backends.ffmpeg.shortcuts import inspect, convert_to_h264
+
+    >>> enable_cache(max_size=10 * 1024 ** 3)
+    >>> info = inspect('https://example.com/video.mkv')  # downloads the file
+    >>> convert_to_h264('https://example.com/video.mkv', '/tmp/video.mp4')  # uses the local copy
+
+Cached files are not revalidated, so the cache should only be used for URLs whose contents don't
+change (eg. content-addressed or versioned URLs).
+
+Only complete files of known size are cached. Streaming manifests (eg. HLS or DASH playlists, whose
+segments are referenced relative to the manifest URL) and live streams (whose length is unknown)
+are always read directly from the network.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+import hashlib
+import os
+import os.path
+import re
+import shutil
+import threading
+import time
+
+from .exceptions import NoMediaError
+
+DEFAULT_MAX_SIZE = 5 * 1024 ** 3  #: Default cache size limit, in bytes
+DEFAULT_CHUNK_SIZE = 8 * 1024 ** 2  #: Default size of the parts downloaded in parallel, in bytes
+DEFAULT_CONNECTIONS = 4  #: Default number of parallel connections per download
+DEFAULT_TIMEOUT = 30  #: Default network timeout, in seconds
+
+# Files used within this many seconds are never evicted, so a path which was just returned
+# can't disappear before the caller opens it
+EVICTION_GRACE_PERIOD = 60
+
+REMOTE_SCHEMES = ['http', 'https']
+
+# Streaming manifests, which reference other files, are never cached
+MANIFEST_EXTENSIONS = ['.m3u8', '.m3u', '.mpd', '.f4m', '.ism', '.isml']
+MANIFEST_CONTENT_TYPES = [
+    'application/vnd.apple.mpegurl', 'application/x-mpegurl', 'audio/mpegurl', 'audio/x-mpegurl',
+    'application/dash+xml', 'application/vnd.ms-sstr+xml',
+]
+TMP_SUFFIX = '.part'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+_cache = None
+
+
+class _NotCacheable(Exception):
+    pass
+
+
+def _is_manifest(url):
+    return os.path.splitext(urlparse(url).path)[1].lower() in MANIFEST_EXTENSIONS
+
+
+def get_default_cache_dir():
+    """
+    Returns the default directory for cached remote files.
+
+    Uses ``AVTK_REMOTE_CACHE`` environment variable if set, otherwise ``avtk/remote`` in the
+    user's cache directory.
+
+    :rtype: str
+    """
+
+    path = os.getenv('AVTK_REMOTE_CACHE')
+    if path:
+        return path
+
+    cache_root = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_root, 'avtk', 'remote')
+
+
+class RemoteCache:
+    """
+    Local size-limited cache of remote files.
+
+    :param str cache_dir: directory to store the files in - optional, see :func:`get_default_cache_dir`
+    :param int max_size: maximum total size of cached files, in bytes - optional
+    :param int chunk_size: size of the parts downloaded in parallel, in bytes - optional
+    :param int connections: maximum number of parallel connections per download - optional
+    :param float timeout: network timeout, in seconds - optional
+
+    The cache can be shared by several threads and processes. A file larger than *max_size* is
+    still downloaded (as the caller needs it), and evicted on the next download.
+    """
+
+    def __init__(
+        self, cache_dir=None, max_size=DEFAULT_MAX_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+        connections=DEFAULT_CONNECTIONS, timeout=DEFAULT_TIMEOUT
+    ):
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.connections = connections
+        self.timeout = timeout
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._downloads = {}  # url -> lock held while the url is downloaded
+        self._not_cacheable = set()  # urls found to be manifests or streams of unknown length
+
+    def get_path(self, url):
+        """
+        Returns the local path for a remote URL, whether it is cached or not.
+
+        :param str url: remote file URL
+        :rtype: str
+        """
+
+        ext = os.path.splitext(urlparse(url).path)[1][:16]
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+    def fetch(self, url):
+        """
+        Returns the path to the local copy of a remote file, downloading it if it's not cached.
+
+        :param str url: remote file URL
+        :returns: local file path, or *None* if the URL is a streaming manifest or a stream of unknown
+            length, which can't be cached
+        :rtype: str
+        :raises NoMediaError: if the file can't be downloaded
+        """
+
+        if _is_manifest(url) or url in self._not_cacheable:
+            return None
+
+        path = self.get_path(url)
+        if self._touch(path):
+            return path
+
+        with self._lock:
+            download_lock = self._downloads.setdefault(url, threading.Lock())
+
+        try:
+            with download_lock:
+                # Another thread may have downloaded it while we were waiting
+                if not self._touch(path):
+                    try:
+                        self._download(url, path)
+                    except _NotCacheable:
+                        self._not_cacheable.add(url)
+                        return None
+                    except (HTTPError, URLError, OSError, ValueError) as e:
+                        raise NoMediaError("can't download %s: %s" % (url, e))
+                    self.evict(keep=path)
+        finally:
+            with self._lock:
+                # A newer fetch may have added its own lock after ours was removed by another waiter
+                if self._downloads.get(url) is download_lock:
+                    del self._downloads[url]
+
+        return path
+
+    def _touch(self, path):
+        # Mark the file as recently used, returning whether it exists
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _open(self, url, byte_range=None, method='GET'):
+        headers = {}
+        if byte_range:
+            headers['Range'] = 'bytes=%d-%d' % byte_range
+        return urlopen(Request(url, headers=headers, method=method), timeout=self.timeout)
+
+    def _get_size(self, url):
+        """
+        Returns the remote file size, and whether the server supports range requests.
+
+        :raises _NotCacheable: if the file is a streaming manifest or its size is unknown
+        """
+
+        with self._open(url, byte_range=(0, 0)) as resp:
+            content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type in MANIFEST_CONTENT_TYPES:
+                raise _NotCacheable()
+
+            if resp.status == 206:
+                match = CONTENT_RANGE_RE.match(resp.headers.get('Content-Range', ''))
+                if match is None or match.group(3) == '*':
+                    raise _NotCacheable()
+                return int(match.group(3)), True
+
+            # The whole file is being sent, the connection is closed without reading it
+            length = resp.headers.get('Content-Length')
+            if length is None:
+                raise _NotCacheable()
+            return int(length), False
+
+    def _download_range(self, url, tmp_path, start, end):
+        with self._open(url, byte_range=(start, end)) as resp, open(tmp_path, 'r+b') as fp:
+            if resp.status != 206:
+                raise ValueError("server doesn't support range requests")
+
+            fp.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                data = resp.read(min(remaining, COPY_BUFFER_SIZE))
+                if not data:
+                    raise ValueError("incomplete response")
+                fp.write(data)
+                remaining -= len(data)
+
+    def _download(self, url, path):
+        tmp_path = '%s.%d-%d%s' % (path, os.getpid(), threading.get_ident(), TMP_SUFFIX)
+        try:
+            size, ranges = self._get_size(url)
+            if ranges and size > self.chunk_size:
+                with open(tmp_path, 'wb') as fp:
+                    fp.truncate(size)
+
+                ranges = [(start, min(start + self.chunk_size, size) - 1) for start in range(0, size, self.chunk_size)]
+                with ThreadPoolExecutor(max_workers=min(self.connections, len(ranges))) as executor:
+                    futures = [executor.submit(self._download_range, url, tmp_path, s, e) for s, e in ranges]
+                    for future in futures:
+                        future.result()
+            else:
+                with self._open(url) as resp, open(tmp_path, 'wb') as fp:
+                    shutil.copyfileobj(resp, fp, COPY_BUFFER_SIZE)
+                    if fp.tell() != size:
+                        raise ValueError("incomplete response")
+
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used files until the cache fits in the size limit.
+
+        :param str keep: path which must not be removed - optional
+        """
+
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file() or entry.name.endswith(TMP_SUFFIX):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if path == keep or now - mtime < EVICTION_GRACE_PERIOD:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Removes all cached files.
+        """
+
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(TMP_SUFFIX):
+                os.unlink(entry.path)
+
+
+def enable_cache(cache_dir=None, **kwargs):
+    """
+    Enables caching of remote sources.
+
+    :param str cache_dir: directory to store the files in - optional, see :func:`get_default_cache_dir`
+    :param kwargs: additional cache settings (see :class:`RemoteCache`)
+    :returns: the enabled cache
+    :rtype: :class:`RemoteCache`
+    """
+
+    global _cache
+    _cache = RemoteCache(cache_dir, **kwargs)
+    return _cache
+
+
+def disable_cache():
+    """
+    Disables caching of remote sources. Already cached files are kept.
+    """
+
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    """
+    Returns the enabled cache, or *None* if caching is disabled.
+
+    :rtype: :class:`RemoteCache`
+    """
+
+    return _cache
+
+
+def get_local_source(source):
+    """
+    Returns the local copy of a remote source if caching is enabled and the source can be cached,
+    or the source unchanged otherwise.
+
+    :param str source: file path or URL
+    :rtype: str
+    :raises NoMediaError: if the remote file can't be downloaded
+    """
+
+    cache = _cache
+    if cache is None or urlparse(source).scheme not in REMOTE_SCHEMES:
+        return source
+    return cache.fetch(source) or source
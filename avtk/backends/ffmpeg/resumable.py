@@ -0,0 +1,242 @@
+"""
+Resumable transcoding
+=====================
+
+The :mod:`avtk.backends.ffmpeg.resumable` module transcodes long files in a way that survives crashes
+and restarts. The video is encoded in segments starting at the source keyframes, and the progress is
+recorded in a small checkpoint manifest. If the process is interrupted, running the same transcode
+again skips the segments that are already complete. When all the segments are done, they're joined
+without re-encoding into the output file.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.convert import H264, AAC
+    >>> from avtk.backends.ffmpeg.resumable import transcode_resumable
+
+    >>> # If this is interrupted, just run it again to continue where it stopped
+    >>> transcode_resumable('movie.mkv', '/tmp/movie.mp4', H264(crf=20), audio=AAC(bit_rate='192k'))
+"""
+
+import json
+import os
+import os.path
+import shutil
+
+from .convert import FFmpeg, Input, Output, CopyVideo, CopyAudio, NoAudio, NoSubtitles, _fingerprint
+from .edit import _get_keyframes, _write_concat_list, PART_FORMATS
+from .probe import MediaInfo
+
+MANIFEST_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+
+DEFAULT_SEGMENT_DURATION = 60  #: Default (minimum) segment duration, in seconds
+
+# Codec produced by each encoder, to choose the segment container format (see PART_FORMATS)
+ENCODER_CODECS = {
+    'libx264': 'h264',
+    'libx265': 'hevc',
+    'mpeg2video': 'mpeg2video',
+}
+
+
+def _plan_segments(keyframes, duration, segment_duration):
+    """
+    Splits the source into segments at least *segment_duration* long (except the last one),
+    starting at keyframes. Returns a list of (start, end) tuples.
+    """
+
+    bounds = [0]
+    for k in keyframes:
+        if k - bounds[-1] >= segment_duration and duration - k > 0:
+            bounds.append(k)
+    bounds.append(duration)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _get_source_id(source):
+    """
+    Identifies the source in the manifest, as a JSON-serializable [kind, value] pair which compares
+    equal after being loaded back.
+    """
+
+    fingerprint = _fingerprint(source)
+    if isinstance(fingerprint, tuple):
+        return ['file', list(fingerprint)]
+    return ['url', fingerprint]
+
+
+def _write_manifest(path, manifest):
+    # Write to a temporary file first, so a crash mid-write can't corrupt the existing manifest
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+def _sync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _commit_segment(tmp_path, path):
+    """
+    Moves a finished segment into place, making sure it's on disk before the manifest marks it done,
+    so a crash can't leave the manifest pointing to a truncated segment. Returns the segment size.
+    """
+
+    _sync(tmp_path)
+    os.replace(tmp_path, path)
+    if os.name == 'posix':
+        # Persist the rename as well (directories can't be opened on Windows)
+        _sync(os.path.dirname(path) or '.')
+    return os.path.getsize(path)
+
+
+def _is_segment_done(segment, path):
+    """
+    Checks whether a segment is complete: marked as done in the manifest, and its file has the size
+    recorded when it was finished.
+    """
+
+    try:
+        return segment['done'] and os.path.getsize(path) == segment.get('size')
+    except OSError:
+        return False
+
+
+def _load_manifest(path, source_id, stream_args):
+    """
+    Loads the manifest, if it exists and belongs to the same transcode (same source and settings).
+    """
+
+    try:
+        with open(path) as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        manifest.get('version') != MANIFEST_VERSION or
+        manifest.get('source') != source_id or
+        manifest.get('video') != stream_args
+    ):
+        return None
+
+    return manifest
+
+
+def _new_manifest(source, source_id, stream_args, segment_duration):
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    duration = info.format.duration.total_seconds()
+    offset = info.format.start_time.total_seconds() if info.format.start_time else 0
+    keyframes = [pts - offset for pts, dts in _get_keyframes(source, offset, offset + duration)]
+
+    return dict(
+        version=MANIFEST_VERSION,
+        source=source_id,
+        video=stream_args,
+        segments=[
+            dict(start=start, end=end, file='segment%05d' % i, done=False)
+            for i, (start, end) in enumerate(_plan_segments(keyframes, duration, segment_duration))
+        ]
+    )
+
+
+def transcode_resumable(
+    source, output, video, audio=None, fmt=None, segment_duration=DEFAULT_SEGMENT_DURATION,
+    work_dir=None, keep_work_dir=False, **kwargs
+):
+    """
+    Transcodes a file in resumable segments.
+
+    :param str source: input file path
+    :param str output: output file path
+    :param video: output video stream definition
+    :type video: :class:`~avtk.backends.ffmpeg.convert.Video`
+    :param audio: output audio stream definition - optional, default is to copy the audio
+    :type audio: :class:`~avtk.backends.ffmpeg.convert.Audio`
+    :param fmt: output format - optional, default is to guess from output file name
+    :type fmt: :class:`~avtk.backends.ffmpeg.convert.Format`, *str* or *None*
+    :param segment_duration: minimum segment duration - optional, default is 60 seconds
+    :type segment_duration: int or float
+    :param str work_dir: directory for the segments and the manifest - optional, default is the
+        output path with ``.parts`` suffix
+    :param bool keep_work_dir: keep the work directory after the output is assembled - optional,
+        default *False*
+    :param kwargs: additional arguments for running ffmpeg (see :meth:`~avtk.backends.ffmpeg.convert.FFmpeg.run`)
+    :returns: output (stdout) from the final ``ffmpeg`` invocation
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the source has no video stream
+
+    Segments start at source keyframes, so an interrupted transcode loses at most one segment of work.
+    The checkpoint manifest is tied to the source file (path, size and modification time) and the video
+    stream settings; if either changes, the transcode starts from scratch.
+
+    Audio (if re-encoded) is encoded in one go when the segments are assembled, as that is usually much
+    faster than encoding the video. Subtitles are dropped.
+    """
+
+    if work_dir is None:
+        work_dir = output + '.parts'
+    os.makedirs(work_dir, exist_ok=True)
+
+    source_id = _get_source_id(source)
+    stream_args = video.get_args()
+    manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+
+    manifest = _load_manifest(manifest_path, source_id, stream_args)
+    if manifest is None:
+        manifest = _new_manifest(source, source_id, stream_args, segment_duration)
+        _write_manifest(manifest_path, manifest)
+
+    part_fmt = PART_FORMATS.get(ENCODER_CODECS.get(video.encoder), 'matroska')
+
+    for segment in manifest['segments']:
+        path = os.path.join(work_dir, segment['file'])
+        if _is_segment_done(segment, path):
+            continue
+
+        tmp_path = path + '.tmp'
+        FFmpeg(
+            Input(source, seek=segment['start'], duration=segment['end'] - segment['start']),
+            Output(
+                tmp_path,
+                streams=[video, NoAudio, NoSubtitles],
+                fmt=part_fmt,
+                extra=['-map', '0:v:0', '-avoid_negative_ts', 'make_zero']
+            )
+        ).run(**kwargs)
+
+        segment['size'] = _commit_segment(tmp_path, path)
+        segment['done'] = True
+        _write_manifest(manifest_path, manifest)
+
+    list_path = os.path.join(work_dir, 'segments.txt')
+    _write_concat_list(list_path, [os.path.join(work_dir, s['file']) for s in manifest['segments']])
+
+    result = FFmpeg(
+        [
+            Input(source),
+            Input(list_path, extra=['-f', 'concat', '-safe', '0']),
+        ],
+        Output(
+            output,
+            streams=[CopyVideo, audio or CopyAudio, NoSubtitles],
+            fmt=fmt,
+            extra=['-map', '1:v:0', '-map', '0:a?']
+        )
+    ).run(**kwargs)
+
+    if not keep_work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return result
@@ -1,15 +1,209 @@
+from collections import deque
+from contextlib import contextmanager
+import io
+import json
+import logging
 import os
+import re
 import subprocess
-import json
+import sys
+import threading
+import time
 
-from .exceptions import NoMediaError
+from avtk.metrics import SUBPROCESS_DURATION
 
-BASE_FLAGS = ['-hide_banner', '-v', 'error']
+from .exceptions import NoMediaError, FFmpegError
+
+BASE_FLAGS = ['-hide_banner', '-v', 'level+error']
 FFMPEG_FLAGS = BASE_FLAGS + ['-y']
 FFMPEG_FLAGS_PROGRESS = FFMPEG_FLAGS + ['-progress', '-']
 FFPROBE_FLAGS = BASE_FLAGS + ['-of', 'json']
 
 SUBPROCESS_TIMEOUT = 5  # in seconds
+DEFAULT_CHUNK_SIZE = 65536  #: Default size of output chunks read from a streaming process, in bytes
+
+LOG_LEVELS = ['panic', 'fatal', 'error', 'warning', 'info', 'verbose', 'debug', 'trace']  #: Most severe first
+MAX_LOG_EVENTS = 100  #: Number of most recent log events kept while a process runs
+MAX_LOG_MESSAGE = 2000  # Longer log messages are truncated
+MIN_POLL_INTERVAL = 0.0005  # First sleep while waiting for a process to exit, in seconds
+MAX_POLL_INTERVAL = 0.05  # Longest sleep while waiting for a process to exit, in seconds
+
+# With the "level" log flag, ffmpeg log lines look like "[component @ 0x55d0c8a0] [level] message"
+LOG_LINE_RE = re.compile(r'^(?:\[(?P<component>[^\]]+?)(?: @ 0x[0-9a-f]+)?\] )?\[(?P<level>[a-z]+)\] (?P<message>.*)$')
+
+log = logging.getLogger(__name__)
+
+
+class LogEvent:
+    """
+    A single ``ffmpeg`` or ``ffprobe`` log message.
+
+    :Attributes:
+        * level (*str*) - log level, one of :data:`LOG_LEVELS`, or *None* if unknown
+        * component (*str*) - component which logged the message (eg. ``libx264`` or ``in#0``),
+          or *None* for general messages
+        * message (*str*) - message text
+    """
+
+    __slots__ = ['level', 'component', 'message']
+
+    def __init__(self, level, component, message):
+        self.level = level
+        self.component = component
+        self.message = message
+
+    @property
+    def is_error(self):
+        return self.level in ('panic', 'fatal', 'error')
+
+    def __str__(self):
+        return '%s: %s' % (self.component, self.message) if self.component else self.message
+
+    def __repr__(self):
+        return '<LogEvent(level=%s, component=%s, message=%r)>' % (self.level, self.component, self.message)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, LogEvent) and
+            (self.level, self.component, self.message) == (other.level, other.component, other.message)
+        )
+
+
+class ResourceUsage:
+    """
+    Resources used by a finished ``ffmpeg`` or ``ffprobe`` process.
+
+    :Attributes:
+        * wall_time (*float*) - time from process start to exit, in seconds
+        * user_time (*float*) - CPU time spent in user mode, in seconds
+        * system_time (*float*) - CPU time spent in the kernel on behalf of the process, in seconds
+        * max_rss (*int*) - peak resident memory size, in bytes (see below)
+        * block_input (*int*) - number of block input operations
+        * block_output (*int*) - number of block output operations
+        * voluntary_switches (*int*) - context switches while waiting for a resource (eg. I/O)
+        * involuntary_switches (*int*) - context switches because of preemption
+        * read_bytes (*int*) - bytes read, including from pipes and the page cache
+        * write_bytes (*int*) - bytes written, including to pipes
+        * storage_read_bytes (*int*) - bytes actually fetched from storage
+        * storage_write_bytes (*int*) - bytes sent to storage
+
+    The process counters come from :func:`os.wait4` and the byte counters from ``/proc/<pid>/io``,
+    read after the process exits. Counters which aren't available on the platform are *None*.
+
+    The peak memory reported by :func:`os.wait4` includes the memory of the parent (Python) process at
+    the time it started the child, so on Linux *max_rss* is instead sampled from ``VmHWM`` in
+    ``/proc/<pid>/status`` while the process runs. It's *None* if the process exited before it could
+    be sampled, and may miss memory use in the last moments before exit. On other platforms it comes
+    from :func:`os.wait4`, with the caveat above.
+    """
+
+    __slots__ = [
+        'wall_time', 'user_time', 'system_time', 'max_rss', 'block_input', 'block_output',
+        'voluntary_switches', 'involuntary_switches',
+        'read_bytes', 'write_bytes', 'storage_read_bytes', 'storage_write_bytes',
+    ]
+
+    def __init__(self, wall_time, rusage=None, io=None, max_rss=None):
+        self.wall_time = wall_time
+        self.max_rss = max_rss
+        io = io or {}
+
+        if rusage is not None:
+            self.user_time = rusage.ru_utime
+            self.system_time = rusage.ru_stime
+            self.block_input = rusage.ru_inblock
+            self.block_output = rusage.ru_oublock
+            self.voluntary_switches = rusage.ru_nvcsw
+            self.involuntary_switches = rusage.ru_nivcsw
+        else:
+            self.user_time = self.system_time = None
+            self.block_input = self.block_output = None
+            self.voluntary_switches = self.involuntary_switches = None
+
+        self.read_bytes = io.get('rchar')
+        self.write_bytes = io.get('wchar')
+        self.storage_read_bytes = io.get('read_bytes')
+        self.storage_write_bytes = io.get('write_bytes')
+
+    @property
+    def cpu_time(self):
+        """Total CPU time (user and system), in seconds, or *None* if unknown"""
+        if self.user_time is None:
+            return None
+        return self.user_time + self.system_time
+
+    def as_dict(self):
+        """
+        Returns the usage as a dictionary, eg. for logging or storing.
+
+        :rtype: dict
+        """
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return '<ResourceUsage(%s)>' % ', '.join('%s=%s' % item for item in self.as_dict().items())
+
+
+def parse_log_line(line):
+    """
+    Parses a line of ``ffmpeg`` or ``ffprobe`` log output.
+
+    :param str line: log line, as printed with the ``level`` log flag
+    :returns: parsed log event
+    :rtype: :class:`LogEvent`
+    """
+
+    line = line.rstrip('\r\n')
+    match = LOG_LINE_RE.match(line)
+    if match is None or match.group('level') not in LOG_LEVELS:
+        return LogEvent(None, None, line[:MAX_LOG_MESSAGE])
+    return LogEvent(match.group('level'), match.group('component'), match.group('message')[:MAX_LOG_MESSAGE])
+
+
+def _strip_level(line):
+    match = LOG_LINE_RE.match(line)
+    if match is None or match.group('level') not in LOG_LEVELS:
+        return line
+    prefix = line[:match.start('level') - 1]
+    return prefix + match.group('message') + '\n'
+
+
+class _LogReader(threading.Thread):
+    """
+    Reads the log output of a process in the background, keeping the most recent events.
+
+    Keeping only a bounded number of events means memory use stays flat no matter how long
+    the process runs or how chatty it is. If *keep_lines* is set, the complete log (without
+    the level tags) is kept as well.
+    """
+
+    def __init__(self, stream, listener=None, max_events=MAX_LOG_EVENTS, keep_lines=False):
+        super().__init__(daemon=True)
+        self.stream = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+        self.listener = listener
+        self.events = deque(maxlen=max_events)
+        self.lines = [] if keep_lines else None
+
+    def run(self):
+        for line in self.stream:
+            if not line.strip():
+                continue
+
+            event = parse_log_line(line)
+            self.events.append(event)
+            if self.lines is not None:
+                self.lines.append(_strip_level(line))
+
+            if self.listener is not None:
+                try:
+                    self.listener(event)
+                except Exception:
+                    # The log must be drained regardless, or the process would block on a full pipe
+                    log.exception("ffmpeg log listener failed")
+
+    def get_error(self, returncode, usage=None):
+        return FFmpegError(self.events, returncode=returncode, usage=usage)
 
 
 def _find_ffmpeg():
@@ -38,39 +232,358 @@ def _prepare_ffmpeg_cmdline(args, progress=False):
     )
 
 
-def _prepare_ffprobe_cmdline(args):
-    return [_find_ffprobe()] + FFPROBE_FLAGS + args
+def _prepare_ffprobe_cmdline(args, output_format=None):
+    if output_format is None:
+        return [_find_ffprobe()] + FFPROBE_FLAGS + args
+    return [_find_ffprobe()] + BASE_FLAGS + ['-of', output_format] + args
+
+
+def _get_env():
+    return dict(
+        PATH=os.environ['PATH'],
+        AV_LOG_FORCE_NOCOLOR='1'
+    )
+
+
+def _set_limits(pid, cpus=None, nice=None):
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(pid, cpus)
+    if nice:
+        os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + nice)
+
+
+def _popen(cmdline, cpus=None, nice=None, **kwargs):
+    """
+    Starts the process pinned to *cpus* and with its priority lowered by *nice*.
+
+    On Linux both settings are per thread and inherited from the thread that starts the process, so
+    the process is started from a short-lived thread with the settings applied. That way every thread
+    of the process has them from the start, and the calling thread is left as it was (niceness can't
+    be raised back without privileges). ``preexec_fn`` isn't used as it isn't safe while other threads
+    are running (eg. in :class:`~avtk.backends.ffmpeg.jobs.JobPool`).
+
+    Elsewhere the settings are per process, and are applied once the process is started.
+    """
+
+    if not cpus and not nice:
+        return subprocess.Popen(cmdline, **kwargs)
+
+    if not sys.platform.startswith('linux'):
+        proc = subprocess.Popen(cmdline, **kwargs)
+        try:
+            _set_limits(proc.pid, cpus, nice)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        return proc
+
+    result = {}
+
+    def spawn():
+        try:
+            _set_limits(0, cpus, nice)
+            result['proc'] = subprocess.Popen(cmdline, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=spawn, name='avtk-spawn')
+    thread.start()
+    thread.join()
+
+    if 'error' in result:
+        raise result['error']
+    return result['proc']
+
+
+def _read_proc_io(pid):
+    try:
+        with open('/proc/%d/io' % pid) as fp:
+            return {key: int(value) for key, value in (line.split(':', 1) for line in fp if ':' in line)}
+    except (OSError, ValueError):
+        return None
+
+
+def _read_proc_hwm(pid):
+    # Peak resident memory of a running process, in bytes, or None if it's not available
+    try:
+        with open('/proc/%d/status' % pid) as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _wait(proc, started, timeout=None):
+    """
+    Waits for the process to exit and returns its resource usage, or *None* if the platform doesn't
+    support collecting it.
+
+    While waiting, the peak memory use is sampled from ``/proc``, if available. Once the process
+    exits, it's not reaped right away, so its final I/O counters can still be read from ``/proc``,
+    and then it's reaped using :func:`os.wait4` to get the rest of the usage.
+
+    :raises ChildProcessError: if the process was reaped elsewhere, so its exit status is unknown
+    """
+
+    program = os.path.basename(proc.args[0])
+    if not hasattr(os, 'wait4') or not hasattr(os, 'waitid'):
+        proc.wait(timeout=timeout)
+        SUBPROCESS_DURATION.labels(program).observe(time.monotonic() - started)
+        return None
+
+    # Popen returns after the child has executed the program, so the samples are not affected
+    # by the memory of the forked parent
+    sample_memory = os.path.exists('/proc/%d/status' % proc.pid)
+    max_rss = None
+
+    try:
+        if timeout is None and not sample_memory:
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        else:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            delay = MIN_POLL_INTERVAL
+            while os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT | os.WNOHANG) is None:
+                if sample_memory:
+                    max_rss = _read_proc_hwm(proc.pid) or max_rss
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(proc.args, timeout)
+                    delay = min(delay, remaining)
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_INTERVAL)
+
+        io = _read_proc_io(proc.pid)
+        _, status, rusage = os.wait4(proc.pid, 0)
+    except ChildProcessError as e:
+        raise ChildProcessError(
+            "%s process %d was reaped elsewhere, its exit status is unknown" % (program, proc.pid)
+        ) from e
+
+    if not sample_memory:
+        # Linux reports max RSS in kilobytes, macOS in bytes
+        max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    usage = ResourceUsage(time.monotonic() - started, rusage, io, max_rss=max_rss)
+    SUBPROCESS_DURATION.labels(program).observe(usage.wall_time)
+    log.debug("%s finished with %r", program, usage)
+    return usage
+
+
+def _read_all(stream, chunks):
+    for chunk in iter(lambda: stream.read(65536), b''):
+        chunks.append(chunk)
+
+
+def _run_simple(cmdline, quick=False, text=True, stderr=False, cpus=None, nice=None, listener=None, with_usage=False):
+    started = time.monotonic()
+    proc = _popen(
+        cmdline,
+        cpus=cpus,
+        nice=nice,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=_get_env()
+    )
+
+    # Both pipes are drained in the background so neither can fill up and block the process
+    reader = _LogReader(proc.stderr, listener=listener, keep_lines=stderr)
+    chunks = []
+    stdout_reader = threading.Thread(target=_read_all, args=(proc.stdout, chunks), daemon=True)
+    reader.start()
+    stdout_reader.start()
+
+    try:
+        usage = _wait(proc, started, timeout=SUBPROCESS_TIMEOUT if quick else None)
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        stdout_reader.join()
+        reader.join()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    if proc.returncode != 0:
+        raise reader.get_error(proc.returncode, usage=usage)
 
+    if stderr:
+        output = ''.join(reader.lines)
+    else:
+        output = b''.join(chunks)
+        if text:
+            output = output.decode('utf-8', 'replace').replace('\r\n', '\n')
 
-def _run_simple(cmdline, quick=False, text=True):
-    res = subprocess.run(
+    return (output, usage) if with_usage else output
+
+
+@contextmanager
+def _open_streaming(cmdline, text=True):
+    # Stderr is drained in the background so a chatty process can't block on a full pipe
+    # while we're consuming its output.
+    started = time.monotonic()
+    proc = subprocess.Popen(
         cmdline,
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         text=text,
-        timeout=SUBPROCESS_TIMEOUT if quick else None,
-        env=dict(
-            PATH=os.environ['PATH'],
-            AV_LOG_FORCE_NOCOLOR='1'
-        )
+        env=_get_env()
     )
-    if res.returncode != 0:
-        # FIXME - use logger to log the details and raise something sensible
-        raise RuntimeError(res.stderr.strip())
-    return res.stdout
+    reader = _LogReader(proc.stderr.buffer if text else proc.stderr)
+    reader.start()
+
+    finished = False
+    usage = None
+    try:
+        yield proc.stdout
+        # If the caller stopped reading before the end, the process is killed instead of reporting an error
+        finished = not proc.stdout.read(1)
+        if finished:
+            usage = _wait(proc, started)
+    finally:
+        proc.stdout.close()
+        if proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        reader.join()
+        proc.stderr.close()
+
+    if finished and proc.returncode != 0:
+        raise reader.get_error(proc.returncode, usage=usage)
+
 
+def _run_streaming(cmdline, text=True, chunk_size=None):
+    with _open_streaming(cmdline, text=text) as stdout:
+        if chunk_size:
+            yield from iter(lambda: stdout.read(chunk_size), '' if text else b'')
+        else:
+            yield from stdout
+
+
+def ffprobe(args, parse_json=True, with_usage=False):
+    try:
+        output, usage = _run_simple(_prepare_ffprobe_cmdline(args), quick=True, with_usage=True)
+    except FFmpegError as e:
+        raise NoMediaError(str(e), events=e.events, returncode=e.returncode) from e
+
+    if parse_json:
+        output = json.loads(output)
+    return (output, usage) if with_usage else output
+
+
+def ffprobe_iter(args, output_format='compact=p=0'):
+    """
+    Runs ``ffprobe`` and yields its output line by line, as it is produced.
+
+    Use this instead of :func:`ffprobe` for potentially huge outputs (eg. packet or frame
+    information for long files), to avoid buffering the entire output in memory.
+
+    :param list(str) args: ``ffprobe`` command line arguments
+    :param str output_format: ``ffprobe`` output writer and its options - optional, default is *compact*
+    :raises NoMediaError: if ``ffprobe`` fails
+    """
 
-def ffprobe(args, parse_json=True):
     try:
-        output = _run_simple(_prepare_ffprobe_cmdline(args), quick=True)
-    except RuntimeError as e:
-        raise NoMediaError(e)
+        yield from _run_streaming(_prepare_ffprobe_cmdline(args, output_format=output_format))
+    except FFmpegError as e:
+        raise NoMediaError(str(e), events=e.events, returncode=e.returncode) from e
 
-    return json.loads(output) if parse_json else output
 
+def ffmpeg(args, quick=False, text=True, cpus=None, nice=None, listener=None, loglevel=None, with_usage=False):
+    """
+    Runs ``ffmpeg`` and returns its output.
+
+    :param list(str) args: ``ffmpeg`` command line arguments
+    :param bool quick: whether to time out if ``ffmpeg`` takes more than a few seconds - optional
+    :param bool text: whether to return the output as text - optional, default true
+    :param cpus: CPUs to run ``ffmpeg`` on - optional, default is no restriction (Linux only)
+    :type cpus: set(int) or list(int)
+    :param int nice: niceness increment for the ``ffmpeg`` process - optional
+    :param listener: function called with each :class:`LogEvent` as it is logged - optional
+    :param str loglevel: ``ffmpeg`` logging level (see :data:`LOG_LEVELS`) - optional, default
+        is *warning* if *listener* is set, *error* otherwise
+    :param bool with_usage: whether to also return the resources used by the process - optional
+    :returns: output (stdout) from ``ffmpeg`` invocation, or a tuple of the output and
+        :class:`ResourceUsage` (*None* if unsupported on the platform) if *with_usage* is set
+    :raises FFmpegError: if ``ffmpeg`` fails
+
+    The listener is called from a background thread, while ``ffmpeg`` is running. Only the most
+    recent log events are kept (see :data:`MAX_LOG_EVENTS`), and they're available in the
+    :class:`~avtk.backends.ffmpeg.exceptions.FFmpegError` exception if ``ffmpeg`` fails.
+    """
+
+    if loglevel is None and listener is not None:
+        loglevel = 'warning'
+    if loglevel is not None:
+        args = ['-v', 'level+' + loglevel] + args
 
-def ffmpeg(args, quick=False, text=True):
     return _run_simple(
         _prepare_ffmpeg_cmdline(args, progress=False),
         quick=quick,
-        text=text
+        text=text,
+        cpus=cpus,
+        nice=nice,
+        listener=listener,
+        with_usage=with_usage
+    )
+
+
+def ffmpeg_iter(args, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Runs ``ffmpeg`` and yields its (binary) output in chunks, as it is produced.
+
+    Use this instead of :func:`ffmpeg` for potentially huge outputs (eg. raw decoded audio or video),
+    to avoid buffering the entire output in memory.
+
+    :param list(str) args: ``ffmpeg`` command line arguments
+    :param int chunk_size: size of the chunks to read, in bytes - optional
+    :returns: iterator over output chunks; all chunks except the last one are *chunk_size* long
+    :rtype: iterator over *bytes*
+    :raises FFmpegError: if ``ffmpeg`` fails
+    """
+
+    yield from _run_streaming(_prepare_ffmpeg_cmdline(args, progress=False), text=False, chunk_size=chunk_size)
+
+
+def ffmpeg_pipe(args):
+    """
+    Runs ``ffmpeg``, giving access to its output as a file-like object.
+
+    Use as a context manager; the process is stopped when the block exits. This is useful for
+    reading large raw outputs directly into preallocated buffers (using ``readinto``).
+
+    :param list(str) args: ``ffmpeg`` command line arguments
+    :returns: context manager yielding the binary output (stdout) stream
+    :raises FFmpegError: if ``ffmpeg`` fails (only if the output was read to the end)
+
+    Example::
+
+        with ffmpeg_pipe(['-i', 'video.mkv', '-f', 'rawvideo', '-pix_fmt', 'gray', '-']) as stdout:
+            while stdout.readinto(buffer) == len(buffer):
+                process(buffer)
+    """
+
+    return _open_streaming(_prepare_ffmpeg_cmdline(args, progress=False), text=False)
+
+
+def ffmpeg_log(args, loglevel='info'):
+    """
+    Runs ``ffmpeg`` and returns its log output instead of the regular output.
+
+    Useful for filters which report their results in the log (eg. ``loudnorm`` or ``ssim``).
+
+    :param list(str) args: ``ffmpeg`` command line arguments
+    :param str loglevel: ``ffmpeg`` logging level - optional, default is *info*
+    :returns: log (stderr) output from ``ffmpeg`` invocation
+    :rtype: str
+    :raises FFmpegError: if ``ffmpeg`` fails
+    """
+
+    return _run_simple(
+        _prepare_ffmpeg_cmdline(['-v', 'level+' + loglevel] + args, progress=False),
+        stderr=True
     )
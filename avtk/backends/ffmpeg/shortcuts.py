@@ -9,6 +9,11 @@ These functions are just wrappers around the lower-level FFmpeg and Probe module
 
 """
 
+from functools import wraps
+import os.path
+
+from avtk.metrics import OUTPUT_BYTES, track_job
+
 from .probe import MediaInfo
 
 from .convert import (
@@ -16,13 +21,114 @@ from .convert import (
     Audio, NoAudio, CopyAudio,
     Video, NoVideo, CopyVideo,
     NoSubtitles, CopySubtitles,
-    H264, H265, AAC, MP4, VP9, Opus, WebM, Ogg
+    H264, H265, AAC, MP4, VP9, Opus, WebM, Ogg,
+    parse_bit_rate
 )
 
 THUMBNAIL_FORMATS = ['png', 'jpg', 'gif', 'tiff', 'bmp']  #: Supported thumbnail formats
 
+# Source information needed to decide whether streams can be copied instead of re-encoded
+_COPY_CHECK_FIELDS = [
+    'format.bit_rate',
+    'video.codec', 'video.width', 'video.height', 'video.bit_rate', 'video.pix_fmt',
+    'audio.codec', 'audio.channels', 'audio.bit_rate',
+]
+
+# Video profiles and pixel formats (8-bit 4:2:0) that outputs of the shortcuts are expected to use, so they
+# play everywhere; sources using others (eg. 10-bit or 4:4:4 H.264) are re-encoded even if the codec matches
+_COPY_VIDEO_PROFILES = {
+    'h264': ['Constrained Baseline', 'Baseline', 'Main', 'High'],
+    'hevc': ['Main'],
+    'vp9': ['Profile 0'],
+}
+_COPY_PIX_FMTS = ['yuv420p', 'yuvj420p']
+
+
+def _instrumented(api, writes_output=False):
+    # Records calls in the job metrics (see avtk.metrics). Shortcuts writing to a file take its path as
+    # the second argument, and the file size is counted as the bytes produced.
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track_job(api):
+                result = fn(*args, **kwargs)
+
+            if isinstance(result, bytes):
+                OUTPUT_BYTES.labels(api).inc(len(result))
+            elif writes_output:
+                output = kwargs['output'] if 'output' in kwargs else args[1]
+                if os.path.isfile(output):
+                    OUTPUT_BYTES.labels(api).inc(os.path.getsize(output))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _matches_scale(stream, scale):
+    if not isinstance(scale, tuple):
+        # Arbitrary scale filter expression, can't tell without encoding
+        return False
+
+    w, h = scale
+    return w in (0, -1, stream.width) and h in (0, -1, stream.height)
+
+
+def _can_copy_video(info, codec, bit_rate=None, scale=None, **kwargs):
+    """
+    Checks whether all video streams in the source already satisfy the requested codec, size and bitrate,
+    and use a widely supported profile and pixel format. Any other encoding option (eg. *extra* arguments)
+    requires re-encoding.
+    """
+
+    if not info.video_streams or any(kwargs.values()):
+        return False
+
+    max_bit_rate = parse_bit_rate(bit_rate)
+
+    for stream in info.video_streams:
+        if stream.codec.name != codec:
+            return False
+        if stream.pix_fmt not in _COPY_PIX_FMTS:
+            return False
+        if codec in _COPY_VIDEO_PROFILES and stream.codec.profile not in _COPY_VIDEO_PROFILES[codec]:
+            return False
+        if scale and not _matches_scale(stream, scale):
+            return False
+        if max_bit_rate:
+            # If stream bitrate is unknown, total bitrate is an upper bound
+            stream_bit_rate = stream.bit_rate or (info.format.bit_rate if info.format else None)
+            if stream_bit_rate is None or stream_bit_rate > max_bit_rate:
+                return False
+
+    return True
+
+
+def _can_copy_audio(info, codec, channels=None, bit_rate=None, normalize=None, **kwargs):
+    """
+    Checks whether all audio streams in the source already satisfy the requested codec, channels and bitrate.
+    Any other encoding option (eg. *extra* arguments or normalization) requires re-encoding.
+    """
+
+    if not info.audio_streams or normalize or any(kwargs.values()):
+        return False
+
+    max_bit_rate = parse_bit_rate(bit_rate)
+
+    for stream in info.audio_streams:
+        if stream.codec.name != codec:
+            return False
+        if channels and stream.channels != channels:
+            return False
+        if max_bit_rate and (stream.bit_rate is None or stream.bit_rate > max_bit_rate):
+            return False
 
-def inspect(source):
+    return True
+
+
+@_instrumented('inspect')
+def inspect(source, fields=None, probesize=None, analyzeduration=None):
     """
     Inspects a media file and returns information about it.
 
@@ -30,6 +136,10 @@ def inspect(source):
     description of the returned information.
 
     :param str source: Local file path or stream URL to inspect
+    :param list(str) fields: inspect only the specified fields - optional, default is to inspect everything
+    :param int probesize: maximum number of bytes to read when probing the source - optional
+    :param analyzeduration: maximum duration of the source to analyze - optional
+    :type analyzeduration: *timedelta*, *int* or *float*
     :returns: Information about the inspected file or stream
     :rtype: :class:`~avtk.backend.ffmpeg.probe.MediaInfo`
     :raises NoMediaError: if source doesn't exist or is of unknown format
@@ -53,12 +163,20 @@ def inspect(source):
         <Codec(name=ac3, type=audio)>
         >>> info.has_subtitles
         True
+
+    If only some information is needed, inspecting just the required fields is faster, especially
+    for remote sources::
+
+        >>> info = inspect('test-media/video/sintel.mkv', fields=['format.duration', 'video.width'])
+        >>> info.video_streams[0].width
+        1920
     """
 
-    return MediaInfo(source)
+    return MediaInfo(source, fields=fields, probesize=probesize, analyzeduration=analyzeduration)
 
 
-def get_thumbnail(source, seek, fmt='png'):
+@_instrumented('get_thumbnail')
+def get_thumbnail(source, seek, fmt='png', width=None):
     """
     Extracts a thumbnail from a video file.
 
@@ -66,9 +184,12 @@ def get_thumbnail(source, seek, fmt='png'):
     :param seek: position (in seconds) from which to get the thumbnail
     :type seek: *timedelta*, *int* or *float*
     :param str fmt: output image format (one of :data:`THUMBNAIL_FORMATS`)
+    :param int width: resize the thumbnail to this width, keeping the aspect ratio - optional,
+        default is to keep the original size
     :returns: thumbnail data as a binary string in the specified format
     :rtype: bytes
-    :raises ValueError: if image format is not supported
+    :raises ValueError: if image format is not supported, or there's no video frame at the seek position
+        (eg. it's past the end of the video)
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     Example::
@@ -90,18 +211,24 @@ def get_thumbnail(source, seek, fmt='png'):
     elif fmt == 'tiff':
         extra = ['-pix_fmt', 'rgb24']
 
-    return FFmpeg(
+    data = FFmpeg(
         Input(source, seek=seek),
         Output(
             '-',
             streams=[
-                Video(fmt, frames=1, extra=extra)
+                Video(fmt, frames=1, scale=(width, -1) if width else None, extra=extra)
             ],
             fmt='image2'
         )
     ).run(text=False)
 
+    # ffmpeg succeeds without writing anything if there are no frames after the seek position
+    if not data:
+        raise ValueError("no video frame at position %s" % seek)
+    return data
+
 
+@_instrumented('extract_audio', writes_output=True)
 def extract_audio(source, output, fmt=None, codec=None, channels=None):
     """
     Extracts audio from the source media file and saves it to a separate output file.
@@ -146,6 +273,7 @@ def extract_audio(source, output, fmt=None, codec=None, channels=None):
     ).run()
 
 
+@_instrumented('remove_audio', writes_output=True)
 def remove_audio(source, output, fmt=None, remove_subtitles=True):
     """
     Creates an output video file from the source with all audio streams removed.
@@ -181,7 +309,9 @@ def remove_audio(source, output, fmt=None, remove_subtitles=True):
     ).run()
 
 
-def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, audio_bitrate=None, **kwargs):
+@_instrumented('convert_to_h264', writes_output=True)
+def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, audio_bitrate=None, allow_copy=False,
+                    **kwargs):
     """
     Converts a video file to MP4 format using H264 for video and AAC for audio.
 
@@ -198,6 +328,8 @@ def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, a
     :type audio_bitrate: int or str
     :param tuple scale: resize output to specified size (width, height) - optional
     :param list(str) extra: additional ffmpeg command line arguments - optional
+    :param bool allow_copy: copy streams which already match the requested output, instead of
+        re-encoding them - optional, default *False*
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     If *scale* is set, either width or height may be ``-1`` to use the optimal size for preserving aspect ratio,
@@ -205,6 +337,12 @@ def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, a
 
     Bitrates should be specified as integers or as strings in 'NUMk' or 'NUMm' format.
 
+    If *allow_copy* is set, the source is inspected first. If the video is already H.264 (with the requested
+    size and within the requested bitrate), it is copied without re-encoding. Likewise, if the audio is already
+    stereo AAC (within the requested bitrate), it is copied. If both are copied, the source is just remuxed
+    into the MP4 container, which is much faster than a conversion. Preset and CRF are not taken into account
+    when deciding whether the video can be copied.
+
     Example::
 
         from avtk.backends.ffmpeg.shortcuts import convert_to_h264
@@ -219,13 +357,23 @@ def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, a
         )
     """
 
+    video = H264(preset=preset, crf=crf, bit_rate=video_bitrate, **kwargs)
+    audio = AAC(channels=2, bit_rate=audio_bitrate)
+
+    if allow_copy:
+        info = MediaInfo(source, fields=_COPY_CHECK_FIELDS)
+        if _can_copy_video(info, 'h264', bit_rate=video_bitrate, **kwargs):
+            video = CopyVideo
+        if _can_copy_audio(info, 'aac', channels=2, bit_rate=audio_bitrate):
+            audio = CopyAudio
+
     return FFmpeg(
         source,
         Output(
             output,
             streams=[
-                H264(preset=preset, crf=crf, bit_rate=video_bitrate, **kwargs),
-                AAC(channels=2, bit_rate=audio_bitrate),
+                video,
+                audio,
                 NoSubtitles
             ],
             fmt=MP4(faststart=True)
@@ -233,7 +381,8 @@ def convert_to_h264(source, output, preset=None, crf=None, video_bitrate=None, a
     ).run()
 
 
-def convert_to_webm(source, output, crf=None, audio_bitrate=None, **kwrags):
+@_instrumented('convert_to_webm', writes_output=True)
+def convert_to_webm(source, output, crf=None, audio_bitrate=None, allow_copy=False, **kwargs):
     """
     Converts a video file to WebM format using VP9 for video and Opus for audio.
 
@@ -247,6 +396,8 @@ def convert_to_webm(source, output, crf=None, audio_bitrate=None, **kwrags):
     :type audio_bitrate: int or str
     :param tuple scale: resize output to specified size (width, height) - optional
     :param list(str) extra: additional ffmpeg command line arguments - optional
+    :param bool allow_copy: copy streams which already match the requested output, instead of
+        re-encoding them - optional, default *False*
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     If *scale* is set, either width or height may be ``-1`` to use the optimal size for preserving aspect ratio,
@@ -254,6 +405,10 @@ def convert_to_webm(source, output, crf=None, audio_bitrate=None, **kwrags):
 
     Audio bitrate should be specified as integer or as string in 'NUMk' format.
 
+    If *allow_copy* is set, the source is inspected first. Video that is already VP9 (with the requested size)
+    and stereo Opus audio (within the requested bitrate) are copied without re-encoding. CRF is not taken into
+    account when deciding whether the video can be copied.
+
     Example::
 
         from avtk.backends.ffmpeg.shortcuts import convert_to_webm
@@ -266,13 +421,23 @@ def convert_to_webm(source, output, crf=None, audio_bitrate=None, **kwrags):
         )
     """
 
+    video = VP9(crf=crf, **kwargs)
+    audio = Opus(channels=2, bit_rate=audio_bitrate)
+
+    if allow_copy:
+        info = MediaInfo(source, fields=_COPY_CHECK_FIELDS)
+        if _can_copy_video(info, 'vp9', **kwargs):
+            video = CopyVideo
+        if _can_copy_audio(info, 'opus', channels=2, bit_rate=audio_bitrate):
+            audio = CopyAudio
+
     return FFmpeg(
         source,
         Output(
             output,
             streams=[
-                VP9(crf=crf),
-                Opus(channels=2, bit_rate=audio_bitrate),
+                video,
+                audio,
                 NoSubtitles
             ],
             fmt=WebM()
@@ -280,7 +445,9 @@ def convert_to_webm(source, output, crf=None, audio_bitrate=None, **kwrags):
     ).run()
 
 
-def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, audio_bitrate=None, **kwargs):
+@_instrumented('convert_to_hevc', writes_output=True)
+def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, audio_bitrate=None, allow_copy=False,
+                    **kwargs):
     """
     Converts a video file to MP4 format using H.265 (HEVC) for video and AAC for audio.
 
@@ -295,6 +462,8 @@ def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, a
     :type audio_bitrate: int or str
     :param tuple scale: resize output to specified size (width, height) - optional
     :param list(str) extra: additional ffmpeg command line arguments - optional
+    :param bool allow_copy: copy streams which already match the requested output, instead of
+        re-encoding them - optional, default *False*
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     If *scale* is set, either width or height may be ``-1`` to use the optimal size for preserving aspect ratio,
@@ -302,6 +471,10 @@ def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, a
 
     Bitrates should be specified as integers or as strings in 'NUMk' or 'NUMm' format.
 
+    If *allow_copy* is set, the source is inspected first. Video that is already HEVC (with the requested size
+    and within the requested bitrate) and stereo AAC audio (within the requested bitrate) are copied without
+    re-encoding. Preset and CRF are not taken into account when deciding whether the video can be copied.
+
     Example::
 
         from avtk.backends.ffmpeg.shortcuts import convert_to_hevc
@@ -312,13 +485,23 @@ def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, a
         )
     """
 
+    video = H265(preset=preset, crf=crf, bit_rate=video_bitrate, **kwargs)
+    audio = AAC(channels=2, bit_rate=audio_bitrate)
+
+    if allow_copy:
+        info = MediaInfo(source, fields=_COPY_CHECK_FIELDS)
+        if _can_copy_video(info, 'hevc', bit_rate=video_bitrate, **kwargs):
+            video = CopyVideo
+        if _can_copy_audio(info, 'aac', channels=2, bit_rate=audio_bitrate):
+            audio = CopyAudio
+
     return FFmpeg(
         source,
         Output(
             output,
             streams=[
-                H265(preset=preset, crf=crf, bit_rate=video_bitrate, **kwargs),
-                AAC(channels=2, bit_rate=audio_bitrate),
+                video,
+                audio,
                 NoSubtitles
             ],
             fmt=MP4(faststart=True)
@@ -326,7 +509,8 @@ def convert_to_hevc(source, output, preset=None, crf=None, video_bitrate=None, a
     ).run()
 
 
-def convert_to_aac(source, output, bit_rate=None, **kwargs):
+@_instrumented('convert_to_aac', writes_output=True)
+def convert_to_aac(source, output, bit_rate=None, normalize=None, allow_copy=False, **kwargs):
     """
     Converts a media file to audio MP4 using AAC codec.
 
@@ -335,10 +519,22 @@ def convert_to_aac(source, output, bit_rate=None, **kwargs):
     :param bit_rate: target audio bitrate - optional
     :type bit_rate: int or str
     :param int channels: number of channels to downmix to - optional
+    :param normalize: normalize audio loudness - optional
+    :type normalize: :class:`~avtk.backends.ffmpeg.convert.LoudnessNormalize`
+    :param bool allow_copy: copy audio if it already matches the requested output, instead of
+        re-encoding it - optional, default *False*
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     Bit rate should be specified as integers or as strings in 'NUMk' or 'NUMm' format.
 
+    If *normalize* is set, the source is analyzed before the conversion to measure its loudness. The
+    measurement is cached, so converting the same source again (for example, to a different format)
+    skips the analysis.
+
+    If *allow_copy* is set, the source is inspected first. Audio that is already AAC (with the requested
+    number of channels and within the requested bitrate) is copied without re-encoding. Audio is never
+    copied if *normalize* is set.
+
     Example::
 
         from avtk.backends.ffmpeg.shortcuts import convert_to_aac
@@ -348,14 +544,30 @@ def convert_to_aac(source, output, bit_rate=None, **kwargs):
             '/tmp/out.aac',
             bit_rate='96k'
         )
+
+        # Normalize loudness to -16 LUFS
+        from avtk.backends.ffmpeg.convert import LoudnessNormalize
+
+        convert_to_aac(
+            'test-media/audio/stereo.mp3',
+            '/tmp/out.aac',
+            normalize=LoudnessNormalize(target_i=-16, target_tp=-1.5, target_lra=11)
+        )
     """
 
+    audio = AAC(bit_rate=bit_rate, normalize=normalize, **kwargs)
+
+    if allow_copy:
+        info = MediaInfo(source, fields=_COPY_CHECK_FIELDS)
+        if _can_copy_audio(info, 'aac', bit_rate=bit_rate, normalize=normalize, **kwargs):
+            audio = CopyAudio
+
     return FFmpeg(
         source,
         Output(
             output,
             streams=[
-                AAC(**kwargs),
+                audio,
                 NoVideo,
                 NoSubtitles
             ],
@@ -364,7 +576,8 @@ def convert_to_aac(source, output, bit_rate=None, **kwargs):
     ).run()
 
 
-def convert_to_opus(source, output, bit_rate=None, **kwargs):
+@_instrumented('convert_to_opus', writes_output=True)
+def convert_to_opus(source, output, bit_rate=None, normalize=None, **kwargs):
     """
     Converts a media file to Opus-encoded Ogg file.
 
@@ -373,10 +586,16 @@ def convert_to_opus(source, output, bit_rate=None, **kwargs):
     :param bit_rate: target audio bitrate - optional
     :type bit_rate: int or str
     :param int channels: number of channels to downmix to - optional
+    :param normalize: normalize audio loudness - optional
+    :type normalize: :class:`~avtk.backends.ffmpeg.convert.LoudnessNormalize`
     :raises NoMediaError: if source doesn't exist or is of unknown format
 
     Bit rate should be specified as integers or as strings in 'NUMk' or 'NUMm' format.
 
+    If *normalize* is set, the source is analyzed before the conversion to measure its loudness. The
+    measurement is cached, so converting the same source again (for example, to a different format)
+    skips the analysis.
+
     Example::
 
         from avtk.backends.ffmpeg.shortcuts import convert_to_opus
@@ -393,7 +612,7 @@ def convert_to_opus(source, output, bit_rate=None, **kwargs):
         Output(
             output,
             streams=[
-                Opus(**kwargs),
+                Opus(bit_rate=bit_rate, normalize=normalize, **kwargs),
                 NoVideo,
                 NoSubtitles
             ],
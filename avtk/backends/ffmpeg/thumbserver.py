@@ -0,0 +1,315 @@
+"""
+Thumbnail HTTP server
+=====================
+
+The :mod:`avtk.backends.ffmpeg.thumbserver` module implements a small HTTP server rendering video
+thumbnails on demand, using only the Python standard library. Thumbnails are requested as::
+
+    GET /thumb?src=<path>&t=<seconds>&w=<width>&fmt=<format>
+
+where *src* is the video path relative to the server root directory, *t* the position in
+seconds (default 0), *w* the thumbnail width (optional, default is the original size) and *fmt*
+the image format (one of :data:`~avtk.backends.ffmpeg.shortcuts.THUMBNAIL_FORMATS`, default *jpg*).
+
+Rendered thumbnails are kept in an in-memory LRU cache and (optionally) a disk cache, so repeated
+requests for the same thumbnail are served without running ffmpeg. The number of ffmpeg processes
+running at the same time is capped, so bursts of requests for new thumbnails can't overload the
+machine. Responses carry *ETag* and *Cache-Control* headers, so browsers and proxies can cache them
+as well.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.thumbserver import serve
+
+    >>> serve('/srv/media', port=8000, cache_dir='/var/cache/thumbs', max_processes=4)
+
+The server can also be run from the command line::
+
+    python -m avtk.backends.ffmpeg.thumbserver /srv/media --port 8000 --cache-dir /var/cache/thumbs
+"""
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import hashlib
+import math
+import os
+import os.path
+import threading
+
+from .convert import _fingerprint
+from .exceptions import NoMediaError
+from .shortcuts import get_thumbnail, THUMBNAIL_FORMATS
+
+DEFAULT_MEMORY_CACHE_SIZE = 64 * 1024 * 1024  #: Default in-memory cache size, in bytes
+DEFAULT_MAX_PROCESSES = 4  #: Default maximum number of ffmpeg processes running at the same time
+DEFAULT_MAX_AGE = 86400  #: Default *Cache-Control* max age, in seconds
+
+MAX_WIDTH = 4096  #: Largest thumbnail width which can be requested
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'tiff': 'image/tiff',
+    'bmp': 'image/bmp',
+}
+
+
+class ThumbnailCache:
+    """
+    Renders thumbnails, caching them in memory and on disk.
+
+    :param int memory_size: maximum total size of thumbnails kept in memory, in bytes - optional
+    :param str cache_dir: directory for the disk cache - optional, default is no disk cache
+    :param int max_processes: maximum number of thumbnails rendered at the same time - optional
+
+    Thumbnails are identified by the source file path, size and modification time, and the requested
+    position, width and format, so changing a file invalidates its thumbnails. Concurrent requests
+    for the same thumbnail wait for a single rendering. The disk cache is not size-limited.
+    """
+
+    def __init__(self, memory_size=DEFAULT_MEMORY_CACHE_SIZE, cache_dir=None, max_processes=DEFAULT_MAX_PROCESSES):
+        self.memory_size = memory_size
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._entries = OrderedDict()  # key -> image data, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._rendering = {}  # key -> lock held while the thumbnail is rendered
+        self._processes = threading.BoundedSemaphore(max_processes)
+
+    @staticmethod
+    def get_key(source, seek, width, fmt):
+        """
+        Returns the cache key (also usable as an ETag) for a thumbnail.
+        """
+
+        ident = repr((_fingerprint(source), float(seek), width, fmt))
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    def _get_cached(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        if self.cache_dir:
+            try:
+                with open(os.path.join(self.cache_dir, key), 'rb') as fp:
+                    data = fp.read()
+            except FileNotFoundError:
+                return None
+
+            if not data:
+                return None
+            self._remember(key, data)
+            return data
+
+        return None
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.memory_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _store(self, key, data):
+        if not data:
+            return
+        self._remember(key, data)
+
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key)
+            tmp_path = '%s.tmp-%d' % (path, threading.get_ident())
+            with open(tmp_path, 'wb') as fp:
+                fp.write(data)
+            os.replace(tmp_path, path)
+
+    def get(self, source, seek=0, width=None, fmt='jpg'):
+        """
+        Returns a thumbnail, rendering it if it's not cached.
+
+        :param str source: video file path
+        :param float seek: position in seconds - optional
+        :param int width: thumbnail width - optional, default is original size
+        :param str fmt: image format - optional, default is *jpg*
+        :returns: (key, image data) tuple
+        :raises NoMediaError: if source doesn't exist or is of unknown format
+        :raises ValueError: if there's no frame at the position (eg. it's past the end of the video)
+        """
+
+        key = self.get_key(source, seek, width, fmt)
+        data = self._get_cached(key)
+        if data is not None:
+            return key, data
+
+        with self._lock:
+            render_lock = self._rendering.setdefault(key, threading.Lock())
+
+        try:
+            with render_lock:
+                # Another request may have rendered it while we were waiting
+                data = self._get_cached(key)
+                if data is None:
+                    with self._processes:
+                        data = get_thumbnail(source, seek, fmt=fmt, width=width)
+                    self._store(key, data)
+        finally:
+            with self._lock:
+                # Waiters release the lock after the renderer removed it, by which time a newer
+                # request may have added its own one, which must stay
+                if self._rendering.get(key) is render_lock:
+                    del self._rendering[key]
+
+        return key, data
+
+
+class ThumbnailRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles thumbnail requests. Server root, cache and max age are taken from the server object.
+    """
+
+    def _send_error(self, code, message):
+        body = (message + '\n').encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _resolve_source(self, src):
+        root = os.path.realpath(self.server.root)
+        path = os.path.realpath(os.path.join(root, src.lstrip('/')))
+        if os.path.commonpath([root, path]) != root:
+            return None
+        return path
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/thumb':
+            return self._send_error(404, 'not found')
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            seek = float(params.get('t', 0))
+            width = int(params['w']) if params.get('w') else None
+            fmt = params.get('fmt', 'jpg')
+            src = params['src']
+        except (KeyError, ValueError):
+            return self._send_error(400, 'invalid parameters')
+
+        if not math.isfinite(seek) or seek < 0:
+            return self._send_error(400, 'invalid parameters')
+        if (width is not None and not 0 < width <= MAX_WIDTH) or fmt not in THUMBNAIL_FORMATS:
+            return self._send_error(400, 'invalid parameters')
+
+        path = self._resolve_source(src)
+        if path is None or not os.path.isfile(path):
+            return self._send_error(404, 'source not found')
+
+        # The key identifies the thumbnail, so cached copies can be revalidated without rendering it
+        etag = '"%s"' % self.server.cache.get_key(path, seek, width, fmt)
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        try:
+            _, data = self.server.cache.get(path, seek, width=width, fmt=fmt)
+        except NoMediaError:
+            return self._send_error(404, 'not a media file')
+        except ValueError:
+            return self._send_error(404, 'no frame at this position')
+        except RuntimeError:
+            return self._send_error(500, 'rendering failed')
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[fmt])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'public, max-age=%d' % self.server.max_age)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(root, host='127.0.0.1', port=8000, cache=None, max_age=DEFAULT_MAX_AGE, quiet=False):
+    """
+    Creates the thumbnail HTTP server, without starting it.
+
+    :param str root: directory with the video files; requests can't access files outside it
+    :param str host: address to listen on - optional, default is localhost only
+    :param int port: port to listen on - optional, default is 8000
+    :param cache: thumbnail cache - optional, default is in-memory cache with default settings
+    :type cache: :class:`ThumbnailCache`
+    :param int max_age: *Cache-Control* max age, in seconds - optional
+    :param bool quiet: don't log requests - optional
+    :rtype: :class:`http.server.ThreadingHTTPServer`
+    """
+
+    server = ThreadingHTTPServer((host, port), ThumbnailRequestHandler)
+    server.daemon_threads = True
+    server.root = root
+    server.cache = cache or ThumbnailCache()
+    server.max_age = max_age
+    server.quiet = quiet
+    return server
+
+
+def serve(root, host='127.0.0.1', port=8000, cache_dir=None, memory_size=DEFAULT_MEMORY_CACHE_SIZE,
+          max_processes=DEFAULT_MAX_PROCESSES, max_age=DEFAULT_MAX_AGE):
+    """
+    Runs the thumbnail HTTP server until interrupted.
+
+    See :func:`make_server` and :class:`ThumbnailCache` for description of the parameters.
+    """
+
+    cache = ThumbnailCache(memory_size=memory_size, cache_dir=cache_dir, max_processes=max_processes)
+    server = make_server(root, host=host, port=port, cache=cache, max_age=max_age)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='python -m avtk.backends.ffmpeg.thumbserver', description='Serve video thumbnails')
+    parser.add_argument('root', help='directory with the video files')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--cache-dir', help='directory for the disk cache (default: no disk cache)')
+    parser.add_argument('--memory-cache', type=int, default=DEFAULT_MEMORY_CACHE_SIZE // (1024 * 1024),
+                        help='in-memory cache size in MB (default: %(default)s)')
+    parser.add_argument('--max-processes', type=int, default=DEFAULT_MAX_PROCESSES,
+                        help='maximum number of concurrent ffmpeg processes (default: %(default)s)')
+    parser.add_argument('--max-age', type=int, default=DEFAULT_MAX_AGE,
+                        help='Cache-Control max age in seconds (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    serve(
+        args.root, host=args.host, port=args.port, cache_dir=args.cache_dir,
+        memory_size=args.memory_cache * 1024 * 1024, max_processes=args.max_processes, max_age=args.max_age
+    )
+
+
+if __name__ == '__main__':
+    main()
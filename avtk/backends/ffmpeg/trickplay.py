@@ -0,0 +1,148 @@
+"""
+Trickplay sprite sheets
+=======================
+
+The :mod:`avtk.backends.ffmpeg.trickplay` module generates seek bar previews ("trickplay"
+thumbnails) for video players. Thumbnails are taken at regular intervals, tiled into JPEG
+sprite sheets, and indexed by a WebVTT file in which each cue points to the part of a sheet
+showing the thumbnail for that time range, using a media fragment (``sheet.jpg#xywh=x,y,w,h``).
+
+All the sheets are produced by a single ``ffmpeg`` invocation, decoding the video only once, using
+the ``fps``, ``scale`` and ``tile`` filters.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.trickplay import generate_trickplay
+
+    >>> vtt, sheets = generate_trickplay('test-media/video/sintel.mkv', 2, output_dir='/tmp/trickplay')
+    >>> vtt
+    '/tmp/trickplay/sintel.vtt'
+    >>> sheets
+    ['/tmp/trickplay/sintel-001.jpg']
+
+The WebVTT file format for thumbnails is supported by most web video players (eg. Video.js, JW Player
+or Shaka Player).
+"""
+
+from fractions import Fraction
+import math
+import os
+import os.path
+
+from .convert import FFmpeg, Input, Output, Video, NoAudio, NoSubtitles, Duration
+from .probe import MediaInfo
+
+DEFAULT_QUALITY = 5  #: Default JPEG quality (ffmpeg ``-q:v`` scale, 2 is best and 31 worst)
+
+
+def _get_tile_height(stream, width):
+    aspect = None
+    if stream.display_aspect_ratio and stream.display_aspect_ratio != '0:1':
+        w, h = stream.display_aspect_ratio.split(':')
+        aspect = Fraction(int(w), int(h))
+    elif stream.width and stream.height:
+        aspect = Fraction(stream.width, stream.height)
+
+    if not aspect:
+        raise ValueError("can't determine video size")
+
+    # Keep the height even, as required by most pixel formats
+    return max(2, int(round(width / aspect / 2)) * 2)
+
+
+def _vtt_time(seconds):
+    ms = int(round(seconds * 1000))
+    return '%02d:%02d:%02d.%03d' % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+
+def _write_vtt(path, sheets, count, interval, duration, tile, size, url_prefix):
+    cols, rows = tile
+    width, height = size
+    per_sheet = cols * rows
+
+    with open(path, 'w') as fp:
+        fp.write('WEBVTT\n')
+        for i in range(count):
+            sheet, pos = divmod(i, per_sheet)
+            row, col = divmod(pos, cols)
+            fp.write('\n%s --> %s\n%s%s#xywh=%d,%d,%d,%d\n' % (
+                _vtt_time(i * interval),
+                _vtt_time(min((i + 1) * interval, duration)),
+                url_prefix,
+                os.path.basename(sheets[sheet]),
+                col * width, row * height, width, height
+            ))
+
+
+def generate_trickplay(
+    source, interval, tile=(10, 10), width=160, output_dir='.', name=None, quality=DEFAULT_QUALITY,
+    url_prefix='', keyframes_only=False
+):
+    """
+    Generates trickplay sprite sheets and a WebVTT index for a video.
+
+    :param str source: input file path or stream URL
+    :param interval: time between thumbnails
+    :type interval: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param tuple tile: number of thumbnails in each sheet (columns, rows) - optional, default is 10x10
+    :param int width: thumbnail width, the height is calculated to keep the aspect ratio - optional
+    :param str output_dir: directory to store the files in - optional, default is the current directory
+    :param str name: base name for the files - optional, default is source file name without the extension
+    :param int quality: JPEG quality, from 2 (best) to 31 (worst) - optional
+    :param str url_prefix: prefix for sheet URLs in the WebVTT file - optional, default is to reference
+        the sheets relative to the WebVTT file
+    :param bool keyframes_only: decode only the keyframes - optional, much faster, but each thumbnail
+        shows the last keyframe before its position instead of the exact frame
+    :returns: path to the WebVTT file and list of paths to the sprite sheets
+    :rtype: tuple(str, list(str))
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the source has no video, or the interval is invalid
+
+    Sheets are named ``<name>-001.jpg``, ``<name>-002.jpg``, and so on, and the WebVTT file ``<name>.vtt``.
+    The unused part of the last sheet is left black.
+    """
+
+    interval = Duration(interval).duration.total_seconds()
+    if interval <= 0:
+        raise ValueError("interval must be positive")
+
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    duration = info.format.duration.total_seconds() if info.format.duration else 0
+    height = _get_tile_height(info.video_streams[0], width)
+    cols, rows = tile
+
+    name = name or os.path.splitext(os.path.basename(source))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    pattern = os.path.join(output_dir, name + '-%03d.jpg')
+
+    filters = 'fps=1/%s,scale=%d:%d,setsar=1,tile=%dx%d' % (interval, width, height, cols, rows)
+
+    FFmpeg(
+        Input(source, extra=['-skip_frame', 'nokey'] if keyframes_only else None),
+        Output(
+            pattern,
+            streams=[
+                Video('mjpeg', extra=['-vf', filters, '-q:v', str(quality)]),
+                NoAudio,
+                NoSubtitles
+            ],
+            fmt='image2',
+            extra=['-map', '0:v:0']
+        )
+    ).run()
+
+    # Ignore any sheets left over from earlier runs for a longer video
+    count = int(math.ceil(duration / interval))
+    sheets = [pattern % i for i in range(1, int(math.ceil(count / (cols * rows))) + 1)]
+    sheets = [path for path in sheets if os.path.exists(path)]
+    if not sheets:
+        raise ValueError("no thumbnails generated from source")
+
+    count = min(count, len(sheets) * cols * rows)
+    vtt_path = os.path.join(output_dir, name + '.vtt')
+    _write_vtt(vtt_path, sheets, count, interval, duration, tile, (width, height), url_prefix)
+
+    return vtt_path, sheets
@@ -0,0 +1,290 @@
+"""
+Encoder settings auto-tuning
+============================
+
+The :mod:`avtk.backends.ffmpeg.tune` module finds the fastest encoder preset which still meets
+a bitrate or quality target for a particular source, by encoding a few short representative
+samples of the source with each candidate preset and measuring the results.
+
+Slower presets compress better, so at the same constant rate factor (CRF) they produce smaller
+files of similar quality. If a faster preset already meets the target, the extra encoding time
+of the slower ones is wasted.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.convert import FFmpeg, Output, AAC
+    >>> from avtk.backends.ffmpeg.tune import autotune
+
+    >>> res = autotune('test-media/video/sintel.mkv', 'h264', target_bitrate='2m', time_budget=60)
+    >>> res.meets_target
+    True
+    >>> FFmpeg('test-media/video/sintel.mkv', Output('/tmp/output.mp4', streams=[res.stream, AAC()])).run()
+"""
+
+from concurrent.futures import wait, FIRST_COMPLETED
+from tempfile import TemporaryDirectory
+from time import monotonic, perf_counter
+import os
+import os.path
+import re
+
+from .convert import FFmpeg, Input, Output, Duration, H264, H265, VP9, NoAudio, NoSubtitles, parse_bit_rate
+from .jobs import JobPool
+from .probe import MediaInfo
+from .run import ffmpeg_log
+
+X264_PRESETS = [
+    'ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'
+]  #: libx264 and libx265 presets, fastest first
+
+VP9_SPEEDS = [5, 4, 3, 2, 1, 0]  #: libvpx-vp9 speed settings, fastest first
+
+# Stream class, name of the speed setting parameter, and default candidates (fastest first) for each codec
+TUNABLE_CODECS = {
+    'h264': (H264, 'preset', X264_PRESETS),
+    'hevc': (H265, 'preset', X264_PRESETS),
+    'vp9': (VP9, 'speed', VP9_SPEEDS),
+}
+
+DEFAULT_SAMPLES = 3  #: Default number of samples to encode
+DEFAULT_SAMPLE_DURATION = 2  #: Default sample duration, in seconds
+
+SSIM_RE = re.compile(r'SSIM .*All:([0-9.]+)')
+
+
+def _get_sample_positions(duration, samples, sample_duration):
+    """
+    Spreads samples evenly over the source, returning (start, duration) for each sample.
+    """
+
+    if duration <= sample_duration:
+        return [(0, duration)]
+
+    span = duration - sample_duration
+    if samples == 1:
+        return [(span / 2, sample_duration)]
+    return [(span * i / (samples - 1), sample_duration) for i in range(samples)]
+
+
+def _fastest_match(candidates, results):
+    """
+    Returns the fastest candidate result meeting the targets, once all the faster
+    candidates are known to miss them.
+    """
+
+    for setting in candidates:
+        if setting not in results:
+            return None
+        if results[setting].meets_target:
+            return results[setting]
+    return None
+
+
+def _measure_ssim(sample, source, start, duration, filter=None):
+    # The reference goes through the same filter as the sample was encoded with, so the sizes match
+    reference = '[1:v]%s[ref];' % filter if filter else '[1:v]null[ref];'
+    log = ffmpeg_log([
+        '-i', sample,
+        '-ss', str(start), '-t', str(duration), '-i', source,
+        '-lavfi', reference + '[0:v][ref]ssim',
+        '-f', 'null', '-'
+    ])
+
+    match = SSIM_RE.search(log)
+    if match is None:
+        raise RuntimeError("can't find SSIM in ffmpeg output")
+    return float(match.group(1))
+
+
+class _SampleEncode:
+    """
+    Encodes one sample with one candidate setting, and measures the result.
+    """
+
+    def __init__(self, source, stream, start, duration, path, frames, measure_ssim):
+        self.source = source
+        self.stream = stream
+        self.start = start
+        self.duration = duration
+        self.path = path
+        self.frames = frames
+        self.measure_ssim = measure_ssim
+
+    def run(self, **kwargs):
+        job = FFmpeg(
+            Input(self.source, seek=self.start, duration=self.duration),
+            Output(self.path, streams=[self.stream, NoAudio, NoSubtitles], fmt='matroska', extra=['-map', '0:v:0'])
+        )
+
+        started = perf_counter()
+        job.run(**kwargs)
+        elapsed = perf_counter() - started
+
+        bit_rate = os.path.getsize(self.path) * 8 / self.duration
+        ssim = None
+        if self.measure_ssim:
+            ssim = _measure_ssim(self.path, self.source, self.start, self.duration, self.stream.get_filter())
+        os.unlink(self.path)
+
+        return self.frames / elapsed, bit_rate, ssim
+
+
+class TuneResult:
+    """
+    Measured results of encoding the samples using one candidate setting
+
+    :Attributes:
+        * setting - candidate encoder preset (H.264, HEVC) or speed (VP9)
+        * stream (:class:`~avtk.backends.ffmpeg.convert.Video`) - stream definition using the setting,
+          ready to use in :class:`~avtk.backends.ffmpeg.convert.Output`
+        * fps (*float*) - average encoding speed, in frames per second
+        * bit_rate (*float*) - average bitrate of the encoded samples
+        * ssim (*float* or *None*) - average structural similarity of the encoded samples to the source
+          (between 0 and 1, higher is better), if quality target was set
+        * meets_target (*bool*) - whether the setting meets the bitrate and quality targets
+        * candidates (*list*) - results for all the measured settings, fastest first
+    """
+
+    def __init__(self, setting, stream, fps, bit_rate, ssim, meets_target):
+        self.setting = setting
+        self.stream = stream
+        self.fps = fps
+        self.bit_rate = bit_rate
+        self.ssim = ssim
+        self.meets_target = meets_target
+        self.candidates = []
+
+    def __repr__(self):
+        return '<TuneResult(setting=%s, fps=%.1f, bit_rate=%dkbps, ssim=%s, meets_target=%s)>' % (
+            self.setting,
+            self.fps,
+            int(self.bit_rate / 1000),
+            '%.4f' % self.ssim if self.ssim is not None else 'n/a',
+            self.meets_target
+        )
+
+
+def autotune(
+    source, codec, target_bitrate=None, target_quality=None, time_budget=None, crf=None, candidates=None,
+    samples=DEFAULT_SAMPLES, sample_duration=DEFAULT_SAMPLE_DURATION, max_workers=None, **kwargs
+):
+    """
+    Finds the fastest encoder setting meeting a bitrate or quality target.
+
+    Encodes *samples* short samples, evenly spread over the source, with each candidate setting
+    (fastest first), in parallel using a :class:`~avtk.backends.ffmpeg.jobs.JobPool`. The samples
+    are encoded in constant quality mode using the specified *crf*, and the encoding speed,
+    resulting bitrate and (if *target_quality* is set) quality are measured.
+
+    :param str source: input file path
+    :param str codec: video codec to tune, one of ``h264``, ``hevc`` or ``vp9``
+    :param target_bitrate: maximum average bitrate - optional
+    :type target_bitrate: int or str
+    :param float target_quality: minimum average SSIM compared to the source, between 0 and 1 - optional
+    :param time_budget: stop trying slower candidates after this much time - optional, default is no limit
+    :type time_budget: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param int crf: constant rate factor to use - optional, default is the encoder default
+    :param list candidates: settings to try, fastest first - optional, default is all presets (H.264, HEVC)
+        or speeds (VP9), see :data:`X264_PRESETS` and :data:`VP9_SPEEDS`
+    :param int samples: number of samples to encode - optional
+    :param sample_duration: duration of each sample - optional, default is 2 seconds
+    :type sample_duration: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :param int max_workers: maximum number of encodes running at the same time - optional, default is the
+        number of CPU cores
+    :param kwargs: additional stream parameters (eg. *scale*), passed to the stream definition
+    :returns: results for the fastest setting meeting the targets
+    :rtype: :class:`TuneResult`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the codec is not supported, no target is set, or the source has no video
+
+    At least one of *target_bitrate* and *target_quality* must be set. If no setting meets the
+    targets within the time budget, the result is the setting which came closest to meeting them
+    (lowest bitrate, or highest quality if quality target is set), with *meets_target* set to *False*.
+
+    Encodes that are already running when the time budget runs out are allowed to finish.
+    """
+
+    if codec not in TUNABLE_CODECS:
+        raise ValueError("unsupported codec %s, expected one of: %s" % (codec, ', '.join(TUNABLE_CODECS)))
+    if target_bitrate is None and target_quality is None:
+        raise ValueError("either target bitrate or target quality must be set")
+
+    stream_class, setting_param, default_candidates = TUNABLE_CODECS[codec]
+    candidates = list(candidates or default_candidates)
+    max_bit_rate = parse_bit_rate(target_bitrate) if target_bitrate is not None else None
+
+    info = MediaInfo(source)
+    if not info.has_video:
+        raise ValueError("source has no video stream")
+
+    duration = info.format.duration.total_seconds()
+    frame_rate = float(info.video_streams[0].frame_rate or 25)
+    positions = _get_sample_positions(duration, samples, Duration(sample_duration).duration.total_seconds())
+
+    deadline = monotonic() + Duration(time_budget).duration.total_seconds() if time_budget else None
+
+    def make_stream(setting):
+        params = dict(kwargs)
+        params[setting_param] = setting
+        if crf is not None:
+            params['crf'] = crf
+        return stream_class(**params)
+
+    def meets_target(res):
+        if max_bit_rate is not None and res.bit_rate > max_bit_rate:
+            return False
+        if target_quality is not None and res.ssim < target_quality:
+            return False
+        return True
+
+    results = {}
+    with TemporaryDirectory() as tmpdir, JobPool(max_workers=max_workers) as pool:
+        pending = {}
+        for setting in candidates:
+            stream = make_stream(setting)
+            for i, (start, length) in enumerate(positions):
+                job = _SampleEncode(
+                    source, stream, start, length,
+                    os.path.join(tmpdir, 'sample-%s-%d.mkv' % (setting, i)),
+                    length * frame_rate, target_quality is not None
+                )
+                pending[pool.submit(job)] = setting
+
+        measurements = {setting: [] for setting in candidates}
+        try:
+            while pending:
+                timeout = max(deadline - monotonic(), 0) if deadline else None
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+
+                for future in done:
+                    setting = pending.pop(future)
+                    measurements[setting].append(future.result())
+
+                    if len(measurements[setting]) == len(positions):
+                        fps, bit_rate, ssim = [sum(vals) / len(vals) if None not in vals else None
+                                               for vals in zip(*measurements[setting])]
+                        res = TuneResult(setting, make_stream(setting), fps, bit_rate, ssim, False)
+                        res.meets_target = meets_target(res)
+                        results[setting] = res
+
+                if _fastest_match(candidates, results):
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+
+    measured = [results[s] for s in candidates if s in results]
+    if not measured:
+        raise ValueError("time budget too small to encode any samples")
+
+    best = _fastest_match(candidates, results)
+    if best is None:
+        if target_quality is not None:
+            best = max(measured, key=lambda res: res.ssim)
+        else:
+            best = min(measured, key=lambda res: res.bit_rate)
+
+    best.candidates = measured
+    return best
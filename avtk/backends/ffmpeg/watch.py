@@ -0,0 +1,425 @@
+"""
+Watch folder ingest
+===================
+
+The :mod:`avtk.backends.ffmpeg.watch` module watches a drop folder for new media files and processes
+them as they arrive. Once a file has stopped changing (that is, it has been completely copied into
+the folder), it is processed by a pipeline of conversions, running several files in parallel, and
+then moved to the *done* or *failed* subfolder.
+
+New files are detected using inotify on Linux, and by periodically scanning the folder elsewhere.
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.watch import WatchFolder, make_pipeline
+
+    >>> pipeline = make_pipeline('/srv/media/out', convert=['h264'], thumbnail=2)
+    >>> WatchFolder('/srv/media/incoming', pipeline, max_workers=4).run()
+
+The watcher can also be run from the command line::
+
+    python -m avtk.backends.ffmpeg.watch /srv/media/incoming /srv/media/out --convert h264 --thumbnail 2 -j 4
+"""
+
+from argparse import ArgumentParser
+from time import monotonic
+import ctypes
+import ctypes.util
+import logging
+import os
+import os.path
+import select
+import shutil
+import signal
+import struct
+import threading
+import time
+import traceback
+
+from .convert import (
+    FFmpeg, Input, Output, Video, NoSubtitles,
+    H264, H265, AAC, MP4, VP9, Opus, WebM, Ogg, NoVideo
+)
+from .jobs import JobPool
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SETTLE_TIME = 2  #: Default time a file must stay unchanged before it's processed, in seconds
+DEFAULT_POLL_INTERVAL = 1  #: Default interval between checks for new or changed files, in seconds
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class _InotifyWatcher:
+    """
+    Reports names of files changed in a directory, using Linux inotify.
+    """
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not supported")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed for %s" % path)
+
+    def wait(self, timeout):
+        """
+        Waits for changes, returning the set of changed file names (empty on timeout), or *None* if
+        events were lost and the directory needs to be rescanned.
+        """
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        pos = 0
+        while pos + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                # The kernel event queue overflowed, so some changes weren't reported
+                return None
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingWatcher:
+    """
+    Fallback watcher which doesn't know what changed, so the directory needs to be rescanned.
+    """
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+def _get_watcher(path, use_inotify=None):
+    if use_inotify is False:
+        return _PollingWatcher()
+
+    try:
+        return _InotifyWatcher(path)
+    except (OSError, AttributeError):
+        if use_inotify:
+            raise
+        log.info("inotify not available, falling back to polling %s", path)
+        return _PollingWatcher()
+
+
+def _move(path, target_dir):
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(path))
+    shutil.move(path, target)
+    return target
+
+
+class _Task:
+    """
+    Runs the pipeline for one file in a :class:`~avtk.backends.ffmpeg.jobs.JobPool` worker.
+    """
+
+    def __init__(self, pipeline, path):
+        self.pipeline = pipeline
+        self.path = path
+
+    def run(self, **kwargs):
+        jobs = self.pipeline(self.path) or []
+        if isinstance(jobs, FFmpeg):
+            jobs = [jobs]
+
+        for job in jobs:
+            job.run(**kwargs)
+
+
+class WatchFolder:
+    """
+    Watches a folder and processes new files as they arrive.
+
+    :param str path: folder to watch
+    :param pipeline: function processing a file - called with the file path, it can either do the
+        processing itself or return one or more :class:`~avtk.backends.ffmpeg.convert.FFmpeg` conversions
+        to run (see :func:`make_pipeline`)
+    :param int max_workers: maximum number of files processed at the same time - optional, default is 2
+    :param str done_dir: where to move successfully processed files - optional, default is *done* subfolder
+    :param str failed_dir: where to move files which failed to process - optional, default is *failed* subfolder
+    :param settle_time: time a file must stay unchanged before it's processed, in seconds - optional
+    :type settle_time: int or float
+    :param poll_interval: how often to check for changes, in seconds - optional
+    :type poll_interval: int or float
+    :param bool use_inotify: *True* to require inotify, *False* to always use polling - optional, default is
+        to use inotify if available
+    :param kwargs: additional :class:`~avtk.backends.ffmpeg.jobs.JobPool` arguments (eg. *nice*)
+
+    Conversions returned by the pipeline are run with their share of the CPU cores, as in
+    :class:`~avtk.backends.ffmpeg.jobs.JobPool`. If processing fails, the error is written to
+    a ``.error.txt`` file next to the failed file. Hidden files (names starting with a dot) are ignored,
+    so uploaders can use them as temporary names.
+
+    Files already in the folder when the watcher starts are processed as well.
+    """
+
+    def __init__(
+        self, path, pipeline, max_workers=2, done_dir=None, failed_dir=None,
+        settle_time=DEFAULT_SETTLE_TIME, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=None, **kwargs
+    ):
+        if not os.path.isdir(path):
+            raise ValueError("watch folder %s doesn't exist" % path)
+
+        self.path = path
+        self.pipeline = pipeline
+        self.max_workers = max_workers
+        self.done_dir = done_dir or os.path.join(path, 'done')
+        self.failed_dir = failed_dir or os.path.join(path, 'failed')
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.pool_args = kwargs
+
+        self._pending = {}  # path -> (size, mtime, time of last change)
+        self._running = {}  # path -> future
+        self._stopped = threading.Event()
+
+    def _add(self, name):
+        if name.startswith('.'):
+            return
+
+        path = os.path.join(self.path, name)
+        if path not in self._pending and path not in self._running and os.path.isfile(path):
+            self._pending[path] = (None, None, monotonic())
+
+    def _scan(self):
+        for name in os.listdir(self.path):
+            self._add(name)
+
+    def _get_settled(self):
+        now = monotonic()
+        settled = []
+
+        for path, (size, mtime, changed) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - changed >= self.settle_time:
+                del self._pending[path]
+                settled.append(path)
+
+        return settled
+
+    def _finish(self, path, future):
+        del self._running[path]
+        error = future.exception()
+
+        if error is None:
+            log.info("processed %s", path)
+            _move(path, self.done_dir)
+            return
+
+        log.error("processing %s failed: %s", path, error)
+        target = _move(path, self.failed_dir)
+        with open(target + '.error.txt', 'w') as fp:
+            fp.write(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+
+    def process_pending(self, pool, changed=None):
+        """
+        Checks for new and settled files, dispatches them for processing, and moves the processed ones.
+
+        :param pool: pool to run the pipelines in
+        :type pool: :class:`~avtk.backends.ffmpeg.jobs.JobPool`
+        :param set changed: names of changed files, or *None* to rescan the folder - optional
+        """
+
+        if changed is None:
+            self._scan()
+        else:
+            for name in changed:
+                self._add(name)
+
+        for path in self._get_settled():
+            log.info("processing %s", path)
+            self._running[path] = pool.submit(_Task(self.pipeline, path))
+
+        for path, future in list(self._running.items()):
+            if future.done():
+                self._finish(path, future)
+
+    def run(self):
+        """
+        Watches the folder and processes the files until :meth:`stop` is called.
+
+        Waits for the files being processed to finish before returning.
+        """
+
+        watcher = _get_watcher(self.path, self.use_inotify)
+        pool = JobPool(max_workers=self.max_workers, **self.pool_args)
+        try:
+            self.process_pending(pool)
+            while not self._stopped.is_set():
+                changed = watcher.wait(self.poll_interval)
+                self.process_pending(pool, changed)
+
+            pool.shutdown(wait=True)
+            for path, future in list(self._running.items()):
+                self._finish(path, future)
+        finally:
+            pool.shutdown(wait=True)
+            watcher.close()
+
+    def stop(self):
+        """
+        Stops watching the folder. Can be called from another thread or a signal handler.
+        """
+
+        self._stopped.set()
+
+
+def _output_path(source, output_dir, ext):
+    base = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(output_dir, base + ext)
+
+
+PIPELINE_CONVERSIONS = {
+    'h264': lambda src, out: FFmpeg(src, Output(
+        _output_path(src, out, '.mp4'), streams=[H264(), AAC(channels=2), NoSubtitles], fmt=MP4(faststart=True)
+    )),
+    'hevc': lambda src, out: FFmpeg(src, Output(
+        _output_path(src, out, '.mp4'), streams=[H265(), AAC(channels=2), NoSubtitles], fmt=MP4(faststart=True)
+    )),
+    'webm': lambda src, out: FFmpeg(src, Output(
+        _output_path(src, out, '.webm'), streams=[VP9(), Opus(channels=2), NoSubtitles], fmt=WebM()
+    )),
+    'opus': lambda src, out: FFmpeg(src, Output(
+        _output_path(src, out, '.ogg'), streams=[NoVideo, Opus(channels=2), NoSubtitles], fmt=Ogg()
+    )),
+}  #: Conversions available in :func:`make_pipeline`
+
+
+def make_pipeline(output_dir, convert=None, thumbnail=None):
+    """
+    Builds a pipeline for :class:`WatchFolder` from common conversions.
+
+    :param str output_dir: where to store the results
+    :param list(str) convert: conversions to run (see :data:`PIPELINE_CONVERSIONS`) - optional
+    :param thumbnail: also store a JPEG thumbnail taken at this position - optional
+    :type thumbnail: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+    :returns: pipeline function
+    :raises ValueError: if a conversion is not supported
+
+    The results are named after the source file, with the extension changed (``.jpg`` for the thumbnail).
+    """
+
+    convert = list(convert or [])
+    for name in convert:
+        if name not in PIPELINE_CONVERSIONS:
+            raise ValueError("unsupported conversion %s, expected one of: %s" % (
+                name, ', '.join(PIPELINE_CONVERSIONS)
+            ))
+
+    def pipeline(source):
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = [PIPELINE_CONVERSIONS[name](source, output_dir) for name in convert]
+
+        if thumbnail is not None:
+            jobs.append(FFmpeg(
+                Input(source, seek=thumbnail),
+                Output(_output_path(source, output_dir, '.jpg'), streams=[Video('mjpeg', frames=1)], fmt='image2')
+            ))
+
+        return jobs
+
+    return pipeline
+
+
+def add_arguments(parser):
+    """
+    Adds watch folder command line arguments to an :class:`argparse.ArgumentParser`.
+    """
+
+    parser.add_argument('folder', help='folder to watch')
+    parser.add_argument('output_dir', help='where to store the results')
+    parser.add_argument('--convert', action='append', choices=sorted(PIPELINE_CONVERSIONS),
+                        help='conversion to run on each file (can be repeated)')
+    parser.add_argument('--thumbnail', type=float, help='also store a thumbnail taken at this position (seconds)')
+    parser.add_argument('-j', '--jobs', type=int, default=2, help='files to process in parallel (default: 2)')
+    parser.add_argument('--settle-time', type=float, default=DEFAULT_SETTLE_TIME,
+                        help='seconds a file must stay unchanged before processing (default: %(default)s)')
+    parser.add_argument('--poll', action='store_true', help='always poll instead of using inotify')
+    parser.add_argument('--nice', type=int, help='niceness increment for the conversions')
+
+
+def run_from_args(args):
+    """
+    Runs the watch folder with the arguments parsed by a parser set up with :func:`add_arguments`.
+    """
+
+    if not args.convert and args.thumbnail is None:
+        raise ValueError("nothing to do, specify at least one conversion or thumbnail")
+
+    watcher = WatchFolder(
+        args.folder,
+        make_pipeline(args.output_dir, convert=args.convert, thumbnail=args.thumbnail),
+        max_workers=args.jobs,
+        settle_time=args.settle_time,
+        use_inotify=False if args.poll else None,
+        nice=args.nice
+    )
+
+    # Finish the files being processed on termination; unprocessed ones are picked up on the next start
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m avtk.backends.ffmpeg.watch',
+        description='Process media files dropped in a folder'
+    )
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        run_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
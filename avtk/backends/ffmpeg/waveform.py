@@ -0,0 +1,310 @@
+"""
+Audio waveform peaks
+====================
+
+The :mod:`avtk.backends.ffmpeg.waveform` module computes audio waveform peaks for drawing
+waveforms at different zoom levels. The audio is decoded by ``ffmpeg`` and streamed in chunks,
+so the whole decoded audio never needs to fit in memory, and the peaks for all the zoom levels
+are computed in a single pass.
+
+For each level, the audio is split into fixed-size blocks of *samples per peak* samples, and the
+minimum, maximum and RMS (root mean square) value of each block and channel is computed. Peaks
+are stored as 16-bit integers, with -32767 and 32767 corresponding to the full scale.
+
+This module requires NumPy (``pip install avtk[numpy]``).
+
+Example usage::
+
+    >>> from avtk.backends.ffmpeg.waveform import waveform, load_waveform
+
+    >>> wf = waveform('test-media/audio/stereo.mp3', output='/tmp/stereo.peaks')
+    >>> peaks = wf.get_peaks(1024, start=10, end=20)
+    >>> peaks['max'][:, 0]  # left channel maximums between 10s and 20s
+
+    >>> wf = load_waveform('/tmp/stereo.peaks')  # memory-mapped, loads instantly
+
+File format
+-----------
+
+Waveform files are designed to be memory-mapped or read piecewise (eg. using HTTP range requests).
+All values are little-endian. The file starts with a 32-byte header:
+
+* magic bytes ``AVTKWAVE`` (8 bytes)
+* format version (uint32, currently 1)
+* sample rate in Hz (uint32)
+* number of channels (uint32)
+* number of levels (uint32)
+* total number of samples per channel (uint64)
+
+followed by a 24-byte entry for each level:
+
+* samples per peak (uint32)
+* reserved (uint32, zero)
+* number of peaks (uint64)
+* offset of the level data from the start of the file (uint64)
+
+Level data is an array of peaks in time order, each consisting of (min, max, rms) int16 triples for
+each channel (:data:`PEAK_DTYPE`), so peak *i* of a level starts at byte ``offset + i * channels * 6``.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from .convert import Duration
+from .probe import MediaInfo, _check_source
+from .run import ffmpeg_iter
+
+DEFAULT_LEVELS = [256, 1024, 4096, 16384, 65536]  #: Default samples per peak for each level
+
+PEAK_DTYPE = np.dtype([
+    ('min', '<i2'),
+    ('max', '<i2'),
+    ('rms', '<i2'),
+])  #: Peak array type
+
+MAGIC = b'AVTKWAVE'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIQ')
+LEVEL_ENTRY = struct.Struct('<IIQQ')
+DATA_ALIGNMENT = 16
+
+FULL_SCALE = 32767
+CHUNK_SAMPLES = 65536  # Samples per channel in each decoded chunk
+
+
+def _quantize(values):
+    return np.clip(np.rint(values * FULL_SCALE), -FULL_SCALE, FULL_SCALE).astype('<i2')
+
+
+class _PyramidBuilder:
+    """
+    Computes the peaks incrementally, as the decoded audio arrives.
+
+    Only the finest level is computed from the samples. Each coarser level spans a whole number
+    of finest level blocks, so it's computed from the finest level minimums, maximums and sums
+    of squares at the end.
+    """
+
+    def __init__(self, levels, channels):
+        self.levels = sorted(levels)
+        self.base = self.levels[0]
+        self.channels = channels
+
+        if self.base < 1 or any(level % self.base for level in self.levels):
+            raise ValueError("samples per peak must be positive multiples of the smallest level")
+
+        self.pending = np.empty((0, channels), dtype=np.float32)
+        self.samples = 0
+        self.mins = []
+        self.maxs = []
+        self.squares = []
+
+    def _add_blocks(self, data, size):
+        blocks = data.reshape(-1, size, self.channels)
+        self.mins.append(blocks.min(axis=1))
+        self.maxs.append(blocks.max(axis=1))
+        self.squares.append(np.square(blocks, dtype=np.float64).sum(axis=1))
+
+    def add(self, samples):
+        """
+        Adds decoded samples, an array of shape (samples, channels).
+        """
+
+        self.samples += len(samples)
+        data = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        complete = len(data) - len(data) % self.base
+        if complete:
+            self._add_blocks(data[:complete], self.base)
+        self.pending = data[complete:]
+
+    def finish(self):
+        """
+        Returns peak arrays of shape (peaks, channels) for each level.
+        """
+
+        if len(self.pending):
+            self._add_blocks(self.pending, len(self.pending))
+
+        empty = np.empty((0, self.channels))
+        mins = np.concatenate(self.mins) if self.mins else empty
+        maxs = np.concatenate(self.maxs) if self.maxs else empty
+        squares = np.concatenate(self.squares) if self.squares else empty
+
+        counts = np.full(len(mins), self.base, dtype=np.float64)
+        if len(counts) and self.samples % self.base:
+            counts[-1] = self.samples % self.base
+
+        peaks = {}
+        for level in self.levels:
+            starts = np.arange(0, len(mins), level // self.base)
+            result = np.empty((len(starts), self.channels), dtype=PEAK_DTYPE)
+            if len(starts):
+                result['min'] = _quantize(np.minimum.reduceat(mins, starts))
+                result['max'] = _quantize(np.maximum.reduceat(maxs, starts))
+                n = np.add.reduceat(counts, starts)[:, np.newaxis]
+                result['rms'] = _quantize(np.sqrt(np.add.reduceat(squares, starts) / n))
+            peaks[level] = result
+
+        return peaks
+
+
+class Waveform:
+    """
+    Waveform peaks at several zoom levels.
+
+    :Attributes:
+        * sample_rate (*int*) - audio sample rate in Hz
+        * channels (*int*) - number of audio channels
+        * samples (*int*) - total number of samples per channel
+        * duration (*float*) - audio duration in seconds
+        * levels (*list(int)*) - samples per peak for each level, finest first
+        * peaks (*dict*) - peak arrays of shape (peaks, channels) of :data:`PEAK_DTYPE`, for each level
+    """
+
+    def __init__(self, sample_rate, channels, samples, peaks):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples = samples
+        self.duration = samples / sample_rate if sample_rate else 0
+        self.levels = sorted(peaks)
+        self.peaks = peaks
+
+    def get_peaks(self, samples_per_peak, start=None, end=None):
+        """
+        Returns the peaks of a level, optionally only for a part of the audio.
+
+        :param int samples_per_peak: level to get the peaks for
+        :param start: start of the part - optional, default is the start of the audio
+        :type start: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+        :param end: end of the part - optional, default is the end of the audio
+        :type end: see :class:`~avtk.backends.ffmpeg.convert.Duration`
+        :returns: peaks covering the part
+        :rtype: *numpy.ndarray* of :data:`PEAK_DTYPE`, shape (peaks, channels)
+        :raises ValueError: if there's no such level
+        """
+
+        if samples_per_peak not in self.peaks:
+            raise ValueError("no level with %s samples per peak, available: %s" % (
+                samples_per_peak, ', '.join(str(level) for level in self.levels)))
+
+        peak_duration = samples_per_peak / self.sample_rate
+        first = int(Duration(start).duration.total_seconds() / peak_duration) if start is not None else None
+        last = int(np.ceil(Duration(end).duration.total_seconds() / peak_duration)) if end is not None else None
+        return self.peaks[samples_per_peak][first:last]
+
+    def save(self, path):
+        """
+        Saves the waveform to a file (see `File format`_).
+
+        :param str path: output file path
+        """
+
+        offset = HEADER.size + LEVEL_ENTRY.size * len(self.levels)
+        entries = []
+        for level in self.levels:
+            offset += -offset % DATA_ALIGNMENT
+            entries.append((level, len(self.peaks[level]), offset))
+            offset += self.peaks[level].nbytes
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, VERSION, self.sample_rate, self.channels, len(self.levels), self.samples))
+            for level, count, offset in entries:
+                fp.write(LEVEL_ENTRY.pack(level, 0, count, offset))
+            for level, count, offset in entries:
+                fp.write(b'\0' * (offset - fp.tell()))
+                fp.write(np.ascontiguousarray(self.peaks[level]).tobytes())
+        os.replace(tmp_path, path)
+
+    def __repr__(self):
+        return '<Waveform(duration=%.2fs, channels=%d, levels=%s)>' % (self.duration, self.channels, self.levels)
+
+
+def load_waveform(path):
+    """
+    Loads a waveform saved by :meth:`Waveform.save` or :func:`waveform`.
+
+    The peak arrays are memory-mapped, so loading is instant regardless of the file size, and only
+    the parts of the file that are actually accessed are read.
+
+    :param str path: waveform file path
+    :rtype: :class:`Waveform`
+    :raises ValueError: if the file is not a valid waveform file
+    """
+
+    with open(path, 'rb') as fp:
+        header = fp.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("not a waveform file: %s" % path)
+
+        magic, version, sample_rate, channels, level_count, samples = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("not a waveform file: %s" % path)
+        if version != VERSION:
+            raise ValueError("unsupported waveform file version %d" % version)
+
+        entries = [LEVEL_ENTRY.unpack(fp.read(LEVEL_ENTRY.size)) for _ in range(level_count)]
+
+    peaks = {}
+    for level, _, count, offset in entries:
+        if count:
+            peaks[level] = np.memmap(path, dtype=PEAK_DTYPE, mode='r', offset=offset, shape=(count, channels))
+        else:
+            peaks[level] = np.empty((0, channels), dtype=PEAK_DTYPE)
+
+    return Waveform(sample_rate, channels, samples, peaks)
+
+
+def waveform(source, output=None, levels=None, stream=0, sample_rate=None, channels=None):
+    """
+    Computes waveform peaks of an audio stream.
+
+    :param str source: input file path or stream URL
+    :param str output: save the waveform to this file (see `File format`_) - optional
+    :param list(int) levels: samples per peak for each level, all multiples of the smallest one - optional,
+        default is :data:`DEFAULT_LEVELS`
+    :param int stream: index of the audio stream to use - optional, default is the first audio stream
+    :param int sample_rate: resample the audio to this sample rate - optional, default is source sample rate
+    :param int channels: downmix the audio to this number of channels - optional, default is source channels
+    :returns: computed waveform peaks
+    :rtype: :class:`Waveform`
+    :raises NoMediaError: if source doesn't exist or is of unknown format
+    :raises ValueError: if the source has no such audio stream, or the levels are invalid
+    """
+
+    _check_source(source)
+    levels = levels or DEFAULT_LEVELS
+
+    if sample_rate is None or channels is None:
+        info = MediaInfo(source)
+        if stream >= len(info.audio_streams):
+            raise ValueError("source has no audio stream %d" % stream)
+        sample_rate = sample_rate or info.audio_streams[stream].sample_rate
+        channels = channels or info.audio_streams[stream].channels
+
+    builder = _PyramidBuilder(levels, channels)
+    frame_size = 4 * channels
+
+    chunks = ffmpeg_iter([
+        '-i', source,
+        '-map', '0:a:%d' % stream,
+        '-ac', str(channels),
+        '-ar', str(sample_rate),
+        '-c:a', 'pcm_f32le',
+        '-f', 'f32le', '-'
+    ], chunk_size=CHUNK_SAMPLES * frame_size)
+
+    remainder = b''
+    for chunk in chunks:
+        if remainder:
+            chunk = remainder + chunk
+        usable = len(chunk) - len(chunk) % frame_size
+        remainder = chunk[usable:]
+        builder.add(np.frombuffer(chunk, dtype='<f4', count=usable // 4).reshape(-1, channels))
+
+    wf = Waveform(sample_rate, channels, builder.samples, builder.finish())
+    if output:
+        wf.save(output)
+    return wf
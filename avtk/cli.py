@@ -0,0 +1,298 @@
+"""
+Command line interface
+======================
+
+The ``avtk`` command exposes the :mod:`~avtk.backends.ffmpeg.shortcuts` functions on the command line,
+processing any number of files in parallel::
+
+    # Inspect files, printing the results as JSON (one object per line)
+    avtk inspect --json test-media/video/sintel.mkv test-media/audio/stereo.mp3
+
+    # Convert all files listed in files.txt to H.264, four at a time
+    avtk convert --to h264 --from-file files.txt --output-dir /tmp/out -j 4
+
+    # Extract thumbnails at the 2 second mark
+    avtk thumbnail --seek 2 --output-dir /tmp/thumbs *.mkv
+
+    # Process files dropped into a folder
+    avtk watch /srv/incoming /srv/out --convert h264 --thumbnail 2
+
+Run ``avtk <command> --help`` for the options of each command. A progress summary is printed to
+the standard error output, and the exit status is non-zero if processing of any file failed.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
+import json
+import logging
+import os.path
+import sys
+
+from .backends.ffmpeg import shortcuts, watch
+from .backends.ffmpeg.shortcuts import THUMBNAIL_FORMATS
+
+CONVERSIONS = {
+    'h264': (shortcuts.convert_to_h264, '.mp4'),
+    'hevc': (shortcuts.convert_to_hevc, '.mp4'),
+    'webm': (shortcuts.convert_to_webm, '.webm'),
+    'aac': (shortcuts.convert_to_aac, '.m4a'),
+    'opus': (shortcuts.convert_to_opus, '.ogg'),
+}  #: Conversion targets for the ``convert`` command: shortcut function and output file extension
+
+
+def _get_output_path(source, args, ext, suffix=''):
+    base = os.path.splitext(os.path.basename(source))[0]
+    output = os.path.join(args.output_dir or os.path.dirname(source), base + suffix + ext)
+
+    if os.path.abspath(output) == os.path.abspath(source):
+        raise ValueError("output would overwrite the source, use --output-dir")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    return output
+
+
+def _summarize_info(info):
+    parts = []
+    if info.format:
+        parts.append(info.format.name or '?')
+        if info.format.duration:
+            parts.append('%.2fs' % info.format.duration.total_seconds())
+    for stream in info.video_streams:
+        parts.append('%s %sx%s' % (stream.codec, stream.width, stream.height))
+    for stream in info.audio_streams:
+        parts.append('%s %sch' % (stream.codec, stream.channels))
+    return ', '.join(parts)
+
+
+def do_inspect(source, args):
+    info = shortcuts.inspect(source)
+    return dict(info=info.raw, summary=_summarize_info(info))
+
+
+def _thumbnail_output(source, args):
+    return _get_output_path(source, args, '.' + args.format)
+
+
+def do_thumbnail(source, args):
+    output = _thumbnail_output(source, args)
+    data = shortcuts.get_thumbnail(source, args.seek, fmt=args.format)
+    with open(output, 'wb') as fp:
+        fp.write(data)
+    return dict(output=output)
+
+
+def _convert_output(source, args):
+    return _get_output_path(source, args, CONVERSIONS[args.to][1])
+
+
+def do_convert(source, args):
+    func = CONVERSIONS[args.to][0]
+    output = _convert_output(source, args)
+
+    kwargs = dict(allow_copy=args.allow_copy)
+    if args.to in ['h264', 'hevc']:
+        kwargs.update(preset=args.preset, crf=args.crf, video_bitrate=args.video_bitrate,
+                      audio_bitrate=args.audio_bitrate)
+    elif args.to == 'webm':
+        kwargs.update(crf=args.crf, audio_bitrate=args.audio_bitrate)
+    else:
+        kwargs = dict(bit_rate=args.audio_bitrate)
+        if args.to == 'aac':
+            kwargs['allow_copy'] = args.allow_copy
+
+    func(source, output, **kwargs)
+    return dict(output=output)
+
+
+def _extract_audio_output(source, args):
+    return _get_output_path(source, args, args.ext)
+
+
+def do_extract_audio(source, args):
+    output = _extract_audio_output(source, args)
+    shortcuts.extract_audio(source, output, codec=args.codec, channels=args.channels)
+    return dict(output=output)
+
+
+def _remove_audio_output(source, args):
+    # Output next to the source gets a suffix, as it would otherwise overwrite the source
+    suffix = '' if args.output_dir else '-noaudio'
+    return _get_output_path(source, args, args.ext or os.path.splitext(source)[1], suffix=suffix)
+
+
+def do_remove_audio(source, args):
+    output = _remove_audio_output(source, args)
+    shortcuts.remove_audio(source, output, remove_subtitles=not args.keep_subtitles)
+    return dict(output=output)
+
+
+def _get_sources(args):
+    sources = list(args.files)
+    if args.from_file:
+        fp = sys.stdin if args.from_file == '-' else open(args.from_file)
+        with fp:
+            sources.extend(line.strip() for line in fp if line.strip())
+    return sources
+
+
+def _find_output_conflicts(sources, args):
+    """
+    Returns (source, other source, output path) for each source whose output path is already used
+    by an earlier source (eg. same file names in different folders, with ``--output-dir``).
+    """
+
+    get_output = getattr(args, 'output_path', None)
+    if get_output is None:
+        return []
+
+    outputs = {}
+    conflicts = []
+    for source in sources:
+        try:
+            output = os.path.abspath(get_output(source, args))
+        except ValueError:
+            # Reported when the source is processed
+            continue
+
+        if output in outputs:
+            conflicts.append((outputs[output], source, output))
+        else:
+            outputs[output] = source
+    return conflicts
+
+
+def _process(func, source, args):
+    started = perf_counter()
+    try:
+        result = dict(source=source, ok=True, **func(source, args))
+    except Exception as e:
+        result = dict(source=source, ok=False, error=str(e).strip() or e.__class__.__name__)
+    result['elapsed'] = round(perf_counter() - started, 3)
+    return result
+
+
+def run_batch(func, args, out=None, err=None):
+    """
+    Runs the command on all the input files in parallel, printing the results and progress.
+
+    :returns: number of failed files
+    """
+
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    sources = _get_sources(args)
+    if not sources:
+        err.write('avtk: no input files\n')
+        return 1
+
+    conflicts = _find_output_conflicts(sources, args)
+    if conflicts:
+        for source, other, output in conflicts:
+            err.write('avtk: %s and %s would both be written to %s\n' % (source, other, output))
+        return len(conflicts)
+
+    started = perf_counter()
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(_process, func, source, args) for source in sources]
+
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            if not result['ok']:
+                failed += 1
+
+            if args.json:
+                out.write(json.dumps(result) + '\n')
+            elif result['ok']:
+                out.write('%s: %s\n' % (result['source'], result.get('summary') or result.get('output')))
+            out.flush()
+
+            if not args.quiet:
+                err.write('[%d/%d] %s %s (%.1fs)%s\n' % (
+                    done, len(sources), 'ok' if result['ok'] else 'FAILED', result['source'],
+                    result['elapsed'], (': ' + result['error'].splitlines()[-1]) if not result['ok'] else ''
+                ))
+
+    if not args.quiet:
+        err.write('%d done, %d failed in %.1fs\n' % (len(sources) - failed, failed, perf_counter() - started))
+
+    return failed
+
+
+def _add_batch_arguments(parser, output=True):
+    parser.add_argument('files', nargs='*', help='input files')
+    parser.add_argument('-f', '--from-file',
+                        help="read input file paths from this file, one per line ('-' for stdin)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of files to process in parallel (default: 1)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON, one object per line')
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't print progress")
+    if output:
+        parser.add_argument('-o', '--output-dir', help='where to store the results (default: next to the input)')
+
+
+def get_parser():
+    parser = ArgumentParser(prog='avtk', description='Audio/Video toolkit')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    p = commands.add_parser('inspect', help='show information about media files')
+    _add_batch_arguments(p, output=False)
+    p.set_defaults(func=do_inspect)
+
+    p = commands.add_parser('thumbnail', help='extract thumbnails from video files')
+    _add_batch_arguments(p)
+    p.add_argument('-s', '--seek', type=float, default=0, help='position in seconds (default: 0)')
+    p.add_argument('--format', choices=THUMBNAIL_FORMATS, default='png', help='image format (default: png)')
+    p.set_defaults(func=do_thumbnail, output_path=_thumbnail_output)
+
+    p = commands.add_parser('convert', help='convert media files')
+    _add_batch_arguments(p)
+    p.add_argument('-t', '--to', choices=sorted(CONVERSIONS), required=True, help='target format')
+    p.add_argument('--preset', help='encoder preset (h264, hevc)')
+    p.add_argument('--crf', type=int, help='constant rate factor (h264, hevc, webm)')
+    p.add_argument('--video-bitrate', help='video bitrate (h264, hevc)')
+    p.add_argument('--audio-bitrate', help='audio bitrate')
+    p.add_argument('--allow-copy', action='store_true', help="copy streams which don't need re-encoding")
+    p.set_defaults(func=do_convert, output_path=_convert_output)
+
+    p = commands.add_parser('extract-audio', help='extract audio from media files')
+    _add_batch_arguments(p)
+    p.add_argument('--ext', default='.mka', help='output file extension, determining the format (default: .mka)')
+    p.add_argument('--codec', help='audio encoder (default: copy the audio without re-encoding)')
+    p.add_argument('--channels', type=int, help='downmix to this number of channels')
+    p.set_defaults(func=do_extract_audio, output_path=_extract_audio_output)
+
+    p = commands.add_parser('remove-audio', help='remove audio from video files (as NAME-noaudio.EXT without -o)')
+    _add_batch_arguments(p)
+    p.add_argument('--ext', help='output file extension, determining the format (default: same as input)')
+    p.add_argument('--keep-subtitles', action='store_true', help="don't remove subtitles")
+    p.set_defaults(func=do_remove_audio, output_path=_remove_audio_output)
+
+    p = commands.add_parser('watch', help='process files dropped in a folder')
+    watch.add_arguments(p)
+    p.set_defaults(func=None)
+
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'watch':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        try:
+            watch.run_from_args(args)
+        except ValueError as e:
+            parser.error(str(e))
+        return 0
+
+    return 1 if run_batch(args.func, args) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
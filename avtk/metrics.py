@@ -0,0 +1,453 @@
+"""
+Metrics
+=======
+
+The :mod:`avtk.metrics` module keeps counters, gauges and histograms about the work done by AVTK
+(jobs started, succeeded and failed, time spent in ``ffmpeg`` and ``ffprobe`` processes and waiting
+for a free worker, bytes produced, capability cache hits), and exports them in the Prometheus text
+format, so AVTK workers can be scraped directly.
+
+Metrics are always collected; updating a metric takes a dictionary lookup and a lock, so it adds
+only a few microseconds to an operation. The metrics are rendered only when requested, using
+:func:`render` or from the built-in HTTP endpoint (see :func:`start_http_server`).
+
+Example usage::
+
+    >>> from avtk import metrics
+    >>> from avtk.backends.ffmpeg.shortcuts import get_thumbnail
+
+    >>> server = metrics.start_http_server(9100)  # serves http://localhost:9100/metrics
+    >>> png = get_thumbnail('test-media/video/sintel.mkv', 2)
+    >>> print(metrics.render())
+    # HELP avtk_jobs_total Number of jobs, by API and status.
+    # TYPE avtk_jobs_total counter
+    avtk_jobs_total{api="get_thumbnail",status="started"} 1
+    avtk_jobs_total{api="get_thumbnail",status="succeeded"} 1
+    ...
+
+Applications can define their own metrics in the same registry::
+
+    >>> uploads = metrics.Counter('myapp_uploads_total', 'Number of uploaded files.', ['kind'])
+    >>> uploads.labels('video').inc()
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import math
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  #: Content type of the Prometheus text format
+
+#: Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, _escape_label(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append('%s="%s"' % extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+class Registry:
+    """
+    Collection of metrics rendered together.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+
+        :param metric: metric to add
+        :raises ValueError: if a metric with the same name is already registered
+        """
+
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError("metric %s is already registered" % metric.name)
+            self._metrics[metric.name] = metric
+
+    def unregister(self, metric):
+        """
+        Removes a metric from the registry.
+
+        :param metric: metric to remove
+        """
+
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def render(self):
+        """
+        Renders all the metrics in the Prometheus text format.
+
+        :rtype: str
+        """
+
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return ''.join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()  #: Default registry, containing the AVTK metrics
+
+
+class _Metric:
+    type = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+        if not self.labelnames:
+            self._default = self.labels()
+        if registry is not None:
+            registry.register(self)
+
+    def _make_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        """
+        Returns the metric for the given label values, creating it if needed.
+
+        Keep the returned object when updating it often, to skip the lookup.
+
+        :param values: label values, in the order of the label names
+        :raises ValueError: if the number of values doesn't match the number of labels
+        """
+
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+
+        if len(values) != len(self.labelnames):
+            raise ValueError("%s expects %d label values" % (self.name, len(self.labelnames)))
+
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._make_child()
+            return child
+
+    def _render_samples(self, values, child):
+        raise NotImplementedError()
+
+    def render(self):
+        """
+        Renders the metric in the Prometheus text format.
+
+        :rtype: str
+        """
+
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation.replace('\\', '\\\\').replace('\n', '\\n')),
+            '# TYPE %s %s' % (self.name, self.type),
+        ]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_samples(values, child))
+        return '\n'.join(lines) + '\n'
+
+
+class _CounterValue:
+    __slots__ = ['value', '_lock']
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """
+        Increments the counter.
+
+        :param amount: amount to add, must not be negative - optional, default is 1
+        :raises ValueError: if the amount is negative
+        """
+
+        if amount < 0:
+            raise ValueError("counters can only be incremented")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """
+    Value which only goes up (eg. number of jobs).
+
+    :param str name: metric name, by convention ending with ``_total``
+    :param str documentation: metric description
+    :param list(str) labelnames: label names - optional
+    :param registry: registry to add the metric to - optional, default is :data:`REGISTRY`, use *None*
+        to not register the metric
+    :type registry: :class:`Registry`
+
+    Metrics without labels are updated directly (``counter.inc()``), and metrics with labels through
+    :meth:`labels` (``counter.labels('inspect').inc()``).
+    """
+
+    type = 'counter'
+    child_class = _CounterValue
+
+    def inc(self, amount=1):
+        """
+        Increments the counter (only for metrics without labels).
+
+        :param amount: amount to add - optional, default is 1
+        """
+
+        self._default.inc(amount)
+
+    def _render_samples(self, values, child):
+        yield '%s%s %s' % (self.name, _format_labels(self.labelnames, values), _format_value(child.value))
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = []
+
+    def inc(self, amount=1):
+        """
+        Increments the gauge.
+
+        :param amount: amount to add - optional, default is 1
+        """
+
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        """
+        Decrements the gauge.
+
+        :param amount: amount to subtract - optional, default is 1
+        """
+
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        """
+        Sets the gauge value.
+
+        :param value: new value
+        """
+
+        self.value = value
+
+
+class Gauge(_Metric):
+    """
+    Value which can go up and down (eg. number of jobs in progress).
+
+    See :class:`Counter` for description of the parameters.
+    """
+
+    type = 'gauge'
+    child_class = _GaugeValue
+
+    def inc(self, amount=1):
+        """Increments the gauge (only for metrics without labels)"""
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        """Decrements the gauge (only for metrics without labels)"""
+        self._default.dec(amount)
+
+    def set(self, value):
+        """Sets the gauge value (only for metrics without labels)"""
+        self._default.set(value)
+
+    def _render_samples(self, values, child):
+        yield '%s%s %s' % (self.name, _format_labels(self.labelnames, values), _format_value(child.value))
+
+
+class _HistogramValue:
+    __slots__ = ['buckets', 'counts', 'sum', '_lock']
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Records an observed value.
+
+        :param value: observed value (eg. duration in seconds)
+        """
+
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """
+        Context manager observing the time spent in the block, in seconds.
+        """
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (eg. durations), counted in buckets.
+
+    :param list(float) buckets: upper bounds of the buckets - optional, default is :data:`DEFAULT_BUCKETS`
+
+    See :class:`Counter` for description of the other parameters.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets if bucket != math.inf))
+        super().__init__(name, documentation, labelnames=labelnames, registry=registry)
+
+    def _make_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        """Records an observed value (only for metrics without labels)"""
+        self._default.observe(value)
+
+    def time(self):
+        """Observes the time spent in the block (only for metrics without labels)"""
+        return self._default.time()
+
+    def _render_samples(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ('le', _format_value(bound)))
+            yield '%s_bucket%s %d' % (self.name, labels, cumulative)
+
+        labels = _format_labels(self.labelnames, values)
+        yield '%s_sum%s %s' % (self.name, labels, _format_value(total))
+        yield '%s_count%s %d' % (self.name, labels, cumulative)
+
+
+JOBS = Counter('avtk_jobs_total', 'Number of jobs, by API and status.', ['api', 'status'])
+JOBS_IN_PROGRESS = Gauge('avtk_jobs_in_progress', 'Number of jobs currently running, by API.', ['api'])
+JOB_DURATION = Histogram('avtk_job_duration_seconds', 'Time taken by finished jobs, by API.', ['api'])
+OUTPUT_BYTES = Counter('avtk_output_bytes_total', 'Number of bytes produced by successful jobs, by API.', ['api'])
+SUBPROCESS_DURATION = Histogram(
+    'avtk_subprocess_duration_seconds', 'Wall time of finished ffmpeg and ffprobe processes.', ['program']
+)
+QUEUE_WAIT = Histogram('avtk_queue_wait_seconds', 'Time jobs waited in a job pool for a free worker.')
+CAPABILITY_CACHE = Counter(
+    'avtk_capability_cache_total', 'Number of ffmpeg capability lookups, by whether they were cached.', ['result']
+)
+
+
+@contextmanager
+def track_job(api):
+    """
+    Context manager recording a job: counts it as started, and as succeeded or failed depending on
+    whether the block raises an exception, and records its duration.
+
+    :param str api: API name used as the metric label (eg. ``inspect``)
+    """
+
+    JOBS.labels(api, 'started').inc()
+    in_progress = JOBS_IN_PROGRESS.labels(api)
+    in_progress.inc()
+    started = time.monotonic()
+    try:
+        yield
+    except BaseException:
+        JOBS.labels(api, 'failed').inc()
+        raise
+    else:
+        JOBS.labels(api, 'succeeded').inc()
+    finally:
+        in_progress.dec()
+        JOB_DURATION.labels(api).observe(time.monotonic() - started)
+
+
+def render(registry=REGISTRY):
+    """
+    Renders the metrics in the Prometheus text format.
+
+    :param registry: metrics to render - optional, default is :data:`REGISTRY`
+    :type registry: :class:`Registry`
+    :rtype: str
+    """
+
+    return registry.render()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics at ``/metrics``. The registry is taken from the server object.
+    """
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            code, content_type, body = 404, 'text/plain; charset=utf-8', b'not found\n'
+        else:
+            code, content_type, body = 200, CONTENT_TYPE, render(self.server.registry).encode('utf-8')
+
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='', registry=REGISTRY):
+    """
+    Starts serving the metrics over HTTP at ``/metrics``, in a background thread.
+
+    :param int port: port to listen on (0 picks a free port)
+    :param str host: address to listen on - optional, default is all addresses
+    :param registry: metrics to serve - optional, default is :data:`REGISTRY`
+    :type registry: :class:`Registry`
+    :returns: the running server; use its ``shutdown()`` method to stop it
+    :rtype: :class:`http.server.ThreadingHTTPServer`
+    """
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,3 @@
+"""
+Helpers for testing and benchmarking code using AVTK.
+"""
@@ -0,0 +1,235 @@
+"""
+Synthetic test media
+====================
+
+The :mod:`avtk.testing.media` module generates media files with chosen properties (duration, resolution,
+codecs, GOP size, audio layout, subtitle tracks) from ffmpeg's built-in ``lavfi`` sources, so tests and
+benchmarks can exercise long-file and high-resolution code paths without downloading large fixtures.
+
+Generated files are cached by their parameters, so a fixture is only generated once, and the same
+parameters always give a file with the same contents.
+
+Example usage::
+
+    >>> from avtk.testing.media import generate_media
+
+    >>> path = generate_media(duration=7200, size=(3840, 2160), gop_size=48, subtitles=['eng', 'deu'])
+"""
+
+import hashlib
+import json
+import os
+import os.path
+
+from avtk.backends.ffmpeg.run import ffmpeg
+
+GENERATOR_VERSION = 1  #: Increment to invalidate cached files when the generated contents change
+
+VIDEO_SOURCES = ['testsrc2']  #: Supported video sources
+AUDIO_SOURCES = ['sine', 'anoisesrc']  #: Supported audio sources
+
+# Encoders accepting the -preset option
+PRESET_ENCODERS = ['libx264', 'libx265']
+
+# Subtitle encoders to use for each container, by file extension
+SUBTITLE_ENCODERS = {
+    '.mp4': 'mov_text',
+    '.m4v': 'mov_text',
+    '.mov': 'mov_text',
+    '.webm': 'webvtt',
+}
+DEFAULT_SUBTITLE_ENCODER = 'srt'
+
+SUBTITLE_CUE_INTERVAL = 5  # in seconds
+
+
+def get_cache_dir():
+    """
+    Returns the directory where generated media files are cached.
+
+    Uses ``AVTK_MEDIA_CACHE`` environment variable if set, otherwise ``avtk/media`` in the
+    user's cache directory.
+
+    :rtype: str
+    """
+
+    path = os.getenv('AVTK_MEDIA_CACHE')
+    if path:
+        return path
+
+    cache_root = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_root, 'avtk', 'media')
+
+
+def _write_subtitles(path, duration, language):
+    with open(path, 'w') as fp:
+        t = 0
+        n = 1
+        while t < duration:
+            end = min(t + SUBTITLE_CUE_INTERVAL, duration)
+            fp.write('%d\n%s --> %s\n%s subtitle %d\n\n' % (n, _srt_time(t), _srt_time(end), language, n))
+            t = end
+            n += 1
+
+
+def _srt_time(t):
+    ms = int(round(t * 1000))
+    return '%02d:%02d:%02d,%03d' % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+
+def _get_args(params, path, subtitle_paths):
+    duration = params['duration']
+    args = []
+    maps = []
+    inputs = 0
+
+    if params['size']:
+        args.extend(['-f', 'lavfi', '-i', '%s=size=%dx%d:rate=%s:duration=%s' % (
+            params['video_source'], params['size'][0], params['size'][1], params['frame_rate'], duration
+        )])
+        maps.extend(['-map', '%d:v' % inputs])
+        inputs += 1
+
+    if params['audio_layout']:
+        if params['audio_source'] == 'sine':
+            source = 'sine=frequency=440:sample_rate=%d:duration=%s' % (params['sample_rate'], duration)
+        else:
+            source = 'anoisesrc=sample_rate=%d:duration=%s:seed=1' % (params['sample_rate'], duration)
+        args.extend(['-f', 'lavfi', '-i', source])
+        maps.extend(['-map', '%d:a' % inputs])
+        inputs += 1
+
+    for sub in subtitle_paths:
+        args.extend(['-i', sub])
+        maps.extend(['-map', '%d:s' % inputs])
+        inputs += 1
+
+    args.extend(maps)
+
+    if params['size']:
+        encoder = params['video_codec']
+        args.extend(['-c:v', encoder, '-pix_fmt', params['pix_fmt']])
+        if encoder in PRESET_ENCODERS and params['preset']:
+            args.extend(['-preset', params['preset']])
+        if params['gop_size']:
+            args.extend(['-g', str(params['gop_size']), '-keyint_min', str(params['gop_size'])])
+            if encoder == 'libx264':
+                # Disable scene change detection, so all GOPs have exactly the requested size
+                args.extend(['-sc_threshold', '0'])
+        if params['video_bitrate']:
+            args.extend(['-b:v', str(params['video_bitrate'])])
+
+    if params['audio_layout']:
+        args.extend([
+            '-c:a', params['audio_codec'],
+            '-af', 'aformat=channel_layouts=%s' % params['audio_layout'],
+        ])
+
+    if subtitle_paths:
+        ext = os.path.splitext(path)[1].lower()
+        args.extend(['-c:s', SUBTITLE_ENCODERS.get(ext, DEFAULT_SUBTITLE_ENCODER)])
+        for i, language in enumerate(params['subtitles']):
+            args.extend(['-metadata:s:s:%d' % i, 'language=%s' % language])
+
+    # Keep encoder version and creation time out of the file, so it only depends on the parameters
+    args.extend(['-map_metadata', '-1', '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact'])
+    args.append(path)
+    return args
+
+
+def generate_media(
+    output=None, duration=10, size=(1280, 720), frame_rate=30, video_codec='libx264', pix_fmt='yuv420p',
+    gop_size=None, video_bitrate=None, preset='veryfast', video_source='testsrc2',
+    audio_layout='stereo', audio_codec='aac', sample_rate=48000, audio_source='sine',
+    subtitles=None, ext='.mkv', cache_dir=None
+):
+    """
+    Generates a media file with the requested properties, or returns a previously generated one.
+
+    :param str output: output file path - optional, default is to store the file in the cache
+        (see :func:`get_cache_dir`)
+    :param duration: duration in seconds - optional, default is 10 seconds
+    :type duration: int or float
+    :param tuple size: video resolution (width, height), or *None* for no video - optional, default 720p
+    :param frame_rate: video frame rate - optional, default is 30
+    :type frame_rate: int or str
+    :param str video_codec: video encoder - optional, default is *libx264*
+    :param str pix_fmt: video pixel format - optional, default is *yuv420p*
+    :param int gop_size: fixed distance between keyframes, in frames - optional, default is to let the
+        encoder decide
+    :param video_bitrate: target video bitrate - optional
+    :type video_bitrate: int or str
+    :param str preset: encoder preset, for encoders supporting it - optional, default is *veryfast*
+    :param str video_source: ``lavfi`` video source, see :data:`VIDEO_SOURCES` - optional
+    :param str audio_layout: audio channel layout (eg. *mono*, *stereo*, *5.1*), or *None* for no audio -
+        optional, default is *stereo*
+    :param str audio_codec: audio encoder - optional, default is *aac*
+    :param int sample_rate: audio sample rate - optional, default is 48kHz
+    :param str audio_source: ``lavfi`` audio source, see :data:`AUDIO_SOURCES` - optional, default is a sine tone
+    :param list(str) subtitles: languages of subtitle tracks to add - optional, default is no subtitles
+    :param str ext: file extension (determining the container format) for cached files -
+        optional, default is *.mkv*
+    :param str cache_dir: cache directory - optional, default is :func:`get_cache_dir`
+    :returns: path to the generated file
+    :rtype: str
+    :raises ValueError: if the parameters are invalid
+
+    If *output* is set, the file is always generated.
+    """
+
+    if not size and not audio_layout:
+        raise ValueError("either video or audio must be enabled")
+    if duration <= 0:
+        raise ValueError("duration must be positive")
+    if video_source not in VIDEO_SOURCES:
+        raise ValueError("unsupported video source %s" % video_source)
+    if audio_source not in AUDIO_SOURCES:
+        raise ValueError("unsupported audio source %s" % audio_source)
+
+    params = dict(
+        version=GENERATOR_VERSION,
+        duration=duration,
+        size=list(size) if size else None,
+        frame_rate=str(frame_rate),
+        video_codec=video_codec,
+        pix_fmt=pix_fmt,
+        gop_size=gop_size,
+        video_bitrate=video_bitrate,
+        preset=preset,
+        video_source=video_source,
+        audio_layout=audio_layout,
+        audio_codec=audio_codec,
+        sample_rate=sample_rate,
+        audio_source=audio_source,
+        subtitles=list(subtitles or []),
+    )
+
+    if output is None:
+        cache_dir = cache_dir or get_cache_dir()
+        key = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+        output = os.path.join(cache_dir, key + ext)
+        if os.path.exists(output):
+            return output
+
+    output_dir = os.path.dirname(os.path.abspath(output))
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Generate into a temporary file, so an interrupted run doesn't leave an incomplete file in the cache
+    root, output_ext = os.path.splitext(output)
+    tmp_path = '%s.tmp-%d%s' % (root, os.getpid(), output_ext)
+
+    subtitle_paths = []
+    try:
+        for i, language in enumerate(params['subtitles']):
+            sub_path = '%s.tmp-%d.%d.srt' % (root, os.getpid(), i)
+            _write_subtitles(sub_path, duration, language)
+            subtitle_paths.append(sub_path)
+
+        ffmpeg(_get_args(params, tmp_path, subtitle_paths))
+        os.replace(tmp_path, output)
+    finally:
+        for p in subtitle_paths + [tmp_path]:
+            if os.path.exists(p):
+                os.unlink(p)
+
+    return output
@@ -0,0 +1,30 @@
+"""
+AVTK performance benchmarks
+===========================
+
+Measures how fast the common operations are, so performance regressions between
+releases can be caught:
+
+* ``inspect`` latency
+* ``get_thumbnail`` latency
+* transcoding speed of each conversion shortcut, in frames per second (video) or
+  times realtime (audio)
+* Python-side overhead of building ffmpeg command lines with ``get_args()``
+
+Operations involving ffmpeg are run at several concurrency levels, against the files in
+``test-media/`` and larger generated fixtures.
+
+Usage::
+
+    # Run the benchmarks and save the results
+    python -m benchmarks --output results.json
+
+    # Store the results as a baseline on a reference machine
+    python -m benchmarks --output baseline.json
+
+    # Compare against the baseline, failing on >15% regressions
+    python -m benchmarks --baseline baseline.json --threshold 0.15
+
+Results are only comparable between runs on the same machine, so the baseline is not
+stored in the repository.
+"""
@@ -0,0 +1,66 @@
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+import json
+import os.path
+import sys
+
+from .cases import CASES
+from .fixtures import get_fixtures
+from .runner import run_all, get_environment, compare, DEFAULT_CONCURRENCY, DEFAULT_REPEAT, DEFAULT_THRESHOLD
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.fixtures')
+
+
+def parse_args(argv):
+    parser = ArgumentParser(prog='python -m benchmarks', description='Run AVTK performance benchmarks')
+    parser.add_argument('-o', '--output', help='write results to this JSON file')
+    parser.add_argument('-b', '--baseline', help='compare results with this JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='regression threshold, as a fraction of the baseline (default: %(default)s)')
+    parser.add_argument('-c', '--concurrency', default=','.join(str(c) for c in DEFAULT_CONCURRENCY),
+                        help='comma-separated concurrency levels (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='measured rounds per case (default: %(default)s)')
+    parser.add_argument('-k', '--filter', action='append',
+                        help='run only cases whose names contain this string (can be repeated)')
+    parser.add_argument('--fixtures-dir', default=DEFAULT_CACHE_DIR,
+                        help='where to keep generated fixtures (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    cases = CASES
+    if args.filter:
+        cases = [c for c in cases if any(f in c.name for f in args.filter)]
+
+    concurrency = [int(c) for c in args.concurrency.split(',')]
+    fixtures = get_fixtures(args.fixtures_dir)
+
+    with TemporaryDirectory() as workdir:
+        results = run_all(cases, fixtures, workdir, concurrency=concurrency, repeat=args.repeat, log=print)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(dict(environment=get_environment(), results=results), fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+        regressions = compare(results, baseline['results'], threshold=args.threshold)
+        for res, base, change in regressions:
+            print('REGRESSION %s x%d: %.4f %s (baseline %.4f, %+.0f%%)' % (
+                res['name'], res['concurrency'], res['value'], res['unit'], base['value'], change * 100
+            ))
+
+        if regressions:
+            return 1
+        print('No regressions over %.0f%% compared to %s' % (args.threshold * 100, args.baseline))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
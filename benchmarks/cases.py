@@ -0,0 +1,75 @@
+from avtk.backends.ffmpeg import shortcuts
+from avtk.backends.ffmpeg.convert import FFmpeg, Input, Output, H264, AAC, MP4
+from avtk.backends.ffmpeg.probe import MediaInfo
+
+LATENCY = 'latency'  # seconds per operation, lower is better
+THROUGHPUT = 'throughput'  # units of media processed per second (across all concurrent jobs), higher is better
+OVERHEAD = 'overhead'  # microseconds per operation, in-process only, lower is better
+
+
+def _frames(source):
+    info = MediaInfo(source)
+    stream = info.video_streams[0]
+    return info.format.duration.total_seconds() * float(stream.frame_rate)
+
+
+def _seconds(source):
+    return MediaInfo(source).format.duration.total_seconds()
+
+
+class Case:
+    """
+    Benchmark case definition
+
+    :param str name: unique case name
+    :param str kind: one of :data:`LATENCY`, :data:`THROUGHPUT` or :data:`OVERHEAD`
+    :param str fixture: name of the input file (see :func:`benchmarks.fixtures.get_fixtures`)
+    :param func: operation to measure, called with input and output paths
+    :param str ext: output file extension, for operations writing a file - optional
+    :param work: for throughput cases, function returning the amount of work (eg. number of frames)
+        in the input - optional
+    :param str unit: unit of the measured value
+    """
+
+    def __init__(self, name, kind, fixture, func, unit, ext=None, work=None):
+        self.name = name
+        self.kind = kind
+        self.fixture = fixture
+        self.func = func
+        self.unit = unit
+        self.ext = ext
+        self.work = work
+
+    @property
+    def higher_is_better(self):
+        return self.kind == THROUGHPUT
+
+
+GET_ARGS_ITERATIONS = 1000
+
+
+def _get_args(source, output):
+    for i in range(GET_ARGS_ITERATIONS):
+        FFmpeg(
+            Input(source, seek=1, duration=2),
+            Output(output, streams=[H264(preset='fast', crf=23), AAC(bit_rate='128k')], fmt=MP4())
+        ).get_args()
+
+
+CASES = [
+    Case('inspect', LATENCY, 'sintel', lambda src, out: shortcuts.inspect(src), 's'),
+    Case('inspect-1080p', LATENCY, '1080p', lambda src, out: shortcuts.inspect(src), 's'),
+    Case('get_thumbnail', LATENCY, 'sintel', lambda src, out: shortcuts.get_thumbnail(src, 2), 's'),
+    Case('get_thumbnail-1080p', LATENCY, '1080p', lambda src, out: shortcuts.get_thumbnail(src, 5), 's'),
+
+    Case('convert_to_h264', THROUGHPUT, 'sintel', shortcuts.convert_to_h264, 'fps', ext='.mp4', work=_frames),
+    Case('convert_to_h264-1080p', THROUGHPUT, '1080p', shortcuts.convert_to_h264, 'fps', ext='.mp4', work=_frames),
+    Case('convert_to_hevc', THROUGHPUT, 'sintel', shortcuts.convert_to_hevc, 'fps', ext='.mp4', work=_frames),
+    Case('convert_to_webm', THROUGHPUT, 'sintel', shortcuts.convert_to_webm, 'fps', ext='.webm', work=_frames),
+    Case('remove_audio', THROUGHPUT, 'sintel', shortcuts.remove_audio, 'fps', ext='.mkv', work=_frames),
+    Case('extract_audio', THROUGHPUT, 'sintel', shortcuts.extract_audio, 'x', ext='.mka', work=_seconds),
+    Case('convert_to_aac', THROUGHPUT, 'stereo', shortcuts.convert_to_aac, 'x', ext='.m4a', work=_seconds),
+    Case('convert_to_opus', THROUGHPUT, 'stereo', shortcuts.convert_to_opus, 'x', ext='.ogg', work=_seconds),
+
+    Case('get_args', OVERHEAD, 'sintel', _get_args, 'us', ext='.mp4'),
+]  #: All benchmark cases
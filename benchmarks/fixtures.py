@@ -0,0 +1,20 @@
+import os.path
+
+from avtk.testing.media import generate_media
+
+MEDIA_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'test-media'))
+
+
+def get_fixtures(cache_dir):
+    """
+    Returns paths to the benchmark input files, generating the missing ones in *cache_dir*.
+    """
+
+    return {
+        'sintel': os.path.join(MEDIA_ROOT, 'video', 'sintel.mkv'),
+        'stereo': os.path.join(MEDIA_ROOT, 'audio', 'stereo.mp3'),
+        # 10 seconds of 1080p H.264 video with stereo AAC audio
+        '1080p': generate_media(
+            duration=10, size=(1920, 1080), frame_rate=30, gop_size=60, ext='.mp4', cache_dir=cache_dir
+        ),
+    }
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from statistics import median
+from time import perf_counter
+import os.path
+import platform
+
+from avtk import VERSION
+from avtk.backends.ffmpeg.run import ffmpeg
+
+from .cases import LATENCY, THROUGHPUT, OVERHEAD, GET_ARGS_ITERATIONS
+
+DEFAULT_CONCURRENCY = [1, 2, 4]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15
+
+
+def _timed(func, *args):
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+
+def _output_path(case, workdir, i):
+    if not case.ext:
+        return None
+    return os.path.join(workdir, '%s-%d%s' % (case.name, i, case.ext))
+
+
+def run_case(case, source, workdir, concurrency=1, repeat=DEFAULT_REPEAT):
+    """
+    Runs a benchmark case and returns the result.
+
+    Each round runs *concurrency* copies of the operation at the same time. The first round is
+    a warm-up and isn't measured. The reported value is the median over *repeat* measured rounds.
+    """
+
+    outputs = [_output_path(case, workdir, i) for i in range(concurrency)]
+    work = case.work(source) if case.work else None
+    samples = []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for r in range(repeat + 1):
+            start = perf_counter()
+            durations = list(executor.map(lambda out: _timed(case.func, source, out), outputs))
+            wall = perf_counter() - start
+
+            if r == 0:
+                continue
+
+            if case.kind == LATENCY:
+                samples.append(median(durations))
+            elif case.kind == THROUGHPUT:
+                samples.append(concurrency * work / wall)
+            elif case.kind == OVERHEAD:
+                samples.append(median(durations) / GET_ARGS_ITERATIONS * 1e6)
+
+    return dict(
+        name=case.name,
+        kind=case.kind,
+        concurrency=concurrency,
+        unit=case.unit,
+        higher_is_better=case.higher_is_better,
+        value=median(samples),
+        samples=samples,
+    )
+
+
+def run_all(cases, fixtures, workdir, concurrency=DEFAULT_CONCURRENCY, repeat=DEFAULT_REPEAT, log=None):
+    """
+    Runs benchmark cases at all concurrency levels and returns the results. In-process
+    (overhead) cases are run only once, without concurrency.
+    """
+
+    results = []
+    for case in cases:
+        levels = [1] if case.kind == OVERHEAD else concurrency
+        for level in levels:
+            res = run_case(case, fixtures[case.fixture], workdir, concurrency=level, repeat=repeat)
+            if log:
+                log('%-24s x%-3d %12.4f %s' % (case.name, level, res['value'], res['unit']))
+            results.append(res)
+    return results
+
+
+def get_environment():
+    """
+    Describes the machine and software versions the benchmarks were run with.
+    """
+
+    version = ffmpeg(['-version'], quick=True).splitlines()
+    return dict(
+        avtk=VERSION,
+        ffmpeg=version[0] if version else None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        timestamp=datetime.now(timezone.utc).isoformat(),
+    )
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares results with the baseline and returns the regressions.
+
+    A result is a regression if it's worse than the baseline result for the same case and concurrency
+    level by more than *threshold* (as a fraction of the baseline value). Cases missing from the
+    baseline are ignored.
+
+    :returns: list of (result, baseline result, relative change) tuples, where positive change
+        means worse performance
+    """
+
+    reference = {(r['name'], r['concurrency']): r for r in baseline}
+    regressions = []
+
+    for res in results:
+        base = reference.get((res['name'], res['concurrency']))
+        if not base or not base['value']:
+            continue
+
+        change = (res['value'] - base['value']) / base['value']
+        if res['higher_is_better']:
+            change = -change
+
+        if change > threshold:
+            regressions.append((res, base, change))
+
+    return regressions
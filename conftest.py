@@ -0,0 +1,2 @@
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: runs the real ffmpeg or ffprobe tools')
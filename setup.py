@@ -30,7 +30,13 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/senko/avtk",
-    packages=setuptools.find_packages(exclude=["test", "test.*"]),
+    packages=setuptools.find_packages(exclude=["test", "test.*", "benchmarks", "benchmarks.*"]),
+    extras_require={
+        "numpy": ["numpy"],
+    },
+    entry_points={
+        "console_scripts": ["avtk=avtk.cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,9 @@
+#!/bin/sh
+
+i=0
+while [ $i -lt 5000 ]; do
+    i=$((i + 1))
+    echo "[libx264 @ 0x55d0c8a0] [warning] line $i" >&2
+done
+echo "[fatal] giving up" >&2
+exit 1
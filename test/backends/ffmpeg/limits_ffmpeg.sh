@@ -0,0 +1,5 @@
+#!/bin/sh
+
+# Reports the CPU affinity and niceness it was started with
+grep Cpus_allowed_list /proc/$$/status | cut -f2
+cut -d' ' -f19 /proc/$$/stat
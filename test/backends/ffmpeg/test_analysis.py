@@ -0,0 +1,92 @@
+import pytest
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+
+from avtk.backends.ffmpeg.analysis import (  # noqa: E402
+    analyze_bitrate, analyze_gop, _bitrate_from_batches, _gop_from_batches
+)
+from avtk.backends.ffmpeg.packets import PACKET_DTYPE, NO_VALUE  # noqa: E402
+
+
+def make_packets(pts, sizes, keys):
+    batch = np.zeros(len(pts), dtype=PACKET_DTYPE)
+    batch['pts'] = pts
+    batch['dts'] = pts
+    batch['size'] = sizes
+    batch['key'] = keys
+    return batch
+
+
+def test_bitrate_windows():
+    # 10 packets per second (time base 1/10), 3 seconds, the middle second twice as large
+    pts = np.arange(30)
+    sizes = np.array([100] * 10 + [200] * 10 + [100] * 10)
+    batches = [make_packets(pts[:15], sizes[:15], False), make_packets(pts[15:], sizes[15:], False)]
+    for batch in batches:
+        batch['duration'] = 1
+
+    br = _bitrate_from_batches(batches, 0.1, 1.0)
+
+    assert list(br.bit_rates) == [8000, 16000, 8000]
+    assert br.peak == 16000
+    assert br.peak_time == 1.0
+    assert br.duration == pytest.approx(3)
+    assert br.mean == pytest.approx(32000 / 3)
+    assert br.percentile(50) == 8000
+
+
+def test_bitrate_mean_over_covered_duration():
+    # 1.5 seconds of packets, the last window is only half covered
+    batch = make_packets(np.arange(10, 25), [100] * 15, False)
+    batch['duration'] = 1
+
+    br = _bitrate_from_batches([batch], 0.1, 1.0)
+
+    assert list(br.bit_rates) == [8000, 4000]
+    assert br.start_time == pytest.approx(1)
+    assert br.duration == pytest.approx(1.5)
+    assert br.mean == pytest.approx(8000)
+
+
+def test_bitrate_falls_back_to_dts():
+    batch = make_packets([NO_VALUE, 5, 10], [10, 10, 10], False)
+    batch['dts'][0] = 0
+
+    br = _bitrate_from_batches([batch], 0.1, 1.0)
+    assert list(br.bit_rates) == [160, 80]
+
+
+def test_gop_structure():
+    keys = np.zeros(25, dtype=bool)
+    keys[[0, 10, 20]] = True
+    packets = make_packets(np.arange(25), 1, keys)
+    batches = [packets[:12], packets[12:]]
+
+    gop = _gop_from_batches(batches, 0.04)
+
+    assert list(gop.lengths) == [10, 10, 5]
+    assert gop.distribution == {5: 1, 10: 2}
+    assert gop.is_fixed
+    assert gop.max_length == 10
+    assert list(gop.keyframe_intervals) == pytest.approx([0.4, 0.4])
+    assert gop.max_interval == pytest.approx(0.4)
+
+
+def test_analyze_bitrate():
+    path = asset_path('video', 'sintel.mkv')
+
+    br = analyze_bitrate(path, window=1)
+
+    assert len(br.bit_rates) == pytest.approx(5, abs=1)
+    assert br.peak >= br.mean
+
+
+def test_analyze_gop():
+    path = asset_path('video', 'sintel.mkv')
+
+    gop = analyze_gop(path)
+
+    assert len(gop.lengths) >= 1
+    assert gop.keyframe_times[0] == pytest.approx(0, abs=0.1)
@@ -48,3 +48,18 @@ def test_get_availble_encoders():
 
     encoders = cap.get_available_encoders()
     assert 'libtheora' in encoders
+
+
+def test_ffprobe_version_is_cached(monkeypatch):
+    calls = []
+
+    def fake_ffprobe(args, parse_json=True):
+        calls.append(args)
+        return 'ffprobe version 7.0.2 Copyright'
+
+    monkeypatch.setattr(cap, '_ffprobe_version', None)
+    monkeypatch.setattr(cap, 'ffprobe', fake_ffprobe)
+
+    assert cap.get_ffprobe_version() == '7.0.2'
+    assert cap.get_ffprobe_version() == '7.0.2'
+    assert len(calls) == 1
@@ -3,13 +3,15 @@ from decimal import Decimal
 
 import pytest
 
+from avtk.backends.ffmpeg import convert
 from avtk.backends.ffmpeg.convert import (
     FFmpeg, Input, Output, Format,
-    Audio, NoAudio, CopyAudio,
-    Video, NoVideo, CopyVideo
+    Audio, NoAudio, CopyAudio, AAC, LoudnessNormalize,
+    Video, NoVideo, CopyVideo, VP9, H264, MP4, NoSubtitles, JobTemplate, parse_bit_rate
 )
 
 from avtk.backends.ffmpeg.exceptions import NoMediaError
+from avtk.backends.ffmpeg.run import ffmpeg
 from .utils import asset_path
 
 
@@ -27,6 +29,14 @@ def test_simple_multiple_input_output():
     assert f.get_args() == ['-i', in1_path, '-i', in2_path, 'out1.mp4', 'out2.mp4']
 
 
+def test_thread_limit():
+    in_path = asset_path('video', 'sintel.mkv')
+    f = FFmpeg(in_path, 'output.mp4')
+    assert f.get_args(threads=2) == [
+        '-filter_threads', '2', '-threads', '2', '-i', in_path, '-threads', '2', 'output.mp4'
+    ]
+
+
 def test_nonexistent_input_fails():
     with pytest.raises(NoMediaError):
         FFmpeg('nonexistent.mp4', 'output.mp4')
@@ -110,6 +120,12 @@ def test_video_extra():
     assert f.get_args() == ['-i', in_path, '-c:v', 'libx264', '-crf', '23', '-preset', 'veryslow', 'output.ogv']
 
 
+def test_vp9_speed():
+    assert VP9(speed=4).get_args() == [
+        '-c:v', 'libvpx-vp9', '-crf', '31', '-b:v', '0', '-quality', 'good', '-cpu-used', '4'
+    ]
+
+
 def test_audio_simple():
     in_path = asset_path('audio', 'stereo.mp3')
     f = FFmpeg(in_path, Output('output.ogg', streams=[Audio('vorbis')]))
@@ -138,3 +154,141 @@ def test_audio_bitrate():
     in_path = asset_path('audio', 'stereo.mp3')
     f = FFmpeg(in_path, Output('output.ogg', streams=[Audio('vorbis', bit_rate='128k')]))
     assert f.get_args() == ['-i', in_path, '-c:a', 'vorbis', '-b:a', '128k', 'output.ogg']
+
+
+def test_loudness_normalize_single_pass_filter():
+    n = LoudnessNormalize(target_i=-16, target_tp=-1.5, target_lra=11)
+    assert n.get_filter() == 'loudnorm=I=-16:TP=-1.5:LRA=11,aresample=48000'
+
+
+def test_audio_loudness_normalize():
+    in_path = asset_path('audio', 'stereo.mp3')
+    n = LoudnessNormalize(target_i=-16)
+    f = FFmpeg(in_path, Output('output.m4a', streams=[AAC(normalize=n)]))
+
+    # Building the command line doesn't measure the input
+    assert f.get_args()[5] == n.get_filter()
+
+    args = f.bind().get_args()
+    assert args[:5] == ['-i', in_path, '-c:a', 'aac', '-af']
+    assert args[5].startswith('loudnorm=I=-16:TP=-2:LRA=7:measured_I=')
+    assert 'linear=true' in args[5]
+    assert args[6:] == ['output.m4a']
+
+    # Measurement is cached and reused for other outputs
+    assert n.measure(Input(in_path)) is n.measure(Input(in_path))
+    assert n.measurement is None
+
+
+def test_loudness_measurements_are_bounded(monkeypatch):
+    in_path = asset_path('audio', 'stereo.mp3')
+    monkeypatch.setattr(convert, 'MAX_LOUDNESS_MEASUREMENTS', 1)
+
+    first = LoudnessNormalize(target_i=-16).measure(Input(in_path))
+    LoudnessNormalize(target_i=-20).measure(Input(in_path))
+    assert len(convert._loudness_measurements) == 1
+    assert LoudnessNormalize(target_i=-16).measure(Input(in_path)) is not first
+
+
+def test_audio_loudness_normalize_mapped_input():
+    in_path = asset_path('audio', 'stereo.mp3')
+    video_path = asset_path('video', 'sintel.mkv')
+    n = LoudnessNormalize(target_i=-16)
+    inputs = [Input(video_path), Input(in_path)]
+
+    output = Output('output.mkv', streams=[CopyVideo, AAC(normalize=n)], extra=['-map', '0:v', '-map', '1:a'])
+    assert output._get_audio_stream(inputs) == (inputs[1], 'a:0')
+    assert Output('output.mkv', extra=['-map', '1'])._get_audio_stream(inputs) == (inputs[1], 'a:0')
+    assert Output('output.mkv', extra=['-map', '0:v', '-map', '1:a:1?'])._get_audio_stream(inputs) == (
+        inputs[1], 'a:1'
+    )
+    assert Output('output.mkv', extra=['-map', '-0:a', '-map', '0:v:0?'])._get_audio_stream(inputs) is None
+    assert Output('output.mkv')._get_audio_stream(inputs[1:]) == (inputs[1], None)
+
+    args = FFmpeg(inputs, output).bind().get_args()
+    assert args[args.index('-af') + 1] == n.bind(inputs[1], 'a:0').get_filter()
+
+
+def test_audio_loudness_normalize_unknown_map_fails():
+    in_path = asset_path('audio', 'stereo.mp3')
+    output = Output('output.m4a', streams=[AAC(normalize=LoudnessNormalize())], extra=['-map', '[mixed]'])
+
+    with pytest.raises(ValueError):
+        FFmpeg(in_path, output).bind()
+    with pytest.raises(ValueError):
+        Output('output.m4a', extra=['-map', '0:m:language:eng'])._get_audio_stream([Input(in_path)])
+
+
+def test_loudness_measures_mapped_stream(tmpdir):
+    path = str(tmpdir.join('tracks.mka'))
+    ffmpeg([
+        '-f', 'lavfi', '-i', 'sine=f=440:d=3', '-f', 'lavfi', '-i', 'sine=f=440:d=3,volume=0.1',
+        '-map', '0', '-map', '1', '-c:a', 'pcm_s16le', path
+    ])
+
+    n = LoudnessNormalize()
+    quiet = n.measure(Input(path), 'a:1')
+    assert float(quiet['input_i']) < float(n.measure(Input(path), 'a:0')['input_i']) - 15
+    assert n.measure(Input(path), '1') == quiet
+
+
+def test_job_template_matches_ffmpeg():
+    in_path = asset_path('video', 'sintel.mkv')
+    streams = [H264(crf=23), AAC(bit_rate='128k'), NoSubtitles]
+    template = JobTemplate(streams=streams, fmt=MP4(faststart=True), seek=2, duration=5)
+    f = FFmpeg(Input(in_path, seek=2, duration=5), Output('output.mp4', streams=streams, fmt=MP4(faststart=True)))
+
+    job = template.job(in_path, 'output.mp4')
+    assert job.get_args() == f.get_args()
+    assert job.get_args(threads=2) == f.get_args(threads=2)
+    assert str(job.outputs[0]) == str(f.outputs[0])
+
+
+def test_job_template_skips_source_check():
+    template = JobTemplate(fmt='mp4')
+    assert template.job('nonexistent.mp4', 'output.mp4').get_args() == [
+        '-i', 'nonexistent.mp4', '-f', 'mp4', 'output.mp4'
+    ]
+
+
+def test_job_template_resolves_source_when_bound(monkeypatch):
+    resolved = []
+    monkeypatch.setattr(convert, 'get_local_source', lambda source: resolved.append(source) or '/cache/input.mp4')
+
+    template = JobTemplate(fmt='mp4')
+    job = template.job('http://example.com/input.mp4', 'output.mp4')
+    assert resolved == []
+    assert job.get_args()[:2] == ['-i', 'http://example.com/input.mp4']
+
+    assert job.bind().get_args()[:2] == ['-i', '/cache/input.mp4']
+    assert resolved == ['http://example.com/input.mp4']
+
+
+def test_job_template_unsupported_format_fails():
+    with pytest.raises(ValueError):
+        JobTemplate(fmt='nonexistent')
+
+
+def test_job_template_binds_input_dependent_streams():
+    in_path = asset_path('audio', 'stereo.mp3')
+    n = LoudnessNormalize(target_i=-16)
+    template = JobTemplate(streams=[NoVideo, AAC(normalize=n)], extra=['-ar', '48000'])
+
+    assert not NoVideo.depends_on_input()
+    assert AAC(normalize=n).depends_on_input()
+
+    job = template.job(in_path, 'output.m4a')
+    assert 'measured_I=' not in job.get_args()[6]
+
+    args = job.bind().get_args()
+    assert args[:6] == ['-i', in_path, '-vn', '-c:a', 'aac', '-af']
+    assert 'measured_I=' in args[6]
+    assert args[7:] == ['-ar', '48000', 'output.m4a']
+
+
+def testparse_bit_rate():
+    assert parse_bit_rate(None) is None
+    assert parse_bit_rate(128000) == 128000
+    assert parse_bit_rate('128k') == 128000
+    assert parse_bit_rate('2.5M') == 2500000
+    assert parse_bit_rate('96000') == 96000
@@ -0,0 +1,154 @@
+from subprocess import run
+from tempfile import TemporaryDirectory
+import os.path
+
+import pytest
+
+from avtk.backends.ffmpeg import edit
+from avtk.backends.ffmpeg.edit import (
+    smart_cut, concat, _get_matching_encoder, _write_concat_list, _get_signature
+)
+from avtk.backends.ffmpeg.probe import MediaInfo, Format, Stream
+
+from .utils import asset_path
+
+video_path = asset_path('video', 'sintel.mkv')
+
+
+def make_info(streams):
+    info = MediaInfo.__new__(MediaInfo)
+    info.raw = dict(streams=streams)
+    info.format = Format({})
+    info.streams = [Stream._parse(s) for s in streams]
+    return info
+
+
+VIDEO = dict(
+    codec_type='video', codec_name='h264', profile='High', width=1280, height=720,
+    pix_fmt='yuv420p', time_base='1/1000'
+)
+AUDIO = dict(codec_type='audio', codec_name='aac', sample_rate='48000', channels=2, time_base='1/48000')
+
+
+def test_write_concat_list_escapes_quotes():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'list.txt')
+        _write_concat_list(path, ['/tmp/it\'s.ts', ('/tmp/b.mkv', 2, 6.5)])
+
+        with open(path) as fp:
+            lines = fp.read().splitlines()
+
+    assert lines == [
+        "file '/tmp/it'\\''s.ts'",
+        "file '/tmp/b.mkv'",
+        'inpoint 2.000000',
+        'outpoint 6.500000',
+    ]
+
+
+def test_smart_cut_rejects_empty_clip():
+    with pytest.raises(ValueError):
+        smart_cut(video_path, 3, 3, '/tmp/clip.mkv')
+
+
+def test_matching_encoder():
+    info = MediaInfo(video_path)
+    args = _get_matching_encoder(info).get_args()
+    assert args[:2] == ['-c:v', 'libx264']
+    assert '-pix_fmt' in args
+
+
+@pytest.mark.parametrize('profile, expected', [
+    ('Constrained Baseline', 'baseline'),
+    ('High 4:4:4 Predictive', 'high444'),
+    ('Extended', None),
+    (None, None),
+])
+def test_matching_encoder_profile(profile, expected):
+    info = make_info([dict(VIDEO, profile=profile)])
+    args = _get_matching_encoder(info).get_args()
+
+    if expected:
+        assert args[args.index('-profile:v') + 1] == expected
+    else:
+        assert '-profile:v' not in args
+
+
+@pytest.mark.slow
+def test_smart_cut():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'clip.mkv')
+        smart_cut(video_path, 1.5, 4, path)
+
+        info = MediaInfo(path)
+        assert info.has_video
+        assert abs(info.format.duration.total_seconds() - 2.5) < 0.1
+
+
+def test_signature_matches_compatible_streams():
+    a = make_info([VIDEO, AUDIO])
+    b = make_info([dict(VIDEO, bit_rate='1000000'), dict(AUDIO, bit_rate='128000')])
+    assert _get_signature(a) == _get_signature(b)
+
+
+def test_signature_differs_on_mismatch():
+    a = make_info([VIDEO, AUDIO])
+    assert _get_signature(a) != _get_signature(make_info([dict(VIDEO, width=1920), AUDIO]))
+    assert _get_signature(a) != _get_signature(make_info([VIDEO, dict(AUDIO, sample_rate='44100')]))
+    assert _get_signature(a) != _get_signature(make_info([dict(VIDEO, time_base='1/90000'), AUDIO]))
+    assert _get_signature(a) != _get_signature(make_info([VIDEO]))
+
+
+def test_concat_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        concat([video_path], '/tmp/joined.mkv', mode='fast')
+
+    with pytest.raises(ValueError):
+        concat([], '/tmp/joined.mkv')
+
+
+@pytest.mark.parametrize('mode', ['auto', 'encode'])
+def test_concat_rejects_missing_streams(monkeypatch, mode):
+    infos = {
+        'av.mkv': make_info([VIDEO, AUDIO]),
+        'video.mkv': make_info([VIDEO]),
+        'audio.mkv': make_info([AUDIO]),
+    }
+    monkeypatch.setattr(edit, 'MediaInfo', lambda source, fields=None: infos[source])
+
+    with pytest.raises(ValueError, match='video.mkv.*no audio stream'):
+        concat(['av.mkv', 'video.mkv'], '/tmp/joined.mkv', mode=mode)
+
+    with pytest.raises(ValueError, match='audio.mkv.*no video stream'):
+        concat(['av.mkv', 'audio.mkv'], '/tmp/joined.mkv', mode=mode)
+
+
+@pytest.mark.slow
+def test_concat_copy():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'joined.mkv')
+        concat([video_path, video_path], path, mode='copy')
+
+        src = MediaInfo(video_path).format.duration.total_seconds()
+        dst = MediaInfo(path).format.duration.total_seconds()
+        assert abs(dst - 2 * src) < 0.2
+
+
+@pytest.mark.slow
+def test_concat_reencodes_mismatched_parts():
+    with TemporaryDirectory() as tmpdir:
+        small = os.path.join(tmpdir, 'small.mkv')
+        run(['ffmpeg', '-v', 'error', '-i', video_path, '-map', '0:v', '-map', '0:a',
+             '-c:v', 'libx264', '-vf', 'scale=640:-2', '-c:a', 'copy', small], check=True)
+
+        path = os.path.join(tmpdir, 'joined.mp4')
+        concat([video_path, small], path)
+
+        info = MediaInfo(path)
+        assert (info.video_streams[0].width, info.video_streams[0].height) == (1920, 818)
+        src = MediaInfo(video_path).format.duration.total_seconds()
+        assert abs(info.format.duration.total_seconds() - 2 * src) < 0.2
+
+        # Parts with different codec parameters decode cleanly after joining
+        errors = run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'], capture_output=True, text=True)
+        assert errors.stderr == ''
@@ -0,0 +1,102 @@
+from multiprocessing import Process, Queue
+from threading import Thread
+import time
+
+import pytest
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('multiprocessing.shared_memory')
+
+from avtk.backends.ffmpeg.fanout import FrameFanout, FrameReader  # noqa: E402
+
+SOURCE = asset_path('video', 'sintel.mkv')
+
+
+def read_frames(name, consumer, delay=0):
+    frames = []
+    with FrameReader(name, consumer) as reader:
+        for seq, frame in reader:
+            frames.append((seq, frame.sum()))
+            time.sleep(delay)
+    return frames
+
+
+def read_in_process(name, consumer, queue):
+    queue.put((consumer, read_frames(name, consumer)))
+
+
+def test_threads_get_all_frames():
+    results = {}
+
+    with FrameFanout(SOURCE, consumers=2, size=(64, 36), fps=10, slots=2) as fanout:
+        threads = [
+            Thread(target=lambda i=i: results.update({i: read_frames(fanout.name, i, delay=0.001 * i)}))
+            for i in range(2)
+        ]
+        for t in threads:
+            t.start()
+        count = fanout.run()
+        for t in threads:
+            t.join()
+
+    assert count > 0
+    assert [seq for seq, _ in results[0]] == list(range(count))
+    assert results[0] == results[1]
+
+
+def test_processes_get_all_frames():
+    queue = Queue()
+
+    with FrameFanout(SOURCE, consumers=3, size=(32, 18), pix_fmt='gray', fps=5) as fanout:
+        workers = [Process(target=read_in_process, args=(fanout.name, i, queue)) for i in range(3)]
+        for w in workers:
+            w.start()
+        count = fanout.run()
+        results = dict(queue.get(timeout=10) for _ in workers)
+        for w in workers:
+            w.join()
+
+    assert all(len(frames) == count for frames in results.values())
+    assert results[0] == results[1] == results[2]
+
+
+def test_frames_are_shared_views():
+    with FrameFanout(SOURCE, consumers=1, size=(32, 18), fps=5) as fanout:
+        producer = Thread(target=fanout.run)
+        producer.start()
+        with FrameReader(fanout.name, 0) as reader:
+            seq, frame = next(iter(reader))
+            assert frame.shape == (18, 32, 3)
+            assert not frame.flags.owndata
+            del frame
+        producer.join()
+
+
+def test_stalled_consumer_times_out():
+    with FrameFanout(SOURCE, consumers=2, size=(32, 18), slots=2, stall_timeout=0.2) as fanout:
+        with pytest.raises(TimeoutError):
+            fanout.run()
+
+        with FrameReader(fanout.name, 0) as reader:
+            with pytest.raises(RuntimeError):
+                list(reader)
+
+
+def test_detached_consumer_doesnt_block():
+    with FrameFanout(SOURCE, consumers=2, size=(32, 18), fps=5, slots=2, stall_timeout=5) as fanout:
+        FrameReader(fanout.name, 1).close()
+        consumer = Thread(target=lambda: read_frames(fanout.name, 0))
+        consumer.start()
+        assert fanout.run() > 2
+        consumer.join()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        FrameFanout(SOURCE, consumers=1, size=(32, 18), pix_fmt='yuv420p')
+
+    with FrameFanout(SOURCE, consumers=1, size=(32, 18)) as fanout:
+        with pytest.raises(ValueError):
+            FrameReader(fanout.name, 1)
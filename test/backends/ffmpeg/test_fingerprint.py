@@ -0,0 +1,119 @@
+import pytest
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+
+from avtk.backends.ffmpeg import fingerprint as fp  # noqa: E402
+from avtk.backends.ffmpeg.convert import FFmpeg, Output, H264, NoAudio, NoSubtitles  # noqa: E402
+from avtk.backends.ffmpeg.fingerprint import fingerprint, Fingerprint, FingerprintIndex  # noqa: E402
+
+
+def make_frames(seed, count=4):
+    rng = np.random.RandomState(seed)
+    # Smooth random images (sums of low frequency waves), so small perturbations don't flip many bits
+    y, x = np.mgrid[0:32, 0:32] / 32.0
+    frames = np.full((count, 32, 32), 128.0)
+    for _ in range(6):
+        fx, fy = rng.uniform(0.5, 3, size=(2, count, 1, 1))
+        phase = rng.uniform(0, 2 * np.pi, size=(count, 1, 1))
+        frames += 20 * np.sin(2 * np.pi * (fx * x + fy * y) + phase)
+    return frames
+
+
+def test_hashes_are_stable_under_noise():
+    frames = make_frames(1)
+    noisy = frames + np.random.RandomState(2).normal(0, 2, size=frames.shape)
+
+    a = Fingerprint.from_frames(frames)
+    assert len(a.phash) == len(a.dhash) == 4
+    assert a.bits == 512
+    assert a.distance(Fingerprint.from_frames(noisy)) < 30
+    assert a.distance(Fingerprint.from_frames(make_frames(3))) > 150
+
+
+def test_hashes_survive_brightness_change():
+    frames = make_frames(1)
+    a = Fingerprint.from_frames(frames)
+    assert a.distance(Fingerprint.from_frames(frames * 0.8 + 20)) == 0
+
+
+def test_distance_size_mismatch():
+    with pytest.raises(ValueError):
+        Fingerprint.from_frames(make_frames(1, 2)).distance(Fingerprint.from_frames(make_frames(1, 3)))
+
+
+def test_popcount_fallback(monkeypatch):
+    values = np.array([[0, 1, 2 ** 64 - 1], [3, 2 ** 63, 0]], dtype=np.uint64)
+    expected = [65, 3]
+
+    assert list(fp._popcount(values)) == expected
+    monkeypatch.delattr(np, 'bitwise_count', raising=False)
+    assert list(fp._popcount(values)) == expected
+
+
+def test_index_query():
+    index = FingerprintIndex()
+    prints = [Fingerprint.from_frames(make_frames(seed)) for seed in range(40)]
+    for i, p in enumerate(prints):
+        index.add('video%d' % i, p)
+
+    assert len(index) == 40
+    assert index.query(prints[7], radius=0) == [('video7', 0)]
+
+    noisy = Fingerprint.from_frames(make_frames(7) + 3)
+    matches = index.query(noisy, radius=64)
+    assert matches[0][0] == 'video7'
+    assert [key for key, distance in matches] == ['video7']
+
+
+def test_index_query_in_blocks(monkeypatch):
+    monkeypatch.setattr(fp, 'QUERY_BLOCK_SIZE', 3)
+    index = FingerprintIndex()
+    target = Fingerprint.from_frames(make_frames(1))
+    for i in range(10):
+        index.add(i, target if i in (4, 9) else Fingerprint.from_frames(make_frames(i + 100)))
+
+    assert index.query(target, radius=0) == [(4, 0), (9, 0)]
+
+
+def test_index_size_mismatch():
+    index = FingerprintIndex()
+    index.add('a', Fingerprint.from_frames(make_frames(1, 2)))
+
+    with pytest.raises(ValueError):
+        index.add('b', Fingerprint.from_frames(make_frames(1, 3)))
+    with pytest.raises(ValueError):
+        index.query(Fingerprint.from_frames(make_frames(1, 3)), radius=10)
+
+
+def test_index_save_and_load(tmpdir):
+    index = FingerprintIndex()
+    p = Fingerprint.from_frames(make_frames(5))
+    index.add('a', Fingerprint.from_frames(make_frames(4)))
+    index.add('b', p)
+
+    path = str(tmpdir.join('index.npz'))
+    index.save(path)
+    loaded = FingerprintIndex.load(path)
+
+    assert loaded.keys == ['a', 'b']
+    assert loaded.query(p, radius=0) == [('b', 0)]
+
+
+def test_empty_index(tmpdir):
+    index = FingerprintIndex()
+    assert index.query(Fingerprint.from_frames(make_frames(1)), radius=10) == []
+
+    path = str(tmpdir.join('index.npz'))
+    index.save(path)
+    assert len(FingerprintIndex.load(path)) == 0
+
+
+@pytest.mark.slow
+def test_fingerprint_reencoded(tmpdir):
+    source = asset_path('video', 'sintel.mkv')
+    output = str(tmpdir.join('reencoded.mp4'))
+    FFmpeg(source, Output(output, streams=[H264(scale=(320, -2), crf=35), NoAudio, NoSubtitles])).run()
+
+    assert fingerprint(source).distance(fingerprint(output)) < 64
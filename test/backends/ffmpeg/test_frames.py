@@ -0,0 +1,43 @@
+import pytest
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+
+from avtk.backends.ffmpeg.frames import sample_frames, _get_positions, _make_job  # noqa: E402
+
+
+def test_positions():
+    assert _get_positions(10, 5) == [1, 3, 5, 7, 9]
+    assert _get_positions(4, 1) == [2]
+
+
+def test_job_args():
+    source = asset_path('video', 'sintel.mkv')
+    args = _make_job(source, [1.0, 3.0], (64, 48), 'keyframe').get_args()
+
+    assert args.count('-i') == 2
+    assert args.count('-skip_frame') == 2
+    graph = args[args.index('-filter_complex') + 1]
+    assert 'scale=64:48' in graph
+    assert graph.endswith('[v0][v1]concat=n=2:v=1:a=0[out]')
+    assert args[args.index('-frames:v') + 1] == '2'
+
+    assert '-skip_frame' not in _make_job(source, [1.0], (64, 48), 'exact').get_args()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        sample_frames('video.mkv', 4, accuracy='fuzzy')
+    with pytest.raises(ValueError):
+        sample_frames('video.mkv', 0)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('accuracy', ['keyframe', 'exact'])
+def test_sample_frames(accuracy):
+    frames = sample_frames(asset_path('video', 'sintel.mkv'), 5, size=(32, 24), accuracy=accuracy, batch_size=2)
+
+    assert frames.shape == (5, 24, 32, 3)
+    assert frames.dtype == np.uint8
+    assert frames.any()
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from avtk.backends.ffmpeg.jobs import JobPool, plan_cpu_sets
+
+
+class FakeJob:
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+        self.kwargs = None
+
+    def run(self, **kwargs):
+        self.kwargs = kwargs
+        if self.barrier:
+            self.barrier.wait(timeout=5)
+        return 'done'
+
+
+def test_plan_cpu_sets_disjoint():
+    sets = plan_cpu_sets(list(range(10)), 4)
+    assert [len(s) for s in sets] == [3, 3, 2, 2]
+    assert set().union(*sets) == set(range(10))
+    assert sum(len(s) for s in sets) == 10
+
+
+def test_plan_cpu_sets_oversubscribed():
+    assert plan_cpu_sets([0, 1], 3) == [{0}, {1}, {0}]
+
+
+def test_plan_cpu_sets_invalid():
+    with pytest.raises(ValueError):
+        plan_cpu_sets([], 2)
+    with pytest.raises(ValueError):
+        plan_cpu_sets([0, 1], 0)
+
+
+def test_job_pool_assigns_disjoint_cpus():
+    barrier = threading.Barrier(2)
+    jobs = [FakeJob(barrier), FakeJob(barrier)]
+
+    with JobPool(max_workers=2, cores=[0, 1, 2, 3], pin=True, nice=5) as pool:
+        assert pool.map(jobs) == ['done', 'done']
+
+    a, b = jobs[0].kwargs, jobs[1].kwargs
+    assert a['threads'] == b['threads'] == 2
+    assert a['nice'] == 5
+    assert a['cpus'].isdisjoint(b['cpus'])
+
+
+def test_job_pool_without_pinning():
+    job = FakeJob()
+    with JobPool(max_workers=1, cores=[0, 1, 2]) as pool:
+        pool.submit(job).result()
+
+    assert job.kwargs['threads'] == 3
+    assert job.kwargs['cpus'] is None
+
+
+def test_job_pool_with_usage():
+    job = FakeJob()
+    with JobPool(max_workers=1, cores=[0]) as pool:
+        pool.map([job])
+        assert 'with_usage' not in job.kwargs
+        pool.map([job], with_usage=True)
+        assert job.kwargs['with_usage'] is True
@@ -0,0 +1,79 @@
+import pytest
+
+from avtk.backends.ffmpeg.exceptions import NoMediaError
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+
+from avtk.backends.ffmpeg.packets import (  # noqa: E402
+    iter_packets, iter_frames, read_packets, get_time_base, _parse_batch,
+    PACKET_DTYPE, PACKET_ENTRIES, FRAME_DTYPE, FRAME_ENTRIES, NO_VALUE
+)
+
+
+def test_parse_packet_batch():
+    columns = {'pts': 0, 'dts': 1, 'duration': 2, 'size': 3, 'pos': 4, 'flags': 5}
+    rows = [
+        ['0', '-42', '42', '1000', '123', 'K__'],
+        ['N/A', '0', '42', '200', 'N/A', '___'],
+    ]
+
+    batch = _parse_batch(rows, columns, PACKET_DTYPE, PACKET_ENTRIES)
+
+    assert batch.dtype == PACKET_DTYPE
+    assert list(batch['pts']) == [0, NO_VALUE]
+    assert list(batch['dts']) == [-42, 0]
+    assert list(batch['size']) == [1000, 200]
+    assert list(batch['pos']) == [123, NO_VALUE]
+    assert list(batch['key']) == [True, False]
+
+
+def test_parse_frame_batch_uses_fallback_entries():
+    columns = {'key_frame': 0, 'pkt_pts': 1, 'pkt_duration': 2, 'pkt_size': 3, 'pict_type': 4}
+    rows = [
+        ['1', '0', '1', '5000', 'I'],
+        ['0', '1', '1', '300', 'B'],
+    ]
+
+    batch = _parse_batch(rows, columns, FRAME_DTYPE, FRAME_ENTRIES)
+
+    assert list(batch['pts']) == [0, 1]
+    assert list(batch['duration']) == [1, 1]
+    assert list(batch['key']) == [True, False]
+    assert list(batch['pict_type']) == [b'I', b'B']
+
+
+def test_packets_nonexistent_file():
+    with pytest.raises(NoMediaError):
+        iter_packets('/nonexistent')
+
+
+def test_read_packets():
+    path = asset_path('video', 'sintel.mkv')
+
+    tb = get_time_base(path)
+    packets = read_packets(path)
+
+    assert tb == pytest.approx(0.001)
+    assert len(packets) == pytest.approx(120, abs=2)
+    assert packets['key'][0]
+    assert packets['size'].sum() > 0
+
+
+def test_iter_packets_batches():
+    path = asset_path('video', 'sintel.mkv')
+
+    batches = list(iter_packets(path, stream='a:0', batch_size=16))
+
+    assert len(batches) > 1
+    assert all(len(b) <= 16 for b in batches)
+
+
+def test_iter_frames():
+    path = asset_path('video', 'sintel.mkv')
+
+    frames = np.concatenate(list(iter_frames(path, interval=(0, 1))))
+
+    assert frames['key'][0]
+    assert frames['pict_type'][0] == b'I'
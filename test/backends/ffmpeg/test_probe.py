@@ -83,3 +83,46 @@ def test_mp3_audio():
     assert 'mp3' in mi.format.name
     assert mi.format.duration.total_seconds() == pytest.approx(5.0, abs=0.1)
     assert 127 <= mi.format.bit_rate / 1000 <= 129
+
+
+def test_probe_selected_fields():
+    path = asset_path('video', 'sintel.mkv')
+
+    mi = MediaInfo(path, fields=['format.duration', 'video.width', 'video.height'])
+
+    assert mi.format.duration.total_seconds() == pytest.approx(5.0, abs=0.1)
+    assert mi.format.size is None
+    assert mi.format.name is None
+
+    assert len(mi.streams) == 1
+    assert not mi.has_audio
+    assert not mi.has_subtitles
+
+    v = mi.video_streams[0]
+    assert v.width == 1920
+    assert v.height == 818
+    assert v.pix_fmt is None
+
+
+def test_probe_selected_fields_multiple_stream_types():
+    path = asset_path('video', 'sintel.mkv')
+
+    mi = MediaInfo(path, fields=['audio.sample_rate', 'subtitle.language'], probesize=1000000, analyzeduration=1)
+
+    assert mi.format is None
+    assert len(mi.audio_streams) == 1
+    assert len(mi.subtitle_streams) == 10
+    assert not mi.has_video
+
+    assert mi.audio_streams[0].sample_rate == 48000
+    assert 'eng' in [s.language for s in mi.subtitle_streams]
+
+
+def test_probe_invalid_field():
+    path = asset_path('video', 'sintel.mkv')
+
+    with pytest.raises(ValueError):
+        MediaInfo(path, fields=['duration'])
+
+    with pytest.raises(ValueError):
+        MediaInfo(path, fields=['container.duration'])
@@ -0,0 +1,185 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import os
+import re
+
+import pytest
+
+from avtk.backends.ffmpeg import remote
+from avtk.backends.ffmpeg.convert import Input
+from avtk.backends.ffmpeg.exceptions import NoMediaError
+from avtk.backends.ffmpeg.remote import RemoteCache, enable_cache, disable_cache, get_local_source
+
+FILES = {
+    '/video.mkv': bytes(range(256)) * 40,
+    '/other.mkv': b'y' * 4000,
+    '/playlist.m3u8': b'#EXTM3U\nsegment0.ts\n',
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    support_ranges = True
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('Range')))
+        if self.path == '/live.ts':
+            # Stream of unknown length
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'x' * 1000)
+            return
+
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range') or '')
+        if self.support_ranges and match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))
+            data = data[start:end + 1]
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.support_ranges = True
+    Handler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    yield str(tmpdir.join('cache'))
+    disable_cache()
+
+
+def read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def test_parallel_download(server, cache_dir):
+    cache = RemoteCache(cache_dir, chunk_size=1000, connections=3)
+    path = cache.fetch(server + '/video.mkv')
+
+    assert path.endswith('.mkv')
+    assert read(path) == FILES['/video.mkv']
+    ranges = [r for p, r in Handler.requests]
+    assert ranges[0] == 'bytes=0-0'
+    assert sorted(ranges[1:]) == sorted('bytes=%d-%d' % (s, min(s + 999, 10239)) for s in range(0, 10240, 1000))
+
+    # Cached, so the server isn't contacted again
+    Handler.requests = []
+    assert cache.fetch(server + '/video.mkv') == path
+    assert Handler.requests == []
+    assert [name for name in os.listdir(cache_dir)] == [os.path.basename(path)]
+
+
+def test_download_without_range_support(server, cache_dir):
+    Handler.support_ranges = False
+    cache = RemoteCache(cache_dir, chunk_size=1000)
+    path = cache.fetch(server + '/video.mkv')
+
+    assert read(path) == FILES['/video.mkv']
+    assert len(Handler.requests) == 2
+
+
+def test_missing_file(server, cache_dir):
+    cache = RemoteCache(cache_dir)
+    with pytest.raises(NoMediaError):
+        cache.fetch(server + '/missing.mkv')
+    assert os.listdir(cache_dir) == []
+
+
+def test_streams_are_not_cached(server, cache_dir):
+    cache = RemoteCache(cache_dir)
+
+    assert cache.fetch(server + '/playlist.m3u8') is None
+    assert cache.fetch(server + '/live.ts') is None
+    assert os.listdir(cache_dir) == []
+
+    # Known streams are not requested again
+    Handler.requests = []
+    assert cache.fetch(server + '/live.ts') is None
+    assert Handler.requests == []
+
+    enable_cache(cache_dir)
+    assert Input(server + '/playlist.m3u8').source == server + '/playlist.m3u8'
+
+
+def test_failed_download_is_forgotten(server, cache_dir):
+    cache = RemoteCache(cache_dir)
+    with pytest.raises(NoMediaError):
+        cache.fetch(server + '/missing.mkv')
+    assert cache._downloads == {}
+
+
+def test_download_keeps_newer_lock(server, cache_dir, monkeypatch):
+    cache = RemoteCache(cache_dir)
+    url = server + '/other.mkv'
+    newer = Lock()
+    download = cache._download
+
+    def _download(url, path):
+        # A fetch starting after this download's lock was released adds its own one
+        cache._downloads[url] = newer
+        download(url, path)
+
+    monkeypatch.setattr(cache, '_download', _download)
+    cache.fetch(url)
+    assert cache._downloads == {url: newer}
+
+
+def test_lru_eviction(server, cache_dir, monkeypatch):
+    monkeypatch.setattr(remote, 'EVICTION_GRACE_PERIOD', 0)
+    cache = RemoteCache(cache_dir, max_size=15000)
+
+    video = cache.fetch(server + '/video.mkv')
+    os.utime(video, (1, 1))
+    other = cache.fetch(server + '/other.mkv')
+    assert os.path.exists(video) and os.path.exists(other)
+
+    # Using the video makes the other file the least recently used one
+    os.utime(other, (1, 1))
+    cache.fetch(server + '/video.mkv')
+    os.utime(video, (2, 2))
+    cache.max_size = 12000
+    cache.evict()
+    assert os.path.exists(video) and not os.path.exists(other)
+
+
+def test_recently_used_files_are_kept(server, cache_dir):
+    cache = RemoteCache(cache_dir, max_size=100)
+    video = cache.fetch(server + '/video.mkv')
+    other = cache.fetch(server + '/other.mkv')
+    assert os.path.exists(video) and os.path.exists(other)
+
+
+def test_input_uses_local_copy(server, cache_dir):
+    url = server + '/video.mkv'
+    assert Input(url).source == url
+    assert get_local_source('/tmp/video.mkv') == '/tmp/video.mkv'
+
+    cache = enable_cache(cache_dir)
+    assert Input(url).source == cache.get_path(url)
+    assert read(cache.get_path(url)) == FILES['/video.mkv']
+    assert get_local_source('/tmp/video.mkv') == '/tmp/video.mkv'
+
+    disable_cache()
+    assert Input(url).source == url
@@ -0,0 +1,87 @@
+import json
+import os
+import os.path
+
+import pytest
+
+from avtk.backends.ffmpeg.convert import H264
+from avtk.backends.ffmpeg.probe import MediaInfo
+from avtk.backends.ffmpeg.resumable import (
+    transcode_resumable, _plan_segments, _load_manifest, _write_manifest, _get_source_id, _commit_segment,
+    _is_segment_done, MANIFEST_VERSION
+)
+
+from .utils import asset_path
+
+video_path = asset_path('video', 'sintel.mkv')
+
+
+def test_plan_segments():
+    keyframes = [0, 2, 4, 6, 8, 9.5]
+    assert _plan_segments(keyframes, 10, 3) == [(0, 4), (4, 8), (8, 10)]
+    assert _plan_segments(keyframes, 10, 20) == [(0, 10)]
+
+
+def test_manifest_must_match_transcode(tmpdir):
+    path = str(tmpdir.join('manifest.json'))
+    manifest = dict(version=MANIFEST_VERSION, source=['a.mkv', 1, 2], video=['-c:v', 'libx264'], segments=[])
+    _write_manifest(path, manifest)
+
+    assert _load_manifest(path, ['a.mkv', 1, 2], ['-c:v', 'libx264']) == manifest
+    assert _load_manifest(path, ['a.mkv', 1, 3], ['-c:v', 'libx264']) is None
+    assert _load_manifest(path, ['a.mkv', 1, 2], ['-c:v', 'libx265']) is None
+    assert _load_manifest(str(tmpdir.join('missing.json')), ['a.mkv', 1, 2], ['-c:v', 'libx264']) is None
+
+
+@pytest.mark.parametrize('source', [video_path, 'http://example.com/video.mkv'])
+def test_source_id_survives_manifest(tmpdir, source):
+    path = str(tmpdir.join('manifest.json'))
+    source_id = _get_source_id(source)
+    manifest = dict(version=MANIFEST_VERSION, source=source_id, video=['-c:v', 'libx264'], segments=[])
+    _write_manifest(path, manifest)
+
+    assert source_id[0] == ('file' if source == video_path else 'url')
+    assert _load_manifest(path, _get_source_id(source), ['-c:v', 'libx264']) == manifest
+
+
+def test_segment_must_be_complete(tmpdir):
+    path = str(tmpdir.join('segment00000'))
+    tmpdir.join('segment00000.tmp').write_binary(b'x' * 100)
+    segment = dict(start=0, end=2, file='segment00000', done=False)
+
+    assert not _is_segment_done(segment, path)
+    segment['size'] = _commit_segment(path + '.tmp', path)
+    segment['done'] = True
+    assert segment['size'] == 100
+    assert _is_segment_done(segment, path)
+
+    # Truncated or missing segments are encoded again
+    tmpdir.join('segment00000').write_binary(b'x' * 50)
+    assert not _is_segment_done(segment, path)
+    os.remove(path)
+    assert not _is_segment_done(segment, path)
+
+
+@pytest.mark.slow
+def test_resume_skips_completed_segments(tmpdir):
+    work_dir = str(tmpdir.join('parts'))
+    output = str(tmpdir.join('output.mkv'))
+    video = H264(preset='ultrafast')
+
+    # First run completes the transcode and keeps the segments
+    transcode_resumable(video_path, output, video, segment_duration=2, work_dir=work_dir, keep_work_dir=True)
+    with open(os.path.join(work_dir, 'manifest.json')) as fp:
+        manifest = json.load(fp)
+
+    assert manifest['source'] == _get_source_id(video_path)
+    assert all(s['done'] for s in manifest['segments'])
+    assert all(s['size'] == os.path.getsize(os.path.join(work_dir, s['file'])) for s in manifest['segments'])
+    first = os.path.join(work_dir, manifest['segments'][0]['file'])
+    mtime = os.path.getmtime(first)
+
+    # Second run only assembles the output again
+    transcode_resumable(video_path, output, video, segment_duration=2, work_dir=work_dir, keep_work_dir=True)
+    assert os.path.getmtime(first) == mtime
+
+    src = MediaInfo(video_path).format.duration.total_seconds()
+    assert abs(MediaInfo(output).format.duration.total_seconds() - src) < 0.1
@@ -3,8 +3,10 @@ from os.path import dirname, join, abspath
 
 import pytest
 
-from avtk.backends.ffmpeg.exceptions import NoMediaError
-from avtk.backends.ffmpeg.run import ffmpeg, ffprobe
+from avtk.backends.ffmpeg.exceptions import NoMediaError, FFmpegError
+from avtk.backends.ffmpeg.run import (
+    ffmpeg, ffmpeg_log, ffmpeg_pipe, ffprobe, parse_log_line, LogEvent, ResourceUsage, MAX_LOG_EVENTS
+)
 
 
 @pytest.fixture
@@ -21,6 +23,20 @@ def fake_ffmpeg():
     del os.environ['FFMPEG_PATH']
 
 
+@pytest.fixture
+def chatty_ffmpeg():
+    os.environ['FFMPEG_PATH'] = abspath(join(dirname(__file__), 'chatty_ffmpeg.sh'))
+    yield
+    del os.environ['FFMPEG_PATH']
+
+
+@pytest.fixture
+def limits_ffmpeg():
+    os.environ['FFMPEG_PATH'] = abspath(join(dirname(__file__), 'limits_ffmpeg.sh'))
+    yield
+    del os.environ['FFMPEG_PATH']
+
+
 @pytest.fixture
 def nonexistent_ffprobe():
     os.environ['FFPROBE_PATH'] = abspath(join(dirname(__file__), 'nonexistent_ffprobe.sh'))
@@ -51,9 +67,14 @@ def test_run_custom_ffprobe_json(fake_ffprobe):
 
 
 def test_run_custom_ffprobe_error(fake_ffprobe):
-    with pytest.raises(NoMediaError):
+    with pytest.raises(NoMediaError) as exc_info:
         ffprobe(['error'])
 
+    cause = exc_info.value.__cause__
+    assert isinstance(cause, FFmpegError)
+    assert exc_info.value.returncode == cause.returncode == 255
+    assert exc_info.value.events == cause.events
+
 
 def test_run_nonexistent_ffprobe(nonexistent_ffprobe):
     with pytest.raises(ValueError):
@@ -73,3 +94,123 @@ def test_run_system_ffmpeg():
 def test_run_custom_ffmpeg(fake_ffmpeg):
     result = ffmpeg([])
     assert result == 'FFMPEG\n'
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason="requires Linux /proc")
+def test_run_ffmpeg_cpus_and_nice(limits_ffmpeg):
+    cpus = os.sched_getaffinity(0)
+    cpu = sorted(cpus)[0]
+    niceness = os.getpriority(os.PRIO_PROCESS, 0)
+
+    assert ffmpeg([], cpus={cpu}, nice=3).split() == [str(cpu), str(niceness + 3)]
+
+    # The calling thread keeps its settings
+    assert os.getpriority(os.PRIO_PROCESS, 0) == niceness
+    assert os.sched_getaffinity(0) == cpus
+
+
+def test_parse_log_line():
+    assert parse_log_line('[in#0 @ 0x1310dac0] [error] Error opening input\n') == LogEvent(
+        'error', 'in#0', 'Error opening input')
+    assert parse_log_line('[fatal] Error opening input files') == LogEvent('fatal', None, 'Error opening input files')
+    assert parse_log_line('no level here') == LogEvent(None, None, 'no level here')
+
+
+def test_run_ffmpeg_error():
+    with pytest.raises(FFmpegError) as exc_info:
+        ffmpeg(['-i', '/nonexistent.mkv'])
+
+    assert isinstance(exc_info.value, RuntimeError)
+    assert exc_info.value.returncode != 0
+    assert exc_info.value.errors
+    assert 'No such file or directory' in str(exc_info.value)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/io'), reason="requires Linux /proc")
+def test_run_ffmpeg_usage(tmpdir):
+    output = str(tmpdir.join('out.nut'))
+    # Read the input in real time, so the process runs long enough for its memory use to be sampled
+    args = ['-re', '-f', 'lavfi', '-i', 'testsrc=d=0.5:s=320x240', '-c:v', 'rawvideo', output]
+
+    # Memory used by the parent process must not be counted
+    ballast = b'x' * (512 * 1024 * 1024)
+    result, usage = ffmpeg(args, with_usage=True)
+    del ballast
+
+    assert result == ''
+    assert isinstance(usage, ResourceUsage)
+    assert usage.wall_time > 0
+    assert usage.cpu_time == usage.user_time + usage.system_time > 0
+    assert 1024 * 1024 < usage.max_rss < 256 * 1024 * 1024
+    assert usage.voluntary_switches >= 0 and usage.involuntary_switches >= 0
+    assert usage.write_bytes >= os.path.getsize(output) > 12 * 320 * 240
+    assert usage.as_dict()['max_rss'] == usage.max_rss
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/io'), reason="requires Linux /proc")
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason="requires os.wait4")
+def test_wait_for_reaped_process(monkeypatch):
+    def wait4(pid, options):
+        raise ChildProcessError()
+
+    monkeypatch.setattr(os, 'wait4', wait4)
+    with pytest.raises(ChildProcessError):
+        ffmpeg(['-version'])
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/io'), reason="requires Linux /proc")
+def test_run_ffmpeg_error_usage():
+    with pytest.raises(FFmpegError) as exc_info:
+        ffmpeg(['-i', '/nonexistent.mkv'])
+
+    assert exc_info.value.usage.cpu_time >= 0
+
+
+def test_run_ffmpeg_listener():
+    events = []
+    ffmpeg(['-f', 'lavfi', '-i', 'testsrc=d=0.1', '-f', 'null', '-'], listener=events.append, loglevel='info')
+
+    assert events
+    assert all(e.level == 'info' for e in events)
+
+
+def test_run_ffmpeg_log_is_bounded(chatty_ffmpeg):
+    events = []
+    with pytest.raises(FFmpegError) as exc_info:
+        ffmpeg([], listener=events.append)
+
+    assert len(events) == 5001
+    assert len(exc_info.value.events) == MAX_LOG_EVENTS
+    assert exc_info.value.events[-2] == LogEvent('warning', 'libx264', 'line 5000')
+    assert exc_info.value.errors == [LogEvent('fatal', None, 'giving up')]
+
+
+def test_ffmpeg_log_strips_levels():
+    log = ffmpeg_log(['-f', 'lavfi', '-i', 'testsrc=d=0.1', '-f', 'null', '-'])
+
+    assert 'Stream mapping' in log
+    assert '[info]' not in log
+
+
+def test_ffmpeg_log_error_has_levels():
+    with pytest.raises(FFmpegError) as exc_info:
+        ffmpeg_log(['-i', '/nonexistent.mkv', '-f', 'null', '-'])
+
+    assert exc_info.value.errors
+    assert all(event.level is not None for event in exc_info.value.events)
+
+
+def test_ffmpeg_pipe():
+    args = ['-f', 'lavfi', '-i', 'testsrc=d=1:s=16x16', '-pix_fmt', 'gray', '-f', 'rawvideo', '-']
+
+    with ffmpeg_pipe(args) as stdout:
+        assert len(stdout.read()) == 25 * 16 * 16
+
+    # Stopping early doesn't raise an error
+    with ffmpeg_pipe(args) as stdout:
+        buffer = bytearray(256)
+        assert stdout.readinto(buffer) == 256
+
+    with pytest.raises(FFmpegError):
+        with ffmpeg_pipe(['-i', '/nonexistent.mkv', '-f', 'rawvideo', '-']) as stdout:
+            stdout.read()
@@ -3,8 +3,11 @@ from os import unlink, fdopen
 
 import pytest
 
-from avtk.backends.ffmpeg.shortcuts import get_thumbnail, extract_audio, remove_audio
-from avtk.backends.ffmpeg.probe import MediaInfo
+from avtk.backends.ffmpeg.shortcuts import (
+    get_thumbnail, extract_audio, remove_audio, convert_to_h264,
+    _can_copy_video, _can_copy_audio
+)
+from avtk.backends.ffmpeg.probe import MediaInfo, Format, Stream
 
 from .utils import asset_path, compare_images
 
@@ -116,3 +119,72 @@ def test_remove_audio(tmpfile):
 
     diff = abs(mi.format.duration.total_seconds() - original.format.duration.total_seconds())
     assert diff == pytest.approx(0, abs=0.1)
+
+
+def make_info(streams, bit_rate=None):
+    info = MediaInfo.__new__(MediaInfo)
+    info.raw = dict(streams=streams)
+    info.format = Format(dict(bit_rate=bit_rate) if bit_rate else {})
+    info.streams = [Stream._parse(s) for s in streams]
+    return info
+
+
+def test_can_copy_video():
+    info = make_info([
+        dict(index=0, codec_type='video', codec_name='h264', profile='High', pix_fmt='yuv420p',
+             width=1920, height=1080),
+    ], bit_rate=3000000)
+
+    assert _can_copy_video(info, 'h264')
+    assert _can_copy_video(info, 'h264', scale=(-1, 1080))
+    assert _can_copy_video(info, 'h264', bit_rate='4m')
+
+    assert not _can_copy_video(info, 'hevc')
+    assert not _can_copy_video(info, 'h264', scale=(1280, 720))
+    assert not _can_copy_video(info, 'h264', bit_rate='2m')
+    assert not _can_copy_video(info, 'h264', extra=['-vf', 'hflip'])
+
+
+@pytest.mark.parametrize('profile, pix_fmt', [
+    ('High 10', 'yuv420p10le'),
+    ('High 4:4:4 Predictive', 'yuv444p'),
+    ('High', 'yuv422p'),
+    (None, 'yuv420p'),
+])
+def test_can_copy_video_requires_compatible_profile(profile, pix_fmt):
+    info = make_info([
+        dict(index=0, codec_type='video', codec_name='h264', profile=profile, pix_fmt=pix_fmt),
+    ])
+
+    assert not _can_copy_video(info, 'h264')
+
+
+def test_can_copy_audio():
+    info = make_info([
+        dict(index=0, codec_type='video', codec_name='h264'),
+        dict(index=1, codec_type='audio', codec_name='aac', channels=2, bit_rate='128000'),
+    ])
+
+    assert _can_copy_audio(info, 'aac', channels=2)
+    assert _can_copy_audio(info, 'aac', bit_rate='192k')
+
+    assert not _can_copy_audio(info, 'opus')
+    assert not _can_copy_audio(info, 'aac', channels=1)
+    assert not _can_copy_audio(info, 'aac', bit_rate='96k')
+    assert not _can_copy_audio(info, 'aac', normalize=True)
+
+
+@pytest.mark.slow
+def test_convert_to_h264_allow_copy(tmpfile):
+    fp, path = tmpfile
+    convert_to_h264(video_path, path, allow_copy=True)
+
+    original = MediaInfo(video_path)
+    mi = MediaInfo(path)
+
+    assert 'mp4' in mi.format.name
+    assert mi.video_streams[0].codec.name == 'h264'
+    assert mi.audio_streams[0].codec.name == 'aac'
+    # Matroska doesn't store the number of frames, so compare the durations
+    diff = abs(mi.format.duration.total_seconds() - original.format.duration.total_seconds())
+    assert diff == pytest.approx(0, abs=0.1)
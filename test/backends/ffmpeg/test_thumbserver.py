@@ -0,0 +1,170 @@
+from threading import Lock, Thread
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+import os
+
+import pytest
+
+from avtk.backends.ffmpeg import thumbserver
+from avtk.backends.ffmpeg.thumbserver import ThumbnailCache, make_server
+
+from .utils import asset_path
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+
+    def get_thumbnail(source, seek, fmt='png', width=None):
+        calls.append((source, seek, fmt, width))
+        return b'x' * (width or 10)
+
+    monkeypatch.setattr(thumbserver, 'get_thumbnail', get_thumbnail)
+    return calls
+
+
+@pytest.fixture
+def server(tmpdir):
+    tmpdir.join('video.mkv').write('data')
+    server = make_server(str(tmpdir), port=0, quiet=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, **headers):
+    try:
+        with urlopen(Request(url, headers=headers)) as resp:
+            return resp.status, resp.headers, resp.read()
+    except HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_memory_cache_lru(tmpdir, renders):
+    path = str(tmpdir.join('video.mkv'))
+    tmpdir.join('video.mkv').write('data')
+    cache = ThumbnailCache(memory_size=25)
+
+    cache.get(path, 1, width=10)
+    cache.get(path, 2, width=10)
+    cache.get(path, 1, width=10)
+    assert len(renders) == 2
+
+    # Evicts the least recently used thumbnail (at 2s)
+    cache.get(path, 3, width=10)
+    cache.get(path, 1, width=10)
+    assert len(renders) == 3
+    cache.get(path, 2, width=10)
+    assert len(renders) == 4
+
+
+def test_disk_cache(tmpdir, renders):
+    path = str(tmpdir.join('video.mkv'))
+    tmpdir.join('video.mkv').write('data')
+    cache_dir = str(tmpdir.join('cache'))
+
+    key, data = ThumbnailCache(cache_dir=cache_dir).get(path, 1)
+    assert tmpdir.join('cache', key).read_binary() == data
+
+    assert ThumbnailCache(cache_dir=cache_dir).get(path, 1) == (key, data)
+    assert len(renders) == 1
+
+
+def test_source_change_invalidates_cache(tmpdir, renders):
+    path = str(tmpdir.join('video.mkv'))
+    tmpdir.join('video.mkv').write('data')
+    cache = ThumbnailCache()
+
+    key, _ = cache.get(path, 1)
+    tmpdir.join('video.mkv').write('changed')
+    assert cache.get(path, 1)[0] != key
+    assert len(renders) == 2
+
+
+def test_render_keeps_newer_render_lock(tmpdir, monkeypatch):
+    path = str(tmpdir.join('video.mkv'))
+    tmpdir.join('video.mkv').write('data')
+    cache = ThumbnailCache()
+    key = cache.get_key(path, 1, None, 'jpg')
+    newer = Lock()
+
+    def get_thumbnail(source, seek, fmt='png', width=None):
+        # A request arriving after this rendering's lock was released adds its own one
+        cache._rendering[key] = newer
+        return b'x'
+
+    monkeypatch.setattr(thumbserver, 'get_thumbnail', get_thumbnail)
+    cache.get(path, 1)
+    assert cache._rendering == {key: newer}
+
+
+def test_serves_thumbnail(server, renders):
+    status, headers, body = get(server + '/thumb?src=video.mkv&t=1.5&w=20&fmt=png')
+
+    assert status == 200
+    assert headers['Content-Type'] == 'image/png'
+    assert headers['Cache-Control'].startswith('public, max-age=')
+    assert body == b'x' * 20
+    assert renders[0][1:] == (1.5, 'png', 20)
+
+    status, _, body = get(server + '/thumb?src=video.mkv&t=1.5&w=20&fmt=png', **{'If-None-Match': headers['ETag']})
+    assert status == 304
+    assert body == b''
+    assert len(renders) == 1
+
+
+def test_revalidates_without_rendering(tmpdir, server, renders):
+    path = os.path.realpath(str(tmpdir.join('video.mkv')))
+    etag = '"%s"' % ThumbnailCache.get_key(path, 2, None, 'jpg')
+
+    status, headers, _ = get(server + '/thumb?src=video.mkv&t=2', **{'If-None-Match': 'W/"other", ' + etag})
+    assert status == 304
+    assert headers['ETag'] == etag
+    assert renders == []
+
+
+@pytest.mark.parametrize('query, code', [
+    ('t=1', 400),
+    ('src=video.mkv&t=abc', 400),
+    ('src=video.mkv&t=nan', 400),
+    ('src=video.mkv&t=inf', 400),
+    ('src=video.mkv&w=0', 400),
+    ('src=video.mkv&fmt=svg', 400),
+    ('src=missing.mkv', 404),
+    ('src=../video.mkv', 404),
+    ('src=/etc/passwd', 404),
+])
+def test_rejects_invalid_requests(server, renders, query, code):
+    assert get(server + '/thumb?' + query)[0] == code
+    assert renders == []
+
+
+@pytest.mark.slow
+def test_renders_real_thumbnail():
+    source = asset_path('video', 'sintel.mkv')
+    key, data = ThumbnailCache().get(source, 1, width=160, fmt='jpg')
+
+    assert data[:2] == b'\xff\xd8'
+    assert len(key) == 40
+
+
+@pytest.mark.slow
+def test_past_the_end_is_not_found(tmpdir):
+    source = asset_path('video', 'sintel.mkv')
+    cache_dir = str(tmpdir.join('cache'))
+    cache = ThumbnailCache(cache_dir=cache_dir)
+
+    with pytest.raises(ValueError):
+        cache.get(source, 1000)
+    assert cache._entries == {}
+    assert os.listdir(cache_dir) == []
+
+    server = make_server(os.path.dirname(source), port=0, cache=cache, quiet=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = 'http://127.0.0.1:%d/thumb?src=sintel.mkv&t=1000' % server.server_address[1]
+        assert get(url)[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
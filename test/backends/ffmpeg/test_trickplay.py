@@ -0,0 +1,52 @@
+import pytest
+
+from avtk.backends.ffmpeg.probe import VideoStream
+from avtk.backends.ffmpeg.trickplay import generate_trickplay, _get_tile_height, _vtt_time, _write_vtt
+
+from .utils import asset_path
+
+
+def make_stream(width, height, dar=None):
+    raw = dict(index=0, codec_type='video', codec_name='h264', width=width, height=height)
+    if dar:
+        raw['display_aspect_ratio'] = dar
+    return VideoStream(raw)
+
+
+def test_tile_height():
+    assert _get_tile_height(make_stream(1920, 1080), 160) == 90
+    assert _get_tile_height(make_stream(720, 576, '16:9'), 160) == 90
+    assert _get_tile_height(make_stream(720, 576, '0:1'), 160) == 128
+    assert _get_tile_height(make_stream(1000, 1000), 171) == 172
+
+    with pytest.raises(ValueError):
+        _get_tile_height(make_stream(None, None), 160)
+
+
+def test_vtt_time():
+    assert _vtt_time(0) == '00:00:00.000'
+    assert _vtt_time(61.5) == '00:01:01.500'
+    assert _vtt_time(3725.0004) == '01:02:05.000'
+
+
+def test_write_vtt(tmpdir):
+    path = str(tmpdir.join('index.vtt'))
+    _write_vtt(path, ['/out/v-001.jpg', '/out/v-002.jpg'], 5, 2, 9, (2, 2), (160, 90), 'https://cdn/')
+
+    cues = tmpdir.join('index.vtt').read().split('\n\n')
+    assert cues[0] == 'WEBVTT'
+    assert cues[1] == '00:00:00.000 --> 00:00:02.000\nhttps://cdn/v-001.jpg#xywh=0,0,160,90'
+    assert cues[4] == '00:00:06.000 --> 00:00:08.000\nhttps://cdn/v-001.jpg#xywh=160,90,160,90'
+    assert cues[5] == '00:00:08.000 --> 00:00:09.000\nhttps://cdn/v-002.jpg#xywh=0,0,160,90\n'
+
+
+@pytest.mark.slow
+def test_generate_trickplay(tmpdir):
+    vtt, sheets = generate_trickplay(
+        asset_path('video', 'sintel.mkv'), 0.5, tile=(4, 4), width=120, output_dir=str(tmpdir)
+    )
+
+    assert vtt == str(tmpdir.join('sintel.vtt'))
+    assert sheets and all(path.endswith('.jpg') for path in sheets)
+    assert open(sheets[0], 'rb').read(2) == b'\xff\xd8'
+    assert '#xywh=0,0,120,' in open(vtt).read()
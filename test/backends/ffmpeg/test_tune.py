@@ -0,0 +1,67 @@
+from tempfile import TemporaryDirectory
+import os.path
+
+import pytest
+
+from avtk.backends.ffmpeg.convert import FFmpeg, Input, Output, H264, NoAudio, NoSubtitles
+from avtk.backends.ffmpeg.tune import (
+    autotune, TuneResult, _get_sample_positions, _fastest_match, _measure_ssim, X264_PRESETS
+)
+
+from .utils import asset_path
+
+video_path = asset_path('video', 'sintel.mkv')
+
+
+def make_result(setting, meets_target):
+    return TuneResult(setting, None, 100, 1000000, None, meets_target)
+
+
+def test_sample_positions():
+    assert _get_sample_positions(10, 3, 2) == [(0, 2), (4, 2), (8, 2)]
+    assert _get_sample_positions(10, 1, 2) == [(4, 2)]
+    assert _get_sample_positions(1.5, 3, 2) == [(0, 1.5)]
+
+
+def test_fastest_match_waits_for_faster_candidates():
+    candidates = ['fast', 'medium', 'slow']
+
+    results = {'medium': make_result('medium', True)}
+    assert _fastest_match(candidates, results) is None
+
+    results['fast'] = make_result('fast', False)
+    assert _fastest_match(candidates, results).setting == 'medium'
+
+    results['fast'] = make_result('fast', True)
+    assert _fastest_match(candidates, results).setting == 'fast'
+
+
+def test_autotune_requires_target():
+    with pytest.raises(ValueError):
+        autotune(video_path, 'h264')
+
+
+def test_autotune_unsupported_codec():
+    with pytest.raises(ValueError):
+        autotune(video_path, 'mpeg2video', target_bitrate='2m')
+
+
+@pytest.mark.slow
+def test_autotune_bitrate_target():
+    res = autotune(video_path, 'h264', target_bitrate='20m', candidates=X264_PRESETS[:3], samples=2)
+    assert res.meets_target
+    assert res.setting == 'ultrafast'
+    assert res.stream.get_args()[:4] == ['-c:v', 'libx264', '-preset', 'ultrafast']
+
+
+@pytest.mark.slow
+def test_measure_ssim_of_scaled_sample():
+    stream = H264(scale=(320, -2), preset='ultrafast')
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'sample.mkv')
+        FFmpeg(
+            Input(video_path, seek=1, duration=1),
+            Output(path, streams=[stream, NoAudio, NoSubtitles], extra=['-map', '0:v:0'])
+        ).run()
+
+        assert 0.9 < _measure_ssim(path, video_path, 1, 1, stream.get_filter()) <= 1
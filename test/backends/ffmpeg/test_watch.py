@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+
+import pytest
+
+from avtk.backends.ffmpeg.jobs import JobPool
+from avtk.backends.ffmpeg.watch import (
+    WatchFolder, make_pipeline, _InotifyWatcher, INOTIFY_EVENT, IN_CREATE, IN_Q_OVERFLOW
+)
+
+
+def wait_for(watch, pool, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        watch.process_pending(pool)
+        time.sleep(0.05)
+
+
+def test_processes_settled_files(tmpdir):
+    processed = []
+    tmpdir.join('a.mkv').write('data')
+    tmpdir.join('.uploading.mkv').write('data')
+
+    watch = WatchFolder(str(tmpdir), processed.append, settle_time=0.2)
+    with JobPool(max_workers=1) as pool:
+        watch.process_pending(pool)
+        assert processed == []
+
+        wait_for(watch, pool, lambda: tmpdir.join('done', 'a.mkv').exists())
+
+    assert processed == [str(tmpdir.join('a.mkv'))]
+    assert tmpdir.join('.uploading.mkv').exists()
+
+
+def test_waits_for_file_to_stop_changing(tmpdir):
+    path = tmpdir.join('a.mkv')
+    path.write('x')
+
+    watch = WatchFolder(str(tmpdir), lambda p: None, settle_time=0.3)
+    with JobPool(max_workers=1) as pool:
+        for i in range(5):
+            path.write('x' * (i + 2))
+            watch.process_pending(pool)
+            time.sleep(0.1)
+            assert path.exists()
+
+        wait_for(watch, pool, lambda: not path.exists())
+
+    assert tmpdir.join('done', 'a.mkv').exists()
+
+
+def test_failed_files_are_moved_with_error(tmpdir):
+    def pipeline(path):
+        raise RuntimeError("conversion failed")
+
+    tmpdir.join('bad.mkv').write('data')
+    watch = WatchFolder(str(tmpdir), pipeline, settle_time=0)
+    with JobPool(max_workers=1) as pool:
+        wait_for(watch, pool, lambda: tmpdir.join('failed', 'bad.mkv').exists())
+
+    assert 'conversion failed' in tmpdir.join('failed', 'bad.mkv.error.txt').read()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_reports_new_files(tmpdir):
+    watcher = _InotifyWatcher(str(tmpdir))
+    try:
+        tmpdir.join('new.mkv').write('data')
+        assert 'new.mkv' in watcher.wait(1)
+        assert watcher.wait(0) == set()
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_overflow_requires_rescan(tmpdir):
+    watcher = _InotifyWatcher(str(tmpdir))
+    os.close(watcher.fd)
+
+    # Replace the inotify descriptor with a pipe delivering a file event followed by an overflow
+    watcher.fd, write_fd = os.pipe()
+    try:
+        name = b'new.mkv\0'
+        os.write(write_fd, INOTIFY_EVENT.pack(1, IN_CREATE, 0, len(name)) + name)
+        os.write(write_fd, INOTIFY_EVENT.pack(-1, IN_Q_OVERFLOW, 0, 0))
+        assert watcher.wait(1) is None
+    finally:
+        os.close(write_fd)
+        watcher.close()
+
+
+def test_make_pipeline(tmpdir):
+    source = str(tmpdir.join('in.mkv'))
+    open(source, 'w').close()
+
+    jobs = make_pipeline(str(tmpdir.join('out')), convert=['h264'], thumbnail=2)(source)
+    assert [job.outputs[0].target for job in jobs] == [
+        str(tmpdir.join('out', 'in.mp4')),
+        str(tmpdir.join('out', 'in.jpg')),
+    ]
+
+    with pytest.raises(ValueError):
+        make_pipeline(str(tmpdir), convert=['unknown'])
+
+
+def test_missing_folder():
+    with pytest.raises(ValueError):
+        WatchFolder('/nonexistent/folder', lambda p: None)
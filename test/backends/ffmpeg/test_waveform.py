@@ -0,0 +1,93 @@
+import pytest
+
+from .utils import asset_path
+
+np = pytest.importorskip('numpy')
+
+from avtk.backends.ffmpeg.waveform import (  # noqa: E402
+    waveform, load_waveform, Waveform, _PyramidBuilder, DEFAULT_LEVELS
+)
+
+
+def build(samples, levels, chunk=7):
+    builder = _PyramidBuilder(levels, samples.shape[1])
+    for i in range(0, len(samples), chunk):
+        builder.add(samples[i:i + chunk])
+    return builder.finish()
+
+
+def test_pyramid_levels():
+    samples = np.array([[0.5], [-0.5], [1.0], [0.0], [-1.0], [0.25], [0.5], [0.5]], dtype=np.float32)
+    peaks = build(samples, [2, 4], chunk=3)
+
+    assert list(peaks[2]['min'][:, 0]) == [-16384, 0, -32767, 16384]
+    assert list(peaks[2]['max'][:, 0]) == [16384, 32767, 8192, 16384]
+    assert list(peaks[4]['min'][:, 0]) == [-16384, -32767]
+    assert list(peaks[4]['max'][:, 0]) == [32767, 16384]
+    assert peaks[4]['rms'][0, 0] == round(np.sqrt(1.5 / 4) * 32767)
+
+
+def test_pyramid_matches_direct_computation():
+    rng = np.random.RandomState(42)
+    samples = rng.uniform(-1, 1, size=(10000, 2)).astype(np.float32)
+    peaks = build(samples, [64, 256, 1024], chunk=999)
+
+    blocks = samples[:9984].reshape(-1, 256, 2)
+    assert (peaks[256]['max'][:39] == np.rint(blocks.max(axis=1) * 32767)).all()
+    assert (peaks[256]['min'][:39] == np.rint(blocks.min(axis=1) * 32767)).all()
+    assert np.allclose(peaks[256]['rms'][:39], np.sqrt((blocks.astype(np.float64) ** 2).mean(axis=1)) * 32767, atol=1)
+
+    # The last, partial block covers the remaining 16 samples
+    assert len(peaks[256]) == 40
+    assert peaks[256]['max'][-1, 0] == np.rint(samples[9984:, 0].max() * 32767)
+
+
+def test_pyramid_invalid_levels():
+    with pytest.raises(ValueError):
+        _PyramidBuilder([256, 1000], 1)
+
+
+def test_save_and_load(tmpdir):
+    samples = np.sin(np.linspace(0, 100, 5000, dtype=np.float32))[:, np.newaxis]
+    wf = Waveform(8000, 1, len(samples), build(samples, [16, 64, 256]))
+    path = str(tmpdir.join('test.peaks'))
+    wf.save(path)
+
+    loaded = load_waveform(path)
+    assert (loaded.sample_rate, loaded.channels, loaded.samples) == (8000, 1, 5000)
+    assert loaded.levels == [16, 64, 256]
+    for level in wf.levels:
+        assert isinstance(loaded.peaks[level], np.memmap)
+        assert (loaded.peaks[level] == wf.peaks[level]).all()
+
+
+def test_load_invalid_file(tmpdir):
+    path = tmpdir.join('bad.peaks')
+    path.write('not a waveform')
+
+    with pytest.raises(ValueError):
+        load_waveform(str(path))
+
+
+def test_get_peaks_range():
+    samples = np.zeros((8000, 1), dtype=np.float32)
+    wf = Waveform(8000, 1, 8000, build(samples, [80, 800], chunk=1000))
+
+    assert len(wf.get_peaks(80)) == 100
+    assert len(wf.get_peaks(80, start=0.25, end=0.5)) == 25
+    assert len(wf.get_peaks(800, start=0.5)) == 5
+
+    with pytest.raises(ValueError):
+        wf.get_peaks(100)
+
+
+@pytest.mark.slow
+def test_waveform(tmpdir):
+    path = str(tmpdir.join('stereo.peaks'))
+    wf = waveform(asset_path('audio', 'stereo.mp3'), output=path, sample_rate=44100, channels=2)
+
+    assert wf.levels == DEFAULT_LEVELS
+    assert wf.channels == 2
+    assert len(wf.peaks[256]) == -(-wf.samples // 256)
+    assert (wf.peaks[256]['max'] >= wf.peaks[256]['rms']).all()
+    assert load_waveform(path).samples == wf.samples
@@ -0,0 +1,33 @@
+from benchmarks.runner import compare
+
+
+def make_result(name, value, concurrency=1, higher_is_better=False):
+    return dict(name=name, value=value, concurrency=concurrency, higher_is_better=higher_is_better)
+
+
+def test_compare_reports_regressions():
+    baseline = [
+        make_result('latency', 1.0),
+        make_result('latency', 2.0, concurrency=4),
+        make_result('throughput', 100, higher_is_better=True),
+        make_result('zero', 0),
+    ]
+    results = [
+        make_result('latency', 1.1),
+        make_result('latency', 2.5, concurrency=4),
+        make_result('throughput', 80, higher_is_better=True),
+        make_result('zero', 5),
+        make_result('new', 10),
+    ]
+
+    regressions = compare(results, baseline, threshold=0.15)
+    assert [(res['name'], res['concurrency']) for res, base, change in regressions] == [
+        ('latency', 4), ('throughput', 1)
+    ]
+    assert [round(change, 2) for res, base, change in regressions] == [0.25, 0.2]
+
+
+def test_compare_ignores_improvements():
+    baseline = [make_result('latency', 1.0), make_result('throughput', 100, higher_is_better=True)]
+    results = [make_result('latency', 0.5), make_result('throughput', 150, higher_is_better=True)]
+    assert compare(results, baseline) == []
@@ -0,0 +1,80 @@
+import io
+import json
+import shutil
+
+import pytest
+
+from avtk.cli import get_parser, run_batch, main, _get_output_path
+
+from .backends.ffmpeg.utils import asset_path
+
+video_path = asset_path('video', 'sintel.mkv')
+
+
+def fake_command(source, args):
+    if 'bad' in source:
+        raise ValueError("bad input")
+    return dict(output=source + '.out')
+
+
+def test_output_path(tmpdir):
+    args = get_parser().parse_args(['remove-audio', '-o', str(tmpdir), 'in.mkv'])
+    assert _get_output_path('/media/in.mkv', args, '.mkv') == str(tmpdir.join('in.mkv'))
+
+    args = get_parser().parse_args(['remove-audio', 'in.mkv'])
+    assert _get_output_path('/media/in.mkv', args, '.mp4') == '/media/in.mp4'
+    with pytest.raises(ValueError):
+        _get_output_path('/media/in.mkv', args, '.mkv')
+    assert _get_output_path('/media/in.mkv', args, '.mkv', suffix='-noaudio') == '/media/in-noaudio.mkv'
+
+
+def test_batch_json_output_and_summary(tmpdir):
+    file_list = tmpdir.join('files.txt')
+    file_list.write('b.mkv\n\nbad.mkv\n')
+
+    args = get_parser().parse_args(['inspect', '--json', '-j', '2', '--from-file', str(file_list), 'a.mkv'])
+    out, err = io.StringIO(), io.StringIO()
+    failed = run_batch(fake_command, args, out=out, err=err)
+
+    results = {r['source']: r for r in map(json.loads, out.getvalue().splitlines())}
+    assert failed == 1
+    assert sorted(results) == ['a.mkv', 'b.mkv', 'bad.mkv']
+    assert results['a.mkv']['output'] == 'a.mkv.out'
+    assert results['bad.mkv']['ok'] is False
+    assert results['bad.mkv']['error'] == 'bad input'
+    assert err.getvalue().splitlines()[-1].startswith('2 done, 1 failed')
+
+
+def test_batch_with_conflicting_outputs(tmpdir):
+    args = get_parser().parse_args(['thumbnail', '-o', str(tmpdir), 'a/clip.mp4', 'b/clip.mp4', 'c/other.mp4'])
+    err = io.StringIO()
+
+    assert run_batch(fake_command, args, out=io.StringIO(), err=err) == 1
+    assert err.getvalue() == 'avtk: a/clip.mp4 and b/clip.mp4 would both be written to %s\n' % (
+        tmpdir.join('clip.png')
+    )
+
+
+def test_batch_without_inputs():
+    args = get_parser().parse_args(['inspect'])
+    assert run_batch(fake_command, args, out=io.StringIO(), err=io.StringIO()) == 1
+
+
+def test_convert_requires_target():
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(['convert', 'a.mkv'])
+
+
+@pytest.mark.slow
+def test_thumbnail_command(tmpdir, capsys):
+    assert main(['thumbnail', '-q', '-s', '2', '-o', str(tmpdir), video_path]) == 0
+    assert tmpdir.join('sintel.png').size() > 0
+
+
+@pytest.mark.slow
+def test_remove_audio_next_to_source(tmpdir, capsys):
+    source = str(tmpdir.join('sintel.mkv'))
+    shutil.copy(video_path, source)
+
+    assert main(['remove-audio', '-q', source]) == 0
+    assert tmpdir.join('sintel-noaudio.mkv').size() > 0
@@ -0,0 +1,117 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from avtk import metrics
+from avtk.backends.ffmpeg.exceptions import NoMediaError
+from avtk.backends.ffmpeg.shortcuts import get_thumbnail
+from avtk.metrics import Registry, Counter, Gauge, Histogram, render, start_http_server, track_job
+
+from .backends.ffmpeg.utils import asset_path
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    requests = Counter('requests_total', 'Number of requests.', ['method', 'path'], registry=registry)
+    temperature = Gauge('temperature', 'Current temperature.\nIn degrees.', registry=registry)
+
+    requests.labels('GET', '/a"b').inc()
+    requests.labels('GET', '/a"b').inc(2)
+    temperature.set(20.5)
+    temperature.dec()
+
+    assert render(registry) == (
+        '# HELP requests_total Number of requests.\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{method="GET",path="/a\\"b"} 3\n'
+        '# HELP temperature Current temperature.\\nIn degrees.\n'
+        '# TYPE temperature gauge\n'
+        'temperature 19.5\n'
+    )
+
+
+def test_invalid_updates():
+    registry = Registry()
+    counter = Counter('jobs_total', 'Jobs.', ['api'], registry=registry)
+
+    with pytest.raises(ValueError):
+        counter.labels('a').inc(-1)
+    with pytest.raises(ValueError):
+        counter.labels('a', 'b')
+    with pytest.raises(ValueError):
+        Counter('jobs_total', 'Jobs.', registry=registry)
+
+
+def test_label_values_are_normalized():
+    registry = Registry()
+    counter = Counter('jobs_total', 'Jobs.', ['code'], registry=registry)
+
+    child = counter.labels(200)
+    assert counter.labels(200) is child
+    assert counter.labels('200') is child
+    assert list(counter._children) == [('200',)]
+
+
+def test_histogram():
+    registry = Registry()
+    latency = Histogram('latency_seconds', 'Latency.', buckets=[1, 0.1], registry=registry)
+    for value in [0.05, 0.1, 0.5, 3]:
+        latency.observe(value)
+
+    assert render(registry).splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 3.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_track_job():
+    succeeded = metrics.JOBS.labels('test', 'succeeded')
+    failed = metrics.JOBS.labels('test', 'failed')
+    before = succeeded.value, failed.value
+
+    with track_job('test'):
+        assert metrics.JOBS_IN_PROGRESS.labels('test').value == 1
+
+    with pytest.raises(ValueError):
+        with track_job('test'):
+            raise ValueError()
+
+    assert (succeeded.value, failed.value) == (before[0] + 1, before[1] + 1)
+    assert metrics.JOBS_IN_PROGRESS.labels('test').value == 0
+
+
+@pytest.mark.slow
+def test_shortcuts_are_instrumented():
+    started = metrics.JOBS.labels('get_thumbnail', 'started')
+    failed = metrics.JOBS.labels('get_thumbnail', 'failed')
+    produced = metrics.OUTPUT_BYTES.labels('get_thumbnail')
+    before = started.value, failed.value, produced.value
+
+    data = get_thumbnail(asset_path('video', 'sintel.mkv'), 1, width=64)
+    with pytest.raises(NoMediaError):
+        get_thumbnail('/nonexistent.mkv', 1)
+
+    assert (started.value, failed.value) == (before[0] + 2, before[1] + 1)
+    assert produced.value == before[2] + len(data)
+    assert 'avtk_subprocess_duration_seconds_count{program="ffmpeg"}' in render()
+
+
+def test_http_server():
+    registry = Registry()
+    Counter('hits_total', 'Hits.', registry=registry).inc()
+    server = start_http_server(0, host='127.0.0.1', registry=registry)
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    try:
+        with urlopen(url + '/metrics') as resp:
+            assert resp.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert resp.read().decode('utf-8') == render(registry)
+        with pytest.raises(HTTPError):
+            urlopen(url + '/other')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,62 @@
+import os.path
+
+import pytest
+
+from avtk.backends.ffmpeg.probe import MediaInfo
+from avtk.testing.media import generate_media, get_cache_dir, _get_args, _srt_time
+
+
+def test_srt_time():
+    assert _srt_time(0) == '00:00:00,000'
+    assert _srt_time(3725.5) == '01:02:05,500'
+
+
+def test_cache_dir_from_env(monkeypatch):
+    monkeypatch.setenv('AVTK_MEDIA_CACHE', '/tmp/avtk-media')
+    assert get_cache_dir() == '/tmp/avtk-media'
+
+
+def test_fixed_gop_args():
+    params = dict(
+        duration=5, size=[640, 360], frame_rate='25', video_codec='libx264', pix_fmt='yuv420p',
+        gop_size=50, video_bitrate=None, preset='veryfast', video_source='testsrc2',
+        audio_layout=None, audio_codec='aac', sample_rate=48000, audio_source='sine', subtitles=[],
+    )
+
+    args = _get_args(params, 'out.mkv', [])
+    assert 'testsrc2=size=640x360:rate=25:duration=5' in args
+    assert args[args.index('-g') + 1] == '50'
+    assert '-sc_threshold' in args
+    assert '-c:a' not in args
+
+
+def test_invalid_params():
+    with pytest.raises(ValueError):
+        generate_media(size=None, audio_layout=None)
+    with pytest.raises(ValueError):
+        generate_media(duration=0)
+    with pytest.raises(ValueError):
+        generate_media(audio_source='unknown')
+
+
+def test_generate_is_cached(tmpdir):
+    kwargs = dict(duration=1, size=(160, 120), audio_layout='mono', cache_dir=str(tmpdir))
+
+    path = generate_media(**kwargs)
+    mtime = os.path.getmtime(path)
+
+    assert generate_media(**kwargs) == path
+    assert os.path.getmtime(path) == mtime
+    assert generate_media(**dict(kwargs, duration=2)) != path
+
+
+@pytest.mark.slow
+def test_generate_with_subtitles(tmpdir):
+    path = generate_media(
+        duration=2, size=(320, 240), audio_layout='5.1', subtitles=['eng', 'deu'], cache_dir=str(tmpdir)
+    )
+
+    info = MediaInfo(path)
+    assert (info.video_streams[0].width, info.video_streams[0].height) == (320, 240)
+    assert info.audio_streams[0].channels == 6
+    assert [s.language for s in info.subtitle_streams] == ['eng', 'deu']